@@ -1,8 +1,9 @@
 import os, warnings
 from flask import Flask
 from config import Config
-from extensions import supabase_client
+from extensions import supabase_client, pg_pool
 from errors import register_error_handlers
+from utils import query_stats, tasks
 from flask_cors import CORS
 
 # Silence TF/Whisper warnings
@@ -20,12 +21,14 @@ from content.routes import content_bp
 from content.asr.routes_asr_analyze import asr_bp
 from content.emotion.routes_emotion import emotion_bp
 from student.routes_graduation import grad_bp
+from student import session_state
 from auth.routes_reset import reset_bp
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
     supabase_client.init_app(app)
+    pg_pool.init_app(app)
 
     # CORS (allow dev + production)
     CORS(
@@ -38,7 +41,8 @@ def create_app():
                 "https://www.hear-my-heart.app"
             ],
             "methods": ["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"],
+            "allow_headers": ["Content-Type", "Authorization", "Idempotency-Key"],
+            "expose_headers": ["Idempotent-Replayed"],
             "supports_credentials": True,
         }}
     )
@@ -63,6 +67,9 @@ def create_app():
     app.register_blueprint(content_bp, url_prefix="/api")
 
     register_error_handlers(app)
+    query_stats.init_app(app)
+    tasks.init_app(app)   # post-attempt background runner (handlers registered by the blueprints)
+    session_state.init_app(app)   # session expiry sweeper
     return app
 
 # 👉 Gunicorn loads THIS app. Do NOT run Flask dev server in production.
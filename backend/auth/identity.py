@@ -0,0 +1,99 @@
+# backend/auth/identity.py
+# Request-scoped identity of the authenticated caller.
+# require_role() attaches one Identity to flask.g after the JWT checks out;
+# the caller's own row (students / teachers) is fetched lazily on the first
+# profile() call and memoized for the rest of the request, so handlers and
+# helpers that each need "speech_level" or "photo_url" share ONE query.
+#
+#   me = identity()
+#   row, err = me.profile()                  # default columns for the role
+#   row, err = me.profile("speech_level")    # served from the memo
+#   me.patch({"photo_url": url})             # after writing the row yourself
+
+import threading
+
+from flask import g, has_app_context
+
+from extensions import supabase_client
+from utils.sb import sb_exec
+
+STUDENT_COLS = ("students_id, first_name, last_name, middle_initial, birthday, email, "
+                "login_id, photo_url, speech_level, sex")
+TEACHER_COLS = "teachers_id, first_name, last_name, login_id, photo_url"
+
+# role -> (table, id column, default columns)
+ROLE_TABLES = {
+    "student": ("students", "students_id", STUDENT_COLS),
+    "teacher": ("teachers", "teachers_id", TEACHER_COLS),
+}
+
+
+def _cols(columns) -> set:
+    return {c.strip() for c in (columns or "").split(",") if c.strip()}
+
+
+class Identity:
+    def __init__(self, user_id, role, claims=None):
+        self.user_id = user_id
+        self.role = role
+        self.claims = claims or {}
+        self._row = None
+        self._fetched = set()   # columns present in _row
+        self._missing = False   # fetched and the row doesn't exist
+        self._lock = threading.Lock()
+
+    def profile(self, columns=None):
+        """
+        (row, err) for the caller's own row. Columns already fetched are
+        served from memory; asking for new ones refetches the union once.
+        Returns (None, None) when the row doesn't exist.
+        """
+        table, id_col, default_cols = ROLE_TABLES.get(self.role, (None, None, None))
+        if table is None or not self.user_id:
+            return None, f"no profile table for role {self.role!r}"
+        want = _cols(columns or default_cols)
+        with self._lock:
+            if self._missing:
+                return None, None
+            if self._row is not None and want <= self._fetched:
+                return self._row, None
+            cols = self._fetched | want | _cols(default_cols)
+            rows, err = sb_exec(
+                supabase_client.client.table(table)
+                  .select(", ".join(sorted(cols)))
+                  .eq(id_col, self.user_id)
+                  .limit(1)
+            )
+            if err:
+                return None, err
+            if not rows:
+                self._missing = True
+                return None, None
+            self._row = rows[0]
+            self._fetched = cols
+            return self._row, None
+
+    def patch(self, fields: dict):
+        """Keep the memo in sync after this request wrote to the row."""
+        with self._lock:
+            if self._row is not None:
+                self._row.update(fields)
+
+    def forget(self):
+        with self._lock:
+            self._row = None
+            self._fetched = set()
+            self._missing = False
+
+
+def set_identity(user_id, role, claims=None) -> Identity:
+    ident = Identity(user_id, role, claims)
+    g.hmh_identity = ident
+    return ident
+
+
+def identity():
+    """The current request's Identity (None outside authenticated requests)."""
+    if not has_app_context():
+        return None
+    return getattr(g, "hmh_identity", None)
@@ -4,6 +4,7 @@
 import jwt
 from functools import wraps
 from flask import request, jsonify, current_app
+from auth.identity import set_identity
 
 
 # ---------- Create a JWT ----------
@@ -39,6 +40,8 @@ def require_role(role):
             # Attach the full decoded JWT payload
             request.user = payload                    # <--- FIXED
             request.user_id = payload.get("sub")      # still available
+            # request-scoped profile memo (auth/identity.py)
+            set_identity(request.user_id, role, payload)
 
             return fn(*args, **kwargs)
         return wrapper
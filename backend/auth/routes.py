@@ -15,7 +15,7 @@
 from flask import Blueprint, request, jsonify
 from extensions import supabase_client
 from utils.sb import sb_exec
-from utils.time import mnl_day_bounds_utc
+from student.session_state import session_index
 from auth.jwt_utils import make_jwt
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
@@ -167,52 +167,30 @@ def login():
   sid = s_data["students_id"]
 
   # -------------------------------
-  # Session redirect logic (unchanged)
+  # Session redirect logic (session index: no query when warm, expired
+  # sessions are closed before deciding)
   # -------------------------------
-  sess_rows, sess_err = sb_exec(
-    sb.table("sessions")
-    .select("id, status, minutes_allowed, started_at, ended_at")
-    .eq("students_id", sid)
-    .order("id", desc=True)
-    .limit(1)
-  )
+  state, sess_err = session_index.state(sid)
   if sess_err:
     return jsonify({"error": f"session check failed: {sess_err}"}), 500
 
   redirect = "language"
   session_payload = None
 
-  if sess_rows:
-    last = sess_rows[0]
-    status = (last.get("status") or "").lower()
-
-    if status in ("active", "pending"):
-      # Still usable → resume dashboard
-      redirect = "student-dashboard"
-      session_payload = {
-        "id": last.get("id"),
-        "status": status,
-        "minutes_allowed": last.get("minutes_allowed"),
-        "started_at": last.get("started_at"),
-        "ended_at": last.get("ended_at"),
-      }
-    else:
-      # Not active/pending anymore. If they already STARTED a session today (Manila), send to session-over
-      start_utc, end_utc = mnl_day_bounds_utc()
-      today_rows, derr = sb_exec(
-        sb.table("sessions")
-        .select("id")
-        .eq("students_id", sid)
-        .gte("started_at", start_utc)
-        .lt("started_at", end_utc)
-        .limit(1)
-      )
-      if derr:
-        return jsonify({"error": f"session day check failed: {derr}"}), 500
-      if today_rows:
-        redirect = "session-over"
-      else:
-        redirect = "language"
+  last = state.current
+  if last:
+    # Still usable → resume dashboard
+    redirect = "student-dashboard"
+    session_payload = {
+      "id": last.get("id"),
+      "status": (last.get("status") or "").lower(),
+      "minutes_allowed": last.get("minutes_allowed"),
+      "started_at": last.get("started_at"),
+      "ended_at": last.get("ended_at"),
+    }
+  elif state.started_today():
+    # Not active/pending anymore and they already STARTED a session today (Manila)
+    redirect = "session-over"
 
   token = make_jwt({"sub": sid, "role": "student"})
   return (
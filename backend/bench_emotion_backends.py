@@ -0,0 +1,135 @@
+# backend/bench_emotion_backends.py
+# Parity + latency/memory check between emotion backends on a fixed image set.
+# Each backend runs in its own subprocess so import time and peak RSS are not
+# polluted by the other one (TensorFlow never leaves a process once imported).
+#
+#   cd backend
+#   python bench_emotion_backends.py [path/to/faces/] [--min-agreement 0.9]
+#
+# Without a folder it runs on the bundled crops in fixtures/emotion_faces/,
+# whose labels.json also gives the expected label of each face; each
+# backend's accuracy against those labels is printed alongside.
+# Exits non-zero when the ONNX labels agree with DeepFace on fewer images
+# than --min-agreement, so it can gate a model re-export.
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "emotion_faces")
+
+
+def _images(folder):
+    return sorted(
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.lower().endswith(IMAGE_EXTS)
+    )
+
+
+def _expected(folder):
+    """{file: label} from labels.json in the folder, or {} when there is none."""
+    try:
+        with open(os.path.join(folder, "labels.json")) as f:
+            return {e["file"]: e["label"] for e in json.load(f)["faces"]}
+    except FileNotFoundError:
+        return {}
+
+
+def _run_worker(backend_name, folder, runs):
+    """Child process: load one backend, predict every image, print JSON."""
+    t0 = time.perf_counter()
+    import cv2
+    from content.emotion.backends import build_backend
+    from content.emotion.detectors import largest_face
+    backend = build_backend(backend_name)
+    load_s = time.perf_counter() - t0
+
+    preds, latencies = {}, []
+    for path in _images(folder):
+        img = cv2.imread(path, cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        face = largest_face(img)  # same detector (HMH_FACE_DETECTOR) for both backends
+        backend.analyze(img, face)  # warm-up per image (first call builds graphs)
+        for _ in range(runs):
+            t = time.perf_counter()
+            label, scores = backend.analyze(img, face)
+            latencies.append((time.perf_counter() - t) * 1000.0)
+        total = sum(scores.values()) or 1.0
+        preds[os.path.basename(path)] = {
+            "label": label,
+            "scores": {k: float(v) / total for k, v in scores.items()},
+        }
+
+    latencies.sort()
+    print(json.dumps({
+        "backend": backend.name,
+        "load_s": round(load_s, 2),
+        "rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+        "p50_ms": round(latencies[len(latencies) // 2], 2) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 2) if latencies else None,
+        "preds": preds,
+    }))
+
+
+def _spawn(backend_name, folder, runs):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), os.path.abspath(folder), "--worker", backend_name, "--runs", str(runs)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True,
+    )
+    # backend prints ([EMOTION] ..., TF logs) may precede the JSON line
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("images", nargs="?", default=FIXTURES_DIR,
+                    help="folder with face images (default: the bundled fixtures)")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--min-agreement", type=float, default=0.9)
+    ap.add_argument("--worker", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        _run_worker(args.worker, args.images, args.runs)
+        return
+
+    ref = _spawn("deepface", args.images, args.runs)
+    alt = _spawn("onnx", args.images, args.runs)
+
+    common = sorted(set(ref["preds"]) & set(alt["preds"]))
+    if not common:
+        sys.exit("no readable images")
+    agree = sum(ref["preds"][k]["label"] == alt["preds"][k]["label"] for k in common)
+    max_diff = max(
+        abs(ref["preds"][k]["scores"].get(lbl, 0.0) - alt["preds"][k]["scores"].get(lbl, 0.0))
+        for k in common for lbl in ref["preds"][k]["scores"]
+    )
+
+    for r in (ref, alt):
+        print(f"{r['backend']:<18} load={r['load_s']}s rss={r['rss_mb']}MB p50={r['p50_ms']}ms p95={r['p95_ms']}ms")
+    rate = agree / len(common)
+    print(f"label agreement: {agree}/{len(common)} ({rate:.1%}), max score diff: {max_diff:.3f}")
+    for k in common:
+        if ref["preds"][k]["label"] != alt["preds"][k]["label"]:
+            print(f"  mismatch {k}: deepface={ref['preds'][k]['label']} onnx={alt['preds'][k]['label']}")
+
+    expected = _expected(args.images)
+    labelled = [k for k in common if k in expected]
+    if labelled:
+        for r in (ref, alt):
+            hits = sum(r["preds"][k]["label"] == expected[k] for k in labelled)
+            print(f"{r['backend']:<18} matches expected labels on {hits}/{len(labelled)}")
+
+    if rate < args.min_agreement:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
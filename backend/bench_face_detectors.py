@@ -0,0 +1,87 @@
+# backend/bench_face_detectors.py
+# Latency + recall of the face detectors in content/emotion/detectors.py, to
+# pick HMH_FACE_DETECTOR. Expects an image folder laid out as:
+#
+#   <folder>/faces/     frames that contain a face (recall)
+#   <folder>/no_faces/  optional, frames without a face (false positives)
+#
+#   cd backend
+#   python bench_face_detectors.py path/to/frames [--detectors opencv,mediapipe]
+#
+# Images go through largest_face(), i.e. the same downscale
+# (HMH_FACE_DETECT_SIDE) the live API uses.
+
+import argparse
+import os
+import time
+
+import cv2
+
+from content.emotion.detectors import DETECTORS, build_detector, largest_face
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def _load(folder):
+    if not os.path.isdir(folder):
+        return []
+    imgs = []
+    for f in sorted(os.listdir(folder)):
+        if f.lower().endswith(IMAGE_EXTS):
+            img = cv2.imread(os.path.join(folder, f), cv2.IMREAD_COLOR)
+            if img is not None:
+                imgs.append(img)
+    return imgs
+
+
+def _pct(sorted_vals, q):
+    return sorted_vals[min(len(sorted_vals) - 1, int(len(sorted_vals) * q))] if sorted_vals else 0.0
+
+
+def bench(detector, faces, no_faces, runs):
+    latencies, found, false_pos = [], 0, 0
+    for img in faces + no_faces:
+        largest_face(img, detector)  # warm-up
+    for img in faces:
+        for _ in range(runs):
+            t = time.perf_counter()
+            box = largest_face(img, detector)
+            latencies.append((time.perf_counter() - t) * 1000.0)
+        found += box is not None
+    for img in no_faces:
+        false_pos += largest_face(img, detector) is not None
+    latencies.sort()
+    return {
+        "p50_ms": _pct(latencies, 0.5),
+        "p95_ms": _pct(latencies, 0.95),
+        "recall": found / len(faces) if faces else 0.0,
+        "fp_rate": false_pos / len(no_faces) if no_faces else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("folder")
+    ap.add_argument("--detectors", default=",".join(DETECTORS))
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    faces = _load(os.path.join(args.folder, "faces"))
+    no_faces = _load(os.path.join(args.folder, "no_faces"))
+    if not faces:
+        raise SystemExit(f"no images in {os.path.join(args.folder, 'faces')}")
+    print(f"{len(faces)} face images, {len(no_faces)} no-face images")
+
+    for name in [d.strip() for d in args.detectors.split(",") if d.strip()]:
+        try:
+            detector = build_detector(name)
+        except Exception as e:
+            print(f"{name:<10} unavailable: {e}")
+            continue
+        r = bench(detector, faces, no_faces, args.runs)
+        fp = f"{r['fp_rate']:.1%}" if r["fp_rate"] is not None else "n/a"
+        print(f"{name:<10} p50={r['p50_ms']:.2f}ms p95={r['p95_ms']:.2f}ms recall={r['recall']:.1%} fp={fp}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,3 +10,10 @@ class Config:
     SUPABASE_KEY  = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
     JWT_SECRET    = os.getenv("JWT_SECRET", "dev-secret-change")
     ALLOW_ORIGIN  = os.getenv("ALLOW_ORIGIN", "http://localhost:5173")
+
+    # Optional direct Postgres path (utils/pg.py); unset = PostgREST only
+    DATABASE_URL  = os.getenv("DATABASE_URL")
+    PG_POOL_MIN   = int(os.getenv("HMH_PG_POOL_MIN", "1"))
+    PG_POOL_MAX   = int(os.getenv("HMH_PG_POOL_MAX", "5"))
+    # server-side prepare after N runs of a query; "off" for pgbouncer transaction mode
+    PG_PREPARE_THRESHOLD = os.getenv("HMH_PG_PREPARE_THRESHOLD", "5")
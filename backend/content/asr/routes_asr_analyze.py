@@ -17,9 +17,12 @@ from faster_whisper import WhisperModel
 from difflib import SequenceMatcher
 
 from extensions import supabase_client
-from utils.sb import sb_exec
 from auth.jwt_utils import require_student
-from student.achievements import check_and_award_achievements
+from student.post_attempt import after_attempt
+from student.attempts import record_attempt
+from content.curriculum import curriculum
+from utils.http_cache import touch_student
+from utils.idempotency import idempotent
 
 # -------------------------------------------------------------------
 # Model setup (from old asr_routes.py, but shared with DB logic)
@@ -181,16 +184,8 @@ def _transcribe(raw: bytes, lang: str, filename_hint: Optional[str]):
 # -------------------------------------------------------------------
 
 def _next_activity(sb, lesson_id, sort_order):
-    """Fetch next activity in lesson, if any."""
-    rows, _ = sb_exec(
-        sb.table("activities")
-        .select("id,sort_order")
-        .eq("lesson_id", lesson_id)
-        .gt("sort_order", sort_order)
-        .order("sort_order")
-        .limit(1)
-    )
-    return rows[0] if rows else None
+    """Next activity in lesson, if any (curriculum store)."""
+    return curriculum.snapshot().next_activity(lesson_id, sort_order)
 
 
 def _fuzzy_asr_pass(expected: str, transcript: str) -> bool:
@@ -360,6 +355,7 @@ def recognize():
 # ----------------------------------------------------------------------
 @asr_bp.post("/analyze")
 @require_student
+@idempotent
 def analyze_asr():
     """
     Full ASR endpoint used by HearMyHeart:
@@ -384,16 +380,10 @@ def analyze_asr():
     # -----------------------------------
     # Fetch activity + expected speech
     # -----------------------------------
-    act_rows, _ = sb_exec(
-        sb.table("activities")
-        .select("id, lesson_id, sort_order, data")
-        .eq("id", activities_id)
-        .limit(1)
-    )
-    if not act_rows:
+    act = curriculum.find_activity(activities_id)
+    if not act:
         return jsonify({"error": "Activity not found"}), 404
 
-    act = act_rows[0]
     raw_data = act.get("data")
 
     if isinstance(raw_data, str):
@@ -441,63 +431,49 @@ def analyze_asr():
     score = 100.0 if passed else 0.0
 
     attempt_id = None
-    inline_codes, profile_codes = [], []
+    achievements_since = None
 
     # -----------------------------------
     # Save attempt + metrics ONLY if passed
     # -----------------------------------
     if passed:
-        try:
-            ins = (
-                sb.table("activity_attempts")
-                .insert(
-                    {
-                        "students_id": sid,
-                        "activities_id": activities_id,
-                        "score": score,
-                        "meta": {
-                            "layout": "asr",
-                            "recognized_text": text,
-                            "expected_text": expected,
-                            "lang": lang,
-                            "backend_text": text,
-                            "latency_ms": latency,
-                        },
-                    }
-                )
-                .execute()
-            )
-            attempt_id = ins.data[0]["id"] if ins.data else None
-
-            sb.table("speech_metrics").insert(
-                {
-                    "attempt_id": attempt_id,
-                    "students_id": sid,
-                    "activities_id": activities_id,
-                    "recognized_text": text,
-                    "expected_text": expected,
-                    "accuracy": score,
-                    "lang": lang,
-                    "model_used": model_used,
-                    "latency_ms": latency,
-                }
-            ).execute()
-        except Exception:
-            traceback.print_exc()
-            attempt_id = None
-
-        # Achievements
-        try:
-            inline_codes, profile_codes = check_and_award_achievements(
-                sb,
+        # attempt + speech_metrics + ledger in one transactional call
+        rec, err = record_attempt(
+            sid,
+            activities_id,
+            score,
+            meta={
+                "layout": "asr",
+                "recognized_text": text,
+                "expected_text": expected,
+                "lang": lang,
+                "backend_text": text,
+                "latency_ms": latency,
+            },
+            metric_kind="speech",
+            metric={
+                "recognized_text": text,
+                "expected_text": expected,
+                "accuracy": score,
+                "lang": lang,
+                "model_used": model_used,
+                "latency_ms": latency,
+            },
+        )
+        if err:
+            print("ASR attempt insert failed:", err)
+        else:
+            attempt_id = rec["attempt_id"]
+            touch_student(sid)
+            # achievements run on the background task runner
+            achievements_since = after_attempt(
                 sid,
                 score,
+                attempt_id=attempt_id,
+                activity_id=activities_id,
                 lesson_id=lesson_id,
                 layout="asr",
             )
-        except Exception:
-            traceback.print_exc()
-            inline_codes, profile_codes = [], []
 
     # -----------------------------------
     # Next activity in lesson
@@ -520,7 +496,9 @@ def analyze_asr():
             "model_used": model_used,
             "sr": sr,
             "next_activity": next_act,
-            "inline_achievements": inline_codes,
-            "profile_achievements": profile_codes,
+            "inline_achievements": [],
+            "profile_achievements": [],
+            "achievements_pending": achievements_since is not None,
+            "achievements_since": achievements_since,
         }
     )
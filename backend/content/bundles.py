@@ -0,0 +1,139 @@
+# backend/content/bundles.py
+# Precompiled per-lesson, per-language activity bundles.
+# A bundle is the full /lesson/<id>/activities JSON response (meta +
+# pick_branch'ed activities with public media URLs), serialized once to
+# bytes. It is keyed by a hash of the lesson row and its activity rows, so
+# editing one lesson only rebuilds that lesson's bundles; everything else
+# keeps serving the same bytes.
+#   - memory: latest bundle per (lesson, lang) in this worker
+#   - disk:   HMH_BUNDLE_DIR/lesson-<id>-<lang>-<version>.json, shared by
+#             workers and kept across restarts
+#   - publish(lesson_id) prebuilds after a teacher edit (manage_lessons)
+# With USE_SIGNED_URLS the media URLs expire, so bundles are bypassed and
+# every request compiles live.
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from content import transform
+from content.curriculum import curriculum
+from content.transform import pick_branch
+
+BUNDLE_DIR = os.getenv("HMH_BUNDLE_DIR") or os.path.join(tempfile.gettempdir(), "hmh-bundles")
+BUNDLE_LANGS = ("en", "tl")
+
+
+def lesson_version(snap, lesson_id) -> str:
+    """Content hash of one lesson (row + activities); same in every worker."""
+    digest = hashlib.sha1()
+    digest.update(json.dumps(snap.lesson(lesson_id), sort_keys=True, default=str).encode("utf-8"))
+    for a in snap.activities_for_lesson(lesson_id):
+        digest.update(json.dumps(a, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def compile_lesson(snap, lesson_id, lang: str) -> dict:
+    lesson = snap.lesson(lesson_id)
+    activities = [pick_branch(r, lang) for r in snap.activities_for_lesson(lesson_id)]
+    return {
+        "ok": True,
+        "meta": {
+            "lesson_id": lesson["id"],
+            "chapter_id": lesson["chapter_id"],
+            "lesson_code": lesson["code"],
+            "lesson_title": lesson["title_en"] if lang == "en" else (lesson.get("title_tl") or lesson["title_en"]),
+            "count": len(activities),
+            "lang": lang,
+        },
+        "activities": activities,
+    }
+
+
+def _dumps(payload: dict) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class BundleStore:
+    def __init__(self, root: str = BUNDLE_DIR):
+        self.root = root
+        self._mem = {}           # (lesson_id, lang) -> (version, bytes)
+        self._versions = (None, {})  # (snapshot version, {lesson_id: lesson version})
+        self._lock = threading.Lock()
+
+    def _path(self, lesson_id, lang, version):
+        return os.path.join(self.root, f"lesson-{int(lesson_id)}-{lang}-{version}.json")
+
+    def _version(self, snap, lesson_id) -> str:
+        snap_v, table = self._versions
+        if snap_v != snap.version:
+            table = {}
+            self._versions = (snap.version, table)
+        v = table.get(int(lesson_id))
+        if v is None:
+            v = table[int(lesson_id)] = lesson_version(snap, lesson_id)
+        return v
+
+    def _write(self, lesson_id, lang, version, body: bytes):
+        path = self._path(lesson_id, lang, version)
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(body)
+            os.replace(tmp, path)
+            # drop older versions of this lesson/lang
+            for old in glob.glob(os.path.join(self.root, f"lesson-{int(lesson_id)}-{lang}-*.json")):
+                if old != path:
+                    os.remove(old)
+        except OSError as e:
+            print(f"[BUNDLES] write lesson={lesson_id} lang={lang} failed:", e)
+
+    def get(self, lesson_id, lang: str):
+        """
+        (bytes, version) of the lesson's bundle, or (None, None) if the lesson
+        doesn't exist. Languages outside BUNDLE_LANGS and signed-URL mode are
+        compiled live with version None.
+        """
+        snap = curriculum.snapshot()
+        if snap.lesson(lesson_id) is None:
+            return None, None
+        lang = (lang or "en").lower()
+        if transform.USE_SIGNED_URLS or lang not in BUNDLE_LANGS:
+            return _dumps(compile_lesson(snap, lesson_id, lang)), None
+
+        version = self._version(snap, lesson_id)
+        key = (int(lesson_id), lang)
+        hit = self._mem.get(key)
+        if hit and hit[0] == version:
+            return hit[1], version
+
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit and hit[0] == version:
+                return hit[1], version
+            path = self._path(lesson_id, lang, version)
+            body = None
+            try:
+                with open(path, "rb") as f:
+                    body = f.read()
+            except OSError:
+                pass
+            if body is None:
+                body = _dumps(compile_lesson(snap, lesson_id, lang))
+                self._write(lesson_id, lang, version, body)
+            self._mem[key] = (version, body)
+            return body, version
+
+    def publish(self, lesson_id):
+        """Build (or confirm) every language bundle for a lesson from fresh curriculum."""
+        if lesson_id is None or curriculum.find_lesson(lesson_id) is None:
+            return
+        for lang in BUNDLE_LANGS:
+            self.get(lesson_id, lang)
+
+
+bundles = BundleStore()
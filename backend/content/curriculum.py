@@ -0,0 +1,305 @@
+# backend/content/curriculum.py
+# Process-wide curriculum store (chapters, lessons, activities).
+# Content barely changes during a school day, so each worker loads it once
+# into an immutable snapshot and serves student-facing reads from memory.
+#   - TTL refresh (HMH_CURRICULUM_TTL seconds) as a safety net
+#   - invalidate() from teacher/manage_lessons.py writes; it bumps a file
+#     stamp (utils/stamps.py) so the other workers reload on their next read
+#   - snapshot.version is a content hash, identical across workers
+#   - snapshot.graph precomputes ordering (chapter order, lesson
+#     predecessor/successor, gate lessons, next activity) for O(1) lookups
+# Snapshot rows are shared: treat them as read-only (copy before mutating).
+# Like the queries it replaces, it does NOT filter on is_active unless asked.
+
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+
+from extensions import supabase_client
+from utils.sb import sb_stream
+from utils import stamps
+
+CURRICULUM_TTL = float(os.getenv("HMH_CURRICULUM_TTL", "300"))
+CURRICULUM_RETRY = 5.0      # back-off after a failed reload (keeps serving the old snapshot)
+MISS_REFRESH_AFTER = 5.0    # an unknown id reloads a snapshot older than this
+STAMP_NAME = "curriculum"
+GATE_LESSONS = 5            # first N lessons of a chapter gate the next one
+
+CHAPTER_COLS = "id, code, title_en, title_tl, sort_order, bg_path"
+LESSON_COLS = ("id, chapter_id, code, title_en, title_tl, sort_order, is_active, "
+               "cover_path, description_en, description_tl")
+ACTIVITY_COLS = ("id, lesson_id, type, sort_order, spiral_tag, difficulty, affective_level, "
+                 "supports, prompt_en, prompt_tl, data, is_active")
+
+
+def _as_id(v):
+    """int id, or None for a missing or non-numeric one (e.g. from a JSON body)."""
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _sort_key(r):
+    return (r.get("sort_order") if r.get("sort_order") is not None else 9999, r.get("id") or 0)
+
+
+def _parse_data(row):
+    data = row.get("data")
+    if isinstance(data, str):
+        try:
+            row["data"] = json.loads(data)
+        except Exception:
+            row["data"] = {}
+    elif data is None:
+        row["data"] = {}
+    return row
+
+
+class CurriculumGraph:
+    """
+    Ordering questions compiled once per snapshot into plain dicts.
+    Lesson neighbours follow the existing "sort_order +/- 1 within the chapter"
+    rule; *_active variants only consider is_active lessons.
+    """
+
+    def __init__(self, chapters, lessons_by_chapter, activities_by_lesson, gate_n: int = GATE_LESSONS):
+        self.gate_n = gate_n
+
+        # chapters: number (sort_order) -> id, id -> next id
+        self.chapter_order = [int(c["id"]) for c in chapters]
+        self.chapter_by_number = {}
+        for c in chapters:
+            if c.get("sort_order") is not None:
+                self.chapter_by_number.setdefault(int(c["sort_order"]), int(c["id"]))
+        self._next_chapter = dict(zip(self.chapter_order, self.chapter_order[1:]))
+
+        # lessons
+        self._prev_lesson = {}
+        self._next_lesson = {}
+        self._next_lesson_active = {}
+        self._gate = {}
+        self._gate_active = {}
+        self._first_lesson_active = {}
+        for cid, rows in lessons_by_chapter.items():
+            active = [l for l in rows if l.get("is_active") is True]
+            by_sort = {}
+            by_sort_active = {}
+            for l in rows:
+                if l.get("sort_order") is not None:
+                    by_sort.setdefault(int(l["sort_order"]), int(l["id"]))
+            for l in active:
+                if l.get("sort_order") is not None:
+                    by_sort_active.setdefault(int(l["sort_order"]), int(l["id"]))
+            for l in rows:
+                if l.get("sort_order") is None:
+                    continue
+                lid, so = int(l["id"]), int(l["sort_order"])
+                if so - 1 in by_sort:
+                    self._prev_lesson[lid] = by_sort[so - 1]
+                if so + 1 in by_sort:
+                    self._next_lesson[lid] = by_sort[so + 1]
+                if so + 1 in by_sort_active:
+                    self._next_lesson_active[lid] = by_sort_active[so + 1]
+            self._gate[cid] = rows[:gate_n]
+            self._gate_active[cid] = active[:gate_n]
+            if active:
+                self._first_lesson_active[cid] = int(active[0]["id"])
+
+        # activities: (lesson_id, sort_order) -> next {"id", "sort_order"}
+        self._next_activity = {}
+        self._activity_steps = {}
+        for lid, rows in activities_by_lesson.items():
+            steps = [{"id": a["id"], "sort_order": a["sort_order"]}
+                     for a in rows if a.get("sort_order") is not None]
+            sorts = [st["sort_order"] for st in steps]
+            self._activity_steps[lid] = (sorts, steps)
+            for so in set(sorts):
+                i = bisect.bisect_right(sorts, so)
+                self._next_activity[(lid, so)] = steps[i] if i < len(steps) else None
+
+    # ---- chapters ----
+    def next_chapter(self, chapter_id):
+        return self._next_chapter.get(_as_id(chapter_id))
+
+    def chapter_id_for_number(self, number):
+        return self.chapter_by_number.get(_as_id(number))
+
+    # ---- lessons ----
+    def prev_lesson(self, lesson_id):
+        return self._prev_lesson.get(_as_id(lesson_id))
+
+    def next_lesson(self, lesson_id, active_only: bool = False):
+        table = self._next_lesson_active if active_only else self._next_lesson
+        return table.get(_as_id(lesson_id))
+
+    def gate_lessons(self, chapter_id, active_only: bool = False):
+        """First gate_n lessons of the chapter (by sort_order)."""
+        if chapter_id is None:
+            return []
+        table = self._gate_active if active_only else self._gate
+        return list(table.get(_as_id(chapter_id), []))
+
+    def first_lesson(self, chapter_id):
+        """First active lesson of the chapter (unlocked when the chapter opens)."""
+        return self._first_lesson_active.get(_as_id(chapter_id))
+
+    # ---- activities ----
+    def next_activity(self, lesson_id, sort_order):
+        """{"id", "sort_order"} of the next activity in the lesson, or None."""
+        lid = _as_id(lesson_id)
+        if lid is None:
+            return None
+        key = (lid, sort_order)
+        if key in self._next_activity:
+            return self._next_activity[key]
+        # sort_order not present in the lesson (stale client): first one after it
+        sorts, steps = self._activity_steps.get(lid, ([], []))
+        i = bisect.bisect_right(sorts, sort_order)
+        return steps[i] if i < len(steps) else None
+
+
+class CurriculumSnapshot:
+    def __init__(self, chapters, lessons, activities, stamp: str):
+        self.stamp = stamp
+        self.loaded_at = time.monotonic()
+        self.expires_at = self.loaded_at + CURRICULUM_TTL
+
+        self.chapters = sorted(chapters, key=_sort_key)
+        self.chapters_by_id = {int(c["id"]): c for c in self.chapters}
+
+        self.lessons_by_id = {int(l["id"]): l for l in lessons}
+        self.lessons_by_chapter = {}
+        for l in sorted(lessons, key=_sort_key):
+            if l.get("chapter_id") is not None:
+                self.lessons_by_chapter.setdefault(int(l["chapter_id"]), []).append(l)
+
+        self.activities_by_id = {int(a["id"]): _parse_data(a) for a in activities}
+        self.activities_by_lesson = {}
+        for a in sorted(activities, key=_sort_key):
+            if a.get("lesson_id") is not None:
+                self.activities_by_lesson.setdefault(int(a["lesson_id"]), []).append(a)
+
+        digest = hashlib.sha1()
+        for part in (self.chapters, sorted(lessons, key=lambda r: r["id"]), sorted(activities, key=lambda r: r["id"])):
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        self.version = digest.hexdigest()[:16]
+
+        self.graph = CurriculumGraph(self.chapters, self.lessons_by_chapter, self.activities_by_lesson)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+    # ---- lookups ----
+    def chapter(self, chapter_id):
+        return self.chapters_by_id.get(_as_id(chapter_id))
+
+    def lesson(self, lesson_id):
+        return self.lessons_by_id.get(_as_id(lesson_id))
+
+    def lessons_in_chapter(self, chapter_id, active_only: bool = False):
+        rows = self.lessons_by_chapter.get(_as_id(chapter_id), [])
+        return [l for l in rows if l.get("is_active") is True] if active_only else list(rows)
+
+    def activity(self, activity_id):
+        return self.activities_by_id.get(_as_id(activity_id))
+
+    def activities_for_lesson(self, lesson_id):
+        return list(self.activities_by_lesson.get(_as_id(lesson_id), []))
+
+    def activity_ids(self, lesson_id):
+        return [a["id"] for a in self.activities_by_lesson.get(_as_id(lesson_id), [])]
+
+    def next_activity(self, lesson_id, sort_order):
+        """{"id", "sort_order"} of the next activity in the lesson, or None."""
+        return self.graph.next_activity(lesson_id, sort_order)
+
+
+def _load(stamp: str) -> CurriculumSnapshot:
+    sb = supabase_client.client
+    chapters = list(sb_stream(lambda: sb.table("chapters").select(CHAPTER_COLS), name="curriculum chapters"))
+    lessons = list(sb_stream(lambda: sb.table("lessons").select(LESSON_COLS), name="curriculum lessons"))
+    activities = list(sb_stream(lambda: sb.table("activities").select(ACTIVITY_COLS), name="curriculum activities"))
+    return CurriculumSnapshot(chapters, lessons, activities, stamp)
+
+
+class CurriculumStore:
+    def __init__(self, stamp_name: str = STAMP_NAME):
+        self.stamp_name = stamp_name
+        self._snap = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _stale(self, snap) -> bool:
+        return time.monotonic() >= snap.expires_at or stamps.read(self.stamp_name) != snap.stamp
+
+    def snapshot(self) -> CurriculumSnapshot:
+        snap = self._snap
+        if snap is not None and not self._stale(snap):
+            return snap
+        return self._reload(snap)
+
+    def _reload(self, old):
+        if old is not None:
+            # single-flight: while one thread reloads, others keep the old snapshot
+            if not self._lock.acquire(blocking=False):
+                return old
+        else:
+            self._lock.acquire()
+        try:
+            cur = self._snap
+            if cur is not None and cur is not old and not self._stale(cur):
+                return cur
+            stamp = stamps.read(self.stamp_name)  # read first: a bump during load forces another reload
+            t0 = time.perf_counter()
+            try:
+                snap = _load(stamp)
+            except Exception as e:
+                print("[CURRICULUM] reload failed:", e)
+                if old is None:
+                    raise
+                old.expires_at = time.monotonic() + CURRICULUM_RETRY
+                old.stamp = stamp
+                return old
+            self._snap = snap
+            self.loads += 1
+            print(f"[CURRICULUM] loaded v={snap.version} chapters={len(snap.chapters)} "
+                  f"lessons={len(snap.lessons_by_id)} activities={len(snap.activities_by_id)} "
+                  f"in {(time.perf_counter() - t0) * 1000:.0f}ms")
+            return snap
+        finally:
+            self._lock.release()
+
+    def refresh(self) -> CurriculumSnapshot:
+        return self._reload(self._snap)
+
+    def invalidate(self):
+        """Call after any content write: drop this worker's copy and signal the others."""
+        stamps.bump(self.stamp_name)
+        self._snap = None
+
+    # ---- lookups that reload once on an unknown id (row created in another worker) ----
+    def find_activity(self, activity_id):
+        if _as_id(activity_id) is None:
+            return None
+        snap = self.snapshot()
+        row = snap.activity(activity_id)
+        if row is None and snap.age > MISS_REFRESH_AFTER:
+            row = self.refresh().activity(activity_id)
+        return row
+
+    def find_lesson(self, lesson_id):
+        if _as_id(lesson_id) is None:
+            return None
+        snap = self.snapshot()
+        row = snap.lesson(lesson_id)
+        if row is None and snap.age > MISS_REFRESH_AFTER:
+            row = self.refresh().lesson(lesson_id)
+        return row
+
+
+curriculum = CurriculumStore()
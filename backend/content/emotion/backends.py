@@ -0,0 +1,119 @@
+# backend/content/emotion/backends.py
+# Emotion classifier backends, selected with HMH_EMOTION_BACKEND:
+#   - "deepface": DeepFace.analyze (pulls TensorFlow into the worker)
+#   - "onnx":     the same DeepFace emotion CNN exported to ONNX
+#                 (see export_emotion_onnx.py) and run through cv2.dnn
+# Both take a BGR frame plus the face box from detectors.largest_face and
+# return the raw DeepFace-style result: (dominant_label, {label: score}).
+
+import os
+import threading
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from content.emotion.detectors import crop
+
+EMOTION_BACKEND = os.getenv("HMH_EMOTION_BACKEND", "deepface").strip().lower()
+
+# DeepFace "Emotion" model output order (FER-2013 classes)
+FER_LABELS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+FER_INPUT_SIZE = 48
+
+
+def _pick_path(env_key: str, default_rel: str) -> str:
+    """Use env var if the file exists; else resolve relative to backend/."""
+    p = os.getenv(env_key)
+    if p and os.path.isfile(p):
+        return p
+    backend_root = Path(__file__).resolve().parents[2]  # .../backend
+    return str((backend_root / default_rel).resolve())
+
+
+ONNX_MODEL_PATH = _pick_path("HMH_EMOTION_ONNX", "models/emotion/facial_expression.onnx")
+
+
+class DeepFaceBackend:
+    name = "deepface-opencv"
+
+    def __init__(self):
+        from deepface import DeepFace  # heavy: imports TensorFlow
+        self._deepface = DeepFace
+
+    def analyze(self, img: np.ndarray, face=None):
+        # face already found by our detector: no second detection pass
+        result = self._deepface.analyze(
+            img_path=crop(img, face),
+            actions=["emotion"],
+            enforce_detection=False,
+            detector_backend="skip",
+        )
+        if isinstance(result, list):
+            result = result[0]
+        return result.get("dominant_emotion"), (result.get("emotion") or {})
+
+
+class OnnxEmotionBackend:
+    name = "onnx-opencv"
+
+    def __init__(self, model_path: str = ONNX_MODEL_PATH):
+        if not os.path.isfile(model_path):
+            raise RuntimeError(
+                f"ONNX emotion model not found at {model_path} "
+                "(run export_emotion_onnx.py or set HMH_EMOTION_ONNX)"
+            )
+        self.model_path = model_path
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        # cv2.dnn.Net is not safe to call from several threads at once
+        self._lock = threading.Lock()
+
+    def analyze(self, img: np.ndarray, face=None):
+        roi = crop(img, face)  # whole frame when no face, like enforce_detection=False
+        gray = roi if roi.ndim == 2 else cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        blob = cv2.dnn.blobFromImage(
+            gray, scalefactor=1.0 / 255.0, size=(FER_INPUT_SIZE, FER_INPUT_SIZE)
+        )  # (1, 1, 48, 48) — the export keeps NCHW input
+        with self._lock:
+            self.net.setInput(blob)
+            probs = self.net.forward().reshape(-1)
+        probs = probs.astype(np.float64)
+        total = float(probs.sum()) or 1.0
+        scores = {lbl: 100.0 * float(p) / total for lbl, p in zip(FER_LABELS, probs)}
+        dominant = FER_LABELS[int(np.argmax(probs))]
+        return dominant, scores
+
+
+BACKENDS = {
+    "deepface": DeepFaceBackend,
+    "onnx": OnnxEmotionBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def build_backend(name: str):
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise RuntimeError(f"Unknown HMH_EMOTION_BACKEND: {name!r} (expected one of {sorted(BACKENDS)})")
+
+
+def backend_name() -> str:
+    """Name of the configured backend (as recorded in emotion_metrics), without loading it."""
+    if _backend is not None:
+        return _backend.name
+    cls = BACKENDS.get(EMOTION_BACKEND)
+    return cls.name if cls else EMOTION_BACKEND
+
+
+def get_backend():
+    """Process-wide backend singleton, created on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = build_backend(EMOTION_BACKEND)
+                print(f"[EMOTION] backend={_backend.name}")
+    return _backend
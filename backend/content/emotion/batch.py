@@ -0,0 +1,197 @@
+# backend/content/emotion/batch.py
+# Offline emotion timelines for recorded session clips (LibreFace).
+# Clips are decoded with a streaming cv2.VideoCapture reader that only
+# decodes the frames it samples (HMH_BATCH_FPS per second); sampled frames
+# are JPEG-encoded and sent in batches to a process pool where every worker
+# holds one EmotionRecognizer. Each clip becomes a compressed .npz with
+# columns t (seconds), probs (frames x labels) and dominant (label index).
+#
+#   cd backend
+#   python -m content.emotion.batch clips/ --out timelines/ [--fps 2] [--workers 2]
+#
+# Needs `libreface` (+ torch), which the web image does not install.
+
+import argparse
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import cv2
+import numpy as np
+
+BATCH_FPS = float(os.getenv("HMH_BATCH_FPS", "2"))
+BATCH_SIZE = int(os.getenv("HMH_BATCH_SIZE", "16"))
+BATCH_WORKERS = int(os.getenv("HMH_BATCH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+BATCH_JPEG_QUALITY = int(os.getenv("HMH_BATCH_JPEG_QUALITY", "90"))
+
+VIDEO_EXTS = (".mp4", ".webm", ".mov", ".mkv", ".avi")
+
+
+# ---------------------------------------------------------------------
+# Streaming reader
+# ---------------------------------------------------------------------
+def sample_frames(path: str, fps: float = BATCH_FPS):
+    """
+    Yield (t_seconds, bgr_frame) at ~fps. Skipped frames are only grab()bed,
+    never decoded, and at most one frame is held in memory.
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"cannot open video: {path}")
+    try:
+        src_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        if src_fps <= 0 or src_fps > 240:
+            src_fps = 30.0  # webm from MediaRecorder often reports nothing useful
+        step = 1.0 / fps if fps > 0 else 0.0
+        next_t, idx = 0.0, 0
+        while cap.grab():
+            t = idx / src_fps
+            idx += 1
+            if t + 1e-6 < next_t:
+                continue
+            ok, frame = cap.retrieve()
+            if not ok:
+                continue
+            next_t = t + step
+            yield t, frame
+    finally:
+        cap.release()
+
+
+def _batches(frames, size: int):
+    ts, jpgs = [], []
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), BATCH_JPEG_QUALITY]
+    for t, frame in frames:
+        ok, buf = cv2.imencode(".jpg", frame, params)
+        if not ok:
+            continue
+        ts.append(t)
+        jpgs.append(buf.tobytes())
+        if len(ts) >= size:
+            yield ts, jpgs
+            ts, jpgs = [], []
+    if ts:
+        yield ts, jpgs
+
+
+# ---------------------------------------------------------------------
+# Worker side (one recognizer per process)
+# ---------------------------------------------------------------------
+_recognizer = None
+
+
+def _init_worker(device):
+    global _recognizer
+    from content.emotion.video_io import EmotionRecognizer  # torch/libreface only in workers
+    _recognizer = EmotionRecognizer(device=device)
+
+
+def _predict_batch(jpgs):
+    # EmotionRecognizer takes file paths, so frames are staged per batch
+    with tempfile.TemporaryDirectory(prefix="hmh_batch_") as tmp:
+        paths = []
+        for i, data in enumerate(jpgs):
+            p = os.path.join(tmp, f"{i:04d}.jpg")
+            with open(p, "wb") as f:
+                f.write(data)
+            paths.append(p)
+        out = []
+        for p in paths:
+            try:
+                out.append(_recognizer.predict_emotions(p) or {})
+            except Exception as e:  # one bad frame must not drop the batch
+                print(f"[BATCH] frame failed: {e}")
+                out.append({})
+        return out
+
+
+# ---------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------
+def analyze_clip(pool, path: str, fps: float = BATCH_FPS, batch_size: int = BATCH_SIZE, max_pending: int = 4):
+    """Return (t, results) for one clip; keeps at most max_pending batches in flight."""
+    pending, done = {}, []
+    for ts, jpgs in _batches(sample_frames(path, fps), batch_size):
+        if len(pending) >= max_pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                done.append((pending.pop(fut), fut.result()))
+        pending[pool.submit(_predict_batch, jpgs)] = ts
+    for fut in pending:
+        done.append((pending[fut], fut.result()))
+
+    done.sort(key=lambda item: item[0][0])
+    t = [x for ts, _ in done for x in ts]
+    results = [r for _, rs in done for r in rs]
+    return t, results
+
+
+def write_timeline(out_path: str, t, results, source: str, fps: float):
+    labels = sorted({k for r in results for k in r})
+    probs = np.zeros((len(results), len(labels)), dtype=np.float16)
+    for i, r in enumerate(results):
+        for j, lbl in enumerate(labels):
+            probs[i, j] = float(r.get(lbl) or 0.0)
+    dominant = probs.argmax(axis=1).astype(np.uint8) if labels else np.zeros(len(results), np.uint8)
+    # frames where the recognizer returned nothing
+    valid = np.array([bool(r) for r in results], dtype=bool)
+
+    np.savez_compressed(
+        out_path,
+        t=np.asarray(t, dtype=np.float32),
+        labels=np.asarray(labels, dtype=str),
+        probs=probs,
+        dominant=dominant,
+        valid=valid,
+        source=np.asarray(os.path.basename(source)),
+        fps=np.float32(fps),
+    )
+
+
+def run(clips, out_dir: str, fps: float = BATCH_FPS, workers: int = BATCH_WORKERS,
+        batch_size: int = BATCH_SIZE, device: str = None, force: bool = False):
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(device,)) as pool:
+        for clip in clips:
+            stem = os.path.splitext(os.path.basename(clip))[0]
+            out_path = os.path.join(out_dir, f"{stem}.npz")
+            if os.path.exists(out_path) and not force:
+                print(f"[BATCH] skip {clip} (exists)")
+                continue
+            try:
+                t, results = analyze_clip(pool, clip, fps, batch_size, max_pending=workers * 2)
+            except Exception as e:
+                print(f"[BATCH] ❌ {clip}: {e}")
+                continue
+            write_timeline(out_path, t, results, clip, fps)
+            print(f"[BATCH] ✅ {clip}: {len(t)} frames -> {out_path}")
+
+
+def _collect(inputs):
+    clips = []
+    for p in inputs:
+        if os.path.isdir(p):
+            clips += sorted(
+                os.path.join(p, f) for f in os.listdir(p) if f.lower().endswith(VIDEO_EXTS)
+            )
+        else:
+            clips.append(p)
+    return clips
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline emotion timelines for recorded clips")
+    ap.add_argument("inputs", nargs="+", help="video files or folders")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--fps", type=float, default=BATCH_FPS)
+    ap.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    ap.add_argument("--device", default=None)
+    ap.add_argument("--force", action="store_true")
+    args = ap.parse_args()
+
+    run(_collect(args.inputs), args.out, args.fps, args.workers, args.batch_size, args.device, args.force)
+
+
+if __name__ == "__main__":
+    main()
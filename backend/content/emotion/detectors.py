@@ -0,0 +1,111 @@
+# backend/content/emotion/detectors.py
+# Face detectors for the emotion pipeline, selected with HMH_FACE_DETECTOR:
+#   - "opencv":    Haar cascade bundled with OpenCV (what DeepFace used)
+#   - "mediapipe": MediaPipe BlazeFace short-range model, faster on CPU at
+#                  webcam resolution
+# Detection runs once per frame on a downscaled copy; the box is reused by the
+# quality gate and by the emotion backend (which then skips its own detection).
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+FACE_DETECTOR = os.getenv("HMH_FACE_DETECTOR", "opencv").strip().lower()
+DETECT_MAX_SIDE = int(os.getenv("HMH_FACE_DETECT_SIDE", "320"))
+MP_MIN_CONFIDENCE = float(os.getenv("HMH_FACE_MP_CONFIDENCE", "0.5"))
+
+
+class HaarDetector:
+    name = "opencv"
+
+    def __init__(self):
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+
+    def detect(self, img: np.ndarray):
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.15, minNeighbors=4, minSize=(16, 16))
+        return [tuple(int(v) for v in f) for f in faces]
+
+
+class MediaPipeDetector:
+    name = "mediapipe"
+
+    def __init__(self, min_confidence: float = MP_MIN_CONFIDENCE):
+        import mediapipe as mp
+        # model_selection=0: short-range model, faces within ~2 m of the camera
+        self.fd = mp.solutions.face_detection.FaceDetection(
+            model_selection=0, min_detection_confidence=min_confidence
+        )
+        # the MediaPipe graph is not re-entrant
+        self._lock = threading.Lock()
+
+    def detect(self, img: np.ndarray):
+        rgb = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB if img.ndim == 2 else cv2.COLOR_BGR2RGB)
+        with self._lock:
+            res = self.fd.process(rgb)
+        h, w = img.shape[:2]
+        boxes = []
+        for d in (res.detections or []):
+            rb = d.location_data.relative_bounding_box
+            x0, y0 = max(0, int(rb.xmin * w)), max(0, int(rb.ymin * h))
+            x1, y1 = min(w, int((rb.xmin + rb.width) * w)), min(h, int((rb.ymin + rb.height) * h))
+            if x1 > x0 and y1 > y0:
+                boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return boxes
+
+
+DETECTORS = {
+    "opencv": HaarDetector,
+    "mediapipe": MediaPipeDetector,
+}
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def build_detector(name: str):
+    try:
+        return DETECTORS[name]()
+    except KeyError:
+        raise RuntimeError(f"Unknown HMH_FACE_DETECTOR: {name!r} (expected one of {sorted(DETECTORS)})")
+
+
+def get_detector():
+    """Process-wide detector singleton, created on first use."""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = build_detector(FACE_DETECTOR)
+                print(f"[EMOTION] face detector={_detector.name}")
+    return _detector
+
+
+def largest_face(img: np.ndarray, detector=None):
+    """
+    Detect on a copy no larger than DETECT_MAX_SIDE and return the largest
+    face as (x, y, w, h) in full-frame pixels, or None.
+    """
+    detector = detector or get_detector()
+    h, w = img.shape[:2]
+    scale = DETECT_MAX_SIDE / float(max(h, w))
+    small = img
+    if scale < 1.0:
+        small = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    else:
+        scale = 1.0
+
+    faces = detector.detect(small)
+    if not faces:
+        return None
+    x, y, fw, fh = max(faces, key=lambda f: f[2] * f[3])
+    return (int(x / scale), int(y / scale), int(fw / scale), int(fh / scale))
+
+
+def crop(img: np.ndarray, face):
+    if face is None:
+        return img
+    x, y, w, h = face
+    return img[y:y + h, x:x + w]
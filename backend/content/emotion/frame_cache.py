@@ -0,0 +1,79 @@
+# backend/content/emotion/frame_cache.py
+# Near-duplicate frame detection for /api/emotion/analyze.
+# Auto capture sends a frame every few seconds; when the child sits still the
+# frames are almost identical. We keep a 64-bit difference hash (dHash) of the
+# last analyzed frame per (student, activity) and reuse its prediction while
+# new frames stay within a small Hamming distance. Only frames that passed the
+# quality gate and went through the model are stored, so a prediction is never
+# carried over to another activity or taken from a rejected frame. Entries are
+# short-lived so a real change of expression is never masked for long.
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from utils.cache import TTLCache
+
+DEDUP_MAX_BITS = int(os.getenv("HMH_EMOTION_DEDUP_BITS", "5"))      # of 64
+DEDUP_TTL_SECS = float(os.getenv("HMH_EMOTION_DEDUP_TTL", "6"))
+DEDUP_MAX_STUDENTS = int(os.getenv("HMH_EMOTION_DEDUP_MAX", "512"))
+
+
+def frame_hash(img: np.ndarray) -> int:
+    """dHash: compare neighbouring pixels of a 9x8 grayscale thumbnail."""
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class FrameDedupCache:
+    """(hash, prediction) of the last analyzed frame per (student, activity)."""
+
+    def __init__(self, max_bits=DEDUP_MAX_BITS, ttl=DEDUP_TTL_SECS, maxsize=DEDUP_MAX_STUDENTS):
+        self.max_bits = int(max_bits)
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.analyzed = 0
+
+    def lookup(self, student_id, activity_id, fhash: int):
+        """Return the cached prediction if this frame is a near-duplicate, else None."""
+        entry = self._entries.get((student_id, str(activity_id)))
+        if entry is None or hamming(entry[0], fhash) > self.max_bits:
+            return None
+        with self._lock:
+            self.reused += 1
+        return entry[1]
+
+    def store(self, student_id, activity_id, fhash: int, prediction):
+        """
+        Remember a fresh model prediction for a frame that passed the quality
+        gate; the TTL restarts only here.
+        """
+        self._entries.set((student_id, str(activity_id)), (fhash, prediction))
+        with self._lock:
+            self.analyzed += 1
+
+    def forget(self, student_id, activity_id):
+        self._entries.pop((student_id, str(activity_id)))
+
+    def stats(self) -> dict:
+        total = self.reused + self.analyzed
+        return {
+            "reused": self.reused,
+            "analyzed": self.analyzed,
+            "hit_rate": round(self.reused / total, 3) if total else 0.0,
+            "max_bits": self.max_bits,
+            "entries": self._entries.stats()["size"],
+            "ttl": self._entries.ttl,
+        }
+
+
+frame_cache = FrameDedupCache()
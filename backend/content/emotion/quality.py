@@ -0,0 +1,84 @@
+# backend/content/emotion/quality.py
+# Cheap frame-quality gate run before emotion inference.
+# Works on a small grayscale copy of the frame: brightness (mean), contrast
+# (std), blur (variance of the Laplacian) and, last, the size of the largest
+# face found by content.emotion.detectors. Frames that fail get a reason code
+# plus a short hint the activity screen can show, so we skip the model on
+# frames that would fail.
+
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+
+GATE_ENABLED = os.getenv("HMH_EMOTION_QUALITY_GATE", "1") != "0"
+GATE_MAX_SIDE = int(os.getenv("HMH_EMOTION_GATE_SIDE", "192"))
+MIN_BRIGHTNESS = float(os.getenv("HMH_EMOTION_MIN_BRIGHTNESS", "40"))
+MAX_BRIGHTNESS = float(os.getenv("HMH_EMOTION_MAX_BRIGHTNESS", "220"))
+MIN_CONTRAST = float(os.getenv("HMH_EMOTION_MIN_CONTRAST", "18"))
+MIN_SHARPNESS = float(os.getenv("HMH_EMOTION_MIN_SHARPNESS", "25"))
+MIN_FACE_FRAC = float(os.getenv("HMH_EMOTION_MIN_FACE_FRAC", "0.15"))  # face height / frame height
+# Off by default: the detector misses tilted or partly covered faces, and
+# before this gate those frames still went to the model. Set to 1 to turn a
+# missed face into a "no_face" hint instead.
+REQUIRE_FACE = os.getenv("HMH_EMOTION_REQUIRE_FACE", "0") == "1"
+
+HINTS = {
+    "too_dark":     {"en": "More light, please!",          "tl": "Kailangan ng mas maliwanag na ilaw!"},
+    "too_bright":   {"en": "Too bright! Move away from the light.", "tl": "Masyadong maliwanag! Lumayo sa ilaw."},
+    "low_contrast": {"en": "I can't see you clearly.",      "tl": "Hindi kita makita nang malinaw."},
+    "blurry":       {"en": "Hold still for a moment.",      "tl": "Huwag munang gumalaw."},
+    "no_face":      {"en": "Look at the camera!",           "tl": "Tumingin sa kamera!"},
+    "too_far":      {"en": "Move closer to the camera.",    "tl": "Lumapit sa kamera."},
+}
+
+def _small_gray(img: np.ndarray) -> np.ndarray:
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape[:2]
+    scale = GATE_MAX_SIDE / float(max(h, w))
+    if scale < 1.0:
+        gray = cv2.resize(gray, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def _reject(reason: str, lang: str, metrics: dict) -> dict:
+    hint = HINTS[reason]
+    return {"reason": reason, "hint": hint.get(lang) or hint["en"], "metrics": metrics}
+
+
+def check_frame(img: np.ndarray, lang: str = "en", face=None) -> Optional[dict]:
+    """
+    Return None when the frame is good enough for inference, otherwise
+    {"reason": code, "hint": text, "metrics": {...}}.
+    `face` is the (x, y, w, h) box from detectors.largest_face, or None.
+    """
+    if not GATE_ENABLED:
+        return None
+
+    gray = _small_gray(img)
+    brightness = float(gray.mean())
+    contrast = float(gray.std())
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    metrics = {
+        "brightness": round(brightness, 1),
+        "contrast": round(contrast, 1),
+        "sharpness": round(sharpness, 1),
+    }
+
+    if brightness < MIN_BRIGHTNESS:
+        return _reject("too_dark", lang, metrics)
+    if brightness > MAX_BRIGHTNESS:
+        return _reject("too_bright", lang, metrics)
+    if contrast < MIN_CONTRAST:
+        return _reject("low_contrast", lang, metrics)
+    if sharpness < MIN_SHARPNESS:
+        return _reject("blurry", lang, metrics)
+
+    face_frac = float(face[3]) / float(img.shape[0]) if face is not None else None
+    metrics["face_frac"] = round(face_frac, 3) if face_frac is not None else None
+    if face_frac is None:
+        return _reject("no_face", lang, metrics) if REQUIRE_FACE else None
+    if face_frac < MIN_FACE_FRAC:
+        return _reject("too_far", lang, metrics)
+    return None
@@ -1,12 +1,18 @@
 import base64, cv2, numpy as np, time, traceback, json
 from flask import Blueprint, request, jsonify
-from deepface import DeepFace
 from datetime import datetime, timezone
 
 from extensions import supabase_client
-from utils.sb import sb_exec
 from auth.jwt_utils import require_student
-from student.achievements import check_and_award_achievements
+from student.post_attempt import after_attempt
+from student.attempts import record_attempt
+from content.emotion.frame_cache import frame_cache, frame_hash
+from content.emotion.quality import check_frame
+from content.emotion.backends import get_backend, EMOTION_BACKEND
+from content.emotion.detectors import largest_face, FACE_DETECTOR
+from content.curriculum import curriculum
+from utils.http_cache import touch_student
+from utils.idempotency import idempotent
 
 emotion_bp = Blueprint("emotion", __name__, url_prefix="/api/emotion")
 
@@ -25,26 +31,21 @@ def _norm(s: str) -> str:
     """Normalize emotion strings to a canonical label."""
     return _ALIAS.get((s or "").lower().strip(), (s or "").lower().strip())
 
-def _analyze_image(image_bytes: bytes):
-    """Decode image bytes and run DeepFace emotion detection. Returns normalized scores 0..1."""
+def _decode_image(image_bytes: bytes):
+    """Decode JPEG/PNG bytes into a BGR array."""
     nparr = np.frombuffer(image_bytes, np.uint8)
     img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     if img is None:
         raise ValueError("Invalid image data")
+    return img
 
+def _analyze_image(img, face=None):
+    """Run the configured emotion backend on a BGR frame. Returns normalized scores 0..1."""
+    backend = get_backend()
     start = time.time()
-    result = DeepFace.analyze(
-        img_path=img,
-        actions=["emotion"],
-        enforce_detection=False,
-        detector_backend="opencv",
-    )
+    dominant, raw = backend.analyze(img, face)  # raw like {"angry": 0.12, "happy": 84.5, ...}
     latency_ms = int((time.time() - start) * 1000)
 
-    if isinstance(result, list):
-        result = result[0]
-
-    raw = (result.get("emotion") or {})  # dict like {"angry": 0.12, "happy": 84.5, ...}
     # normalize to 0..1 safely (DeepFace can yield 0..100 or 0..1 depending on backend)
     scores_tmp = { _norm(k): float(v) for k, v in raw.items() if v is not None }
     max_val = max(scores_tmp.values(), default=1.0)
@@ -52,33 +53,40 @@ def _analyze_image(image_bytes: bytes):
     scale = 100.0 if max_val > 1.5 else 1.0
     scores = { k: (v/scale) for k, v in scores_tmp.items() }
 
-    label = _norm(result.get("dominant_emotion"))
+    label = _norm(dominant)
     confidence = float(scores.get(label, 0.0))
     return label, confidence, scores, latency_ms
 
 
 
 def _next_activity_for(sb, lesson_id: int, sort_order: int):
-    """Fetch the next activity (id, sort_order) in a lesson."""
+    """Next activity (id, sort_order) in a lesson, from the curriculum store."""
     try:
-        rows, _ = sb_exec(
-            sb.table("activities")
-              .select("id,sort_order")
-              .eq("lesson_id", lesson_id)
-              .gt("sort_order", sort_order)
-              .order("sort_order")
-              .limit(1)
-        )
-        return rows[0] if rows else None
+        return curriculum.snapshot().next_activity(lesson_id, sort_order)
     except Exception:
         return None
 
 
+# ---------------------------------------------------------------------
+# Health / cache stats
+# ---------------------------------------------------------------------
+@emotion_bp.get("/ping")
+def ping():
+    """Simple health check with near-duplicate frame cache hit rate."""
+    return jsonify({
+        "ok": True,
+        "backend": EMOTION_BACKEND,
+        "face_detector": FACE_DETECTOR,
+        "frame_cache": frame_cache.stats(),
+    })
+
+
 # ---------------------------------------------------------------------
 # Emotion Detection Route (JWT protected)
 # ---------------------------------------------------------------------
 @emotion_bp.post("/analyze")
 @require_student
+@idempotent
 def analyze_emotion():
     """Analyze webcam emotion safely (no 500 errors ever)."""
     sb = supabase_client.client
@@ -104,15 +112,9 @@ def analyze_emotion():
         return jsonify({"error": "Invalid base64 image"}), 400
 
     # Fetch activity
-    act_rows, err = sb_exec(
-        sb.table("activities")
-          .select("id,data,sort_order,lesson_id")
-          .eq("id", activities_id)
-          .limit(1)
-    )
-    if err or not act_rows:
+    act = curriculum.find_activity(activities_id)
+    if not act:
         return jsonify({"error": "Activity not found"}), 404
-    act = act_rows[0]
 
     # Parse JSON safely
     act_data = act.get("data")
@@ -136,15 +138,46 @@ def analyze_emotion():
     )
     expected_norm = _norm(exp_raw)
 
-    # Analyze image
+    # Analyze image (reuse the last prediction for near-identical frames)
+    cached = False
     try:
-        label, confidence, scores, latency_ms = _analyze_image(raw)
+        img = _decode_image(raw)
+        fhash = frame_hash(img)
+        prediction = frame_cache.lookup(sid, activities_id, fhash)
+        if prediction is not None:
+            cached = True
+            label, confidence, scores, _ = prediction
+            latency_ms = 0
+        else:
+            # Detect once; the box feeds both the quality gate and the model
+            face = largest_face(img)
+            # Cheap quality gate: skip the model on dark/blurred/faceless frames
+            rejected = check_frame(img, lang, face)
+            if rejected:
+                return jsonify({
+                    "ok": True,
+                    "rejected": True,
+                    "reason": rejected["reason"],
+                    "hint": rejected["hint"],
+                    "quality": rejected["metrics"],
+                    "label": None,
+                    "confidence": 0.0,
+                    "expected_emotion": expected_norm,
+                    "passed": False,
+                    "score": 0.0,
+                    "attempt_id": None,
+                    "next_activity": None,
+                    "auto": auto_flag,
+                    "cached": False,
+                })
+            label, confidence, scores, latency_ms = _analyze_image(img, face)
+            frame_cache.store(sid, activities_id, fhash, (label, confidence, scores, latency_ms))
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": f"Emotion detection failed: {e}"}), 200  # no 500
 
     label_norm = _norm(label)
-    print(f"[DEBUG] Detected={label_norm} Expected={expected_norm} Conf={confidence}")
+    print(f"[DEBUG] Detected={label_norm} Expected={expected_norm} Conf={confidence} cached={cached}")
 
     # Safe scores dict
     if not isinstance(scores, dict):
@@ -170,35 +203,37 @@ def analyze_emotion():
     score = 100.0 if passed else 0.0
     attempt_id = None
 
-    # Insert wrapped in try/except
+    # attempt + emotion_metrics + ledger in one transactional call
     if passed:
-        try:
-            ins = sb.table("activity_attempts").insert({
-                "students_id": sid,
-                "activities_id": activities_id,
-                "score": score,
-                "meta": {
-                    "layout": "emotion",
-                    "detected": {"label": label_norm, "confidence": round(confidence, 3)},
-                    "expected": expected_norm,
-                    "lang": lang,
-                    "auto": auto_flag,
-                },
-            }).execute()
-            attempt_id = (ins.data or [{}])[0].get("id")
-
-            sb.table("emotion_metrics").insert({
-                "attempt_id": attempt_id,
-                "students_id": sid,
-                "activities_id": activities_id,
+        rec, err = record_attempt(
+            sid,
+            activities_id,
+            score,
+            meta={
+                "layout": "emotion",
+                "detected": {"label": label_norm, "confidence": round(confidence, 3)},
+                "expected": expected_norm,
+                "lang": lang,
+                "auto": auto_flag,
+                "cached": cached,
+            },
+            metric_kind="emotion",
+            metric={
                 "detected_emotion": label_norm,
                 "expected_emotion": expected_norm,
                 "confidence": round(float(confidence), 3),
-                "model_backend": "deepface-opencv",
+                "model_backend": get_backend().name + ("-cache" if cached else ""),
                 "latency_ms": latency_ms,
-            }).execute()
-        except Exception as e:
-            print("⚠️ Supabase insert failed:", e)
+            },
+        )
+        if err:
+            print("⚠️ Supabase insert failed:", err)
+        else:
+            attempt_id = rec["attempt_id"]
+            touch_student(sid)
+            # achievement state runs on the background task runner
+            after_attempt(sid, score, attempt_id=attempt_id, activity_id=activities_id,
+                          layout="emotion", award=False)
 
     # Compute next activity safely
     try:
@@ -217,6 +252,7 @@ def analyze_emotion():
         "attempt_id": attempt_id,
         "next_activity": next_act,
         "auto": auto_flag,
+        "cached": cached,
     })
 
 # ---------------------------------------------------------------------
@@ -224,6 +260,7 @@ def analyze_emotion():
 # ---------------------------------------------------------------------
 @emotion_bp.post("/skip")
 @require_student
+@idempotent
 def skip_emotion():
     sb = supabase_client.client
     data = request.get_json(silent=True) or {}
@@ -234,32 +271,28 @@ def skip_emotion():
     if not activities_id:
         return jsonify({"error": "Missing activities_id"}), 400
 
-    act_rows, err = sb_exec(
-        sb.table("activities")
-          .select("lesson_id, sort_order")
-          .eq("id", activities_id)
-          .limit(1)
-    )
-    if err or not act_rows:
+    act = curriculum.find_activity(activities_id)
+    if not act:
         return jsonify({"error": "Activity not found"}), 404
-    act = act_rows[0]
 
-    try:
-        insert = sb.table("activity_attempts").insert({
-            "students_id": sid,
-            "activities_id": activities_id,
-            "score": 0.0,
-            "meta": {
-                "layout": "emotion",
-                "skipped": True,
-                "reason": "user_pressed_skip",
-                "lesson_id": lesson_id,
-            },
-        }).execute()
-        attempt_id = insert.data[0]["id"] if insert.data else None
-    except Exception as e:
-        traceback.print_exc()
-        return jsonify({"error": f"DB insert failed: {e}"}), 500
+    rec, err = record_attempt(
+        sid,
+        activities_id,
+        0.0,
+        meta={
+            "layout": "emotion",
+            "skipped": True,
+            "reason": "user_pressed_skip",
+            "lesson_id": lesson_id,
+        },
+    )
+    if err:
+        print("Skip attempt insert failed:", err)
+        return jsonify({"error": f"DB insert failed: {err}"}), 500
+    attempt_id = rec["attempt_id"]
+    touch_student(sid)
+    after_attempt(sid, 0.0, attempt_id=attempt_id, activity_id=activities_id,
+                  layout="emotion", award=False)
 
     next_act = _next_activity_for(sb, int(act["lesson_id"]), int(act["sort_order"]))
     return jsonify({"ok": True, "attempt_id": attempt_id, "next_activity": next_act})
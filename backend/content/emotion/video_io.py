@@ -1,4 +1,4 @@
-# backend/content/emotion/libreface.py
+# backend/content/emotion/video_io.py
 import torch
 from libreface import Inference
 
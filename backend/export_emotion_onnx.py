@@ -0,0 +1,47 @@
+# backend/export_emotion_onnx.py
+# Export DeepFace's emotion CNN (48x48 grayscale -> 7 FER classes) to ONNX so
+# the web workers can run it through cv2.dnn without TensorFlow
+# (HMH_EMOTION_BACKEND=onnx). Run once wherever deepface + tf2onnx are installed:
+#
+#   pip install tf2onnx
+#   python backend/export_emotion_onnx.py [output.onnx]
+
+import os
+import sys
+
+DEFAULT_OUT = os.path.join(os.path.dirname(__file__), "models", "emotion", "facial_expression.onnx")
+
+
+def _load_keras_model():
+    from deepface.modules import modeling
+    try:
+        client = modeling.build_model(task="facial_attribute", model_name="Emotion")
+    except TypeError:  # older deepface: build_model(model_name)
+        client = modeling.build_model("Emotion")
+    return client.model
+
+
+def main():
+    out_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_OUT
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+
+    import tensorflow as tf
+    import tf2onnx
+
+    model = _load_keras_model()
+    spec = (tf.TensorSpec((None, 48, 48, 1), tf.float32, name="input"),)
+
+    print("Converting DeepFace Emotion model to ONNX...")
+    # NCHW input so cv2.dnn.blobFromImage output can be fed directly
+    tf2onnx.convert.from_keras(
+        model,
+        input_signature=spec,
+        opset=13,
+        inputs_as_nchw=["input"],
+        output_path=out_path,
+    )
+    print(f"Saved {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 # backend/extensions.py
 
+import threading
+
 from flask_cors import CORS
 from supabase import create_client
 
@@ -23,3 +25,58 @@ class SupabaseClient:
         return getattr(self.client, name)
 
 supabase_client = SupabaseClient()
+
+
+class PgPool:
+    """
+    Lazily-opened psycopg connection pool for the direct Postgres path.
+    Stays disabled when DATABASE_URL is not set. Opened on first use so
+    each gunicorn worker gets its own connections after fork.
+    """
+
+    def __init__(self):
+        self.pool = None
+        self._conninfo = None
+        self._opts = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._conninfo = app.config.get("DATABASE_URL")
+        threshold = str(app.config.get("PG_PREPARE_THRESHOLD", "5")).strip().lower()
+        self._opts = {
+            "min_size": int(app.config.get("PG_POOL_MIN", 1)),
+            "max_size": int(app.config.get("PG_POOL_MAX", 5)),
+            "prepare_threshold": None if threshold in ("", "off", "none") else int(threshold),
+        }
+        if not self._conninfo:
+            print("[PG] DATABASE_URL not set; direct SQL path disabled")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._conninfo)
+
+    def get(self):
+        if self.pool is None:
+            if not self._conninfo:
+                raise RuntimeError("DATABASE_URL not configured")
+            with self._lock:
+                if self.pool is None:
+                    from psycopg.rows import dict_row
+                    from psycopg_pool import ConnectionPool
+                    self.pool = ConnectionPool(
+                        self._conninfo,
+                        min_size=self._opts["min_size"],
+                        max_size=self._opts["max_size"],
+                        kwargs={
+                            "autocommit": True,
+                            "row_factory": dict_row,
+                            "prepare_threshold": self._opts["prepare_threshold"],
+                        },
+                        open=True,
+                    )
+        return self.pool
+
+    def connection(self, timeout: float = None):
+        return self.get().connection(timeout=timeout)
+
+pg_pool = PgPool()
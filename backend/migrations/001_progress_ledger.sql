@@ -0,0 +1,160 @@
+-- backend/migrations/001_progress_ledger.sql
+-- Best-score ledger: completion/gating/graduation become indexed lookups
+-- instead of rescanning activity_attempts.
+--
+--   student_activity_best  one row per (student, activity): best score so far
+--   student_lesson_ledger  one row per (student, lesson): activities with a
+--                          best >= 60 and the sum of best scores
+--
+-- Maintained by a trigger on activity_attempts (every insert path, including
+-- PostgREST), and kept consistent when activities are deleted or moved to
+-- another lesson. Safe to re-run; the backfill at the end rebuilds both
+-- tables from activity_attempts.
+--
+-- Apply: psql "$DATABASE_URL" -f backend/migrations/001_progress_ledger.sql
+
+begin;
+
+create table if not exists student_activity_best (
+  students_id   uuid        not null,
+  activities_id bigint      not null,
+  lesson_id     bigint,
+  best_score    numeric     not null default 0,
+  attempts      integer     not null default 0,
+  updated_at    timestamptz not null default now(),
+  primary key (students_id, activities_id)
+);
+create index if not exists student_activity_best_lesson_idx
+  on student_activity_best (lesson_id, students_id);
+
+create table if not exists student_lesson_ledger (
+  students_id       uuid        not null,
+  lesson_id         bigint      not null,
+  activities_passed integer     not null default 0,
+  best_sum          numeric     not null default 0,
+  updated_at        timestamptz not null default now(),
+  primary key (students_id, lesson_id)
+);
+
+-- Fold one attempt into the ledger; returns the updated counters.
+create or replace function hmh_ledger_record(p_student uuid, p_activity bigint, p_score numeric)
+returns table (lesson_id bigint, best_score numeric, activities_passed integer, best_sum numeric)
+language plpgsql as $$
+#variable_conflict use_column
+declare
+  v_lesson bigint;
+  v_score  numeric := coalesce(p_score, 0);
+  v_old    numeric;
+  v_new    numeric;
+  v_passed integer := 0;
+  v_sum    numeric := 0;
+begin
+  select a.lesson_id into v_lesson from activities a where a.id = p_activity;
+
+  insert into student_activity_best as b (students_id, activities_id, lesson_id)
+  values (p_student, p_activity, v_lesson)
+  on conflict (students_id, activities_id) do nothing;
+
+  select b.best_score into v_old
+    from student_activity_best b
+   where b.students_id = p_student and b.activities_id = p_activity
+     for update;
+
+  v_new := greatest(v_old, v_score);
+  update student_activity_best b
+     set best_score = v_new, attempts = b.attempts + 1, lesson_id = v_lesson, updated_at = now()
+   where b.students_id = p_student and b.activities_id = p_activity;
+
+  if v_lesson is not null then
+    insert into student_lesson_ledger as l (students_id, lesson_id)
+    values (p_student, v_lesson)
+    on conflict (students_id, lesson_id) do nothing;
+
+    update student_lesson_ledger l
+       set activities_passed = l.activities_passed
+                               + case when v_old < 60 and v_new >= 60 then 1 else 0 end,
+           best_sum = l.best_sum + (v_new - v_old),
+           updated_at = now()
+     where l.students_id = p_student and l.lesson_id = v_lesson
+    returning l.activities_passed, l.best_sum into v_passed, v_sum;
+  end if;
+
+  return query select v_lesson, v_new, v_passed, v_sum;
+end $$;
+
+-- Recompute one lesson's counters from the per-activity rows.
+create or replace function hmh_ledger_rebuild_lesson(p_lesson bigint)
+returns void language sql as $$
+  delete from student_lesson_ledger where lesson_id = p_lesson;
+  insert into student_lesson_ledger (students_id, lesson_id, activities_passed, best_sum)
+  select b.students_id, p_lesson,
+         count(*) filter (where b.best_score >= 60),
+         coalesce(sum(b.best_score), 0)
+    from student_activity_best b
+   where b.lesson_id = p_lesson
+   group by b.students_id;
+$$;
+
+create or replace function hmh_ledger_on_attempt()
+returns trigger language plpgsql as $$
+begin
+  perform hmh_ledger_record(new.students_id::uuid, new.activities_id::bigint, new.score::numeric);
+  return new;
+end $$;
+
+drop trigger if exists hmh_ledger_on_attempt on activity_attempts;
+create trigger hmh_ledger_on_attempt
+  after insert on activity_attempts
+  for each row execute function hmh_ledger_on_attempt();
+
+create or replace function hmh_ledger_on_activity_change()
+returns trigger language plpgsql as $$
+begin
+  if tg_op = 'DELETE' then
+    delete from student_activity_best where activities_id = old.id;
+    if old.lesson_id is not null then
+      perform hmh_ledger_rebuild_lesson(old.lesson_id);
+    end if;
+    return old;
+  end if;
+  -- UPDATE OF lesson_id
+  update student_activity_best set lesson_id = new.lesson_id where activities_id = new.id;
+  if old.lesson_id is not null then
+    perform hmh_ledger_rebuild_lesson(old.lesson_id);
+  end if;
+  if new.lesson_id is not null then
+    perform hmh_ledger_rebuild_lesson(new.lesson_id);
+  end if;
+  return new;
+end $$;
+
+drop trigger if exists hmh_ledger_on_activity_change on activities;
+create trigger hmh_ledger_on_activity_change
+  after delete or update of lesson_id on activities
+  for each row execute function hmh_ledger_on_activity_change();
+
+-- Backfill (and repair) from the attempt history.
+lock table activity_attempts in share mode;
+
+insert into student_activity_best (students_id, activities_id, lesson_id, best_score, attempts)
+select at.students_id::uuid, at.activities_id::bigint, a.lesson_id,
+       max(coalesce(at.score, 0)), count(*)
+  from activity_attempts at
+  join activities a on a.id = at.activities_id
+ group by at.students_id, at.activities_id, a.lesson_id
+on conflict (students_id, activities_id) do update
+   set best_score = excluded.best_score,
+       attempts   = excluded.attempts,
+       lesson_id  = excluded.lesson_id,
+       updated_at = now();
+
+delete from student_lesson_ledger;
+insert into student_lesson_ledger (students_id, lesson_id, activities_passed, best_sum)
+select b.students_id, b.lesson_id,
+       count(*) filter (where b.best_score >= 60),
+       coalesce(sum(b.best_score), 0)
+  from student_activity_best b
+ where b.lesson_id is not null
+ group by b.students_id, b.lesson_id;
+
+commit;
@@ -0,0 +1,77 @@
+-- backend/migrations/002_record_attempt.sql
+-- hmh_record_attempt: one call, one transaction for an attempt and its
+-- side effects:
+--   1. insert into activity_attempts (the ledger trigger from
+--      001_progress_ledger.sql updates the best-score ledger)
+--   2. insert the modality metric row (speech_metrics / emotion_metrics)
+--      pointing at the new attempt, when p_metric_kind is given
+--   3. return the attempt id and the student's updated lesson counters
+-- Either everything is written or nothing is (no orphan metric rows).
+-- Requires 001_progress_ledger.sql.
+--
+-- Apply: psql "$DATABASE_URL" -f backend/migrations/002_record_attempt.sql
+-- Try it on a local database without keeping the rows:
+--   begin;
+--   select * from hmh_record_attempt('<students_id>', <activity_id>, 100,
+--     '{"layout": "asr"}', 'speech',
+--     '{"recognized_text": "apple", "expected_text": "apple", "accuracy": 100, "lang": "en"}');
+--   rollback;
+
+begin;
+
+create or replace function hmh_record_attempt(
+  p_student     uuid,
+  p_activity    bigint,
+  p_score       numeric,
+  p_meta        jsonb default '{}'::jsonb,
+  p_metric_kind text  default null,   -- 'speech' | 'emotion' | null
+  p_metric      jsonb default null
+)
+returns table (
+  attempt_id        bigint,
+  lesson_id         bigint,
+  best_score        numeric,
+  activities_passed integer,
+  best_sum          numeric
+)
+language plpgsql as $$
+#variable_conflict use_column
+declare
+  v_id     bigint;
+  v_lesson bigint;
+  v_metric jsonb := coalesce(p_metric, '{}'::jsonb)
+                    || jsonb_build_object('students_id', p_student, 'activities_id', p_activity);
+begin
+  insert into activity_attempts (students_id, activities_id, score, meta)
+  values (p_student, p_activity, p_score, coalesce(p_meta, '{}'::jsonb))
+  returning id into v_id;
+
+  v_metric := v_metric || jsonb_build_object('attempt_id', v_id);
+
+  if p_metric_kind = 'speech' then
+    insert into speech_metrics (attempt_id, students_id, activities_id, recognized_text,
+                                expected_text, accuracy, lang, model_used, latency_ms)
+    select r.attempt_id, r.students_id, r.activities_id, r.recognized_text,
+           r.expected_text, r.accuracy, r.lang, r.model_used, r.latency_ms
+      from jsonb_populate_record(null::speech_metrics, v_metric) r;
+  elsif p_metric_kind = 'emotion' then
+    insert into emotion_metrics (attempt_id, students_id, activities_id, detected_emotion,
+                                 expected_emotion, confidence, model_backend, latency_ms)
+    select r.attempt_id, r.students_id, r.activities_id, r.detected_emotion,
+           r.expected_emotion, r.confidence, r.model_backend, r.latency_ms
+      from jsonb_populate_record(null::emotion_metrics, v_metric) r;
+  elsif p_metric_kind is not null then
+    raise exception 'hmh_record_attempt: unknown metric kind %', p_metric_kind;
+  end if;
+
+  select a.lesson_id into v_lesson from activities a where a.id = p_activity;
+
+  return query
+    select v_id, v_lesson, b.best_score, coalesce(l.activities_passed, 0), coalesce(l.best_sum, 0)
+      from student_activity_best b
+      left join student_lesson_ledger l
+        on l.students_id = p_student and l.lesson_id = v_lesson
+     where b.students_id = p_student and b.activities_id = p_activity;
+end $$;
+
+commit;
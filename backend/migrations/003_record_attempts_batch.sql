@@ -0,0 +1,61 @@
+-- backend/migrations/003_record_attempts_batch.sql
+-- hmh_record_attempts: record an ordered batch of attempts for one student
+-- in one call and one transaction (POST /api/student/attempts/batch).
+-- Each element of p_items is
+--   {"activity_id": 12, "score": 100, "meta": {...},
+--    "metric_kind": "speech" | "emotion" | null, "metric": {...} | null}
+-- and goes through hmh_record_attempt (002), so the attempt, its metric row
+-- and the ledger update stay identical to a single submission. Items are
+-- recorded in array order; one bad item rolls back the whole batch.
+-- Returns one row per item: idx (0-based position in p_items) plus the
+-- hmh_record_attempt columns.
+-- Requires 002_record_attempt.sql.
+--
+-- Apply: psql "$DATABASE_URL" -f backend/migrations/003_record_attempts_batch.sql
+-- Try it on a local database without keeping the rows:
+--   begin;
+--   select * from hmh_record_attempts('<students_id>',
+--     '[{"activity_id": <id>, "score": 100, "meta": {"layout": "mcq"}},
+--       {"activity_id": <id>, "score": 0,   "meta": {"layout": "mcq"}}]');
+--   rollback;
+
+begin;
+
+create or replace function hmh_record_attempts(p_student uuid, p_items jsonb)
+returns table (
+  idx               integer,
+  attempt_id        bigint,
+  lesson_id         bigint,
+  best_score        numeric,
+  activities_passed integer,
+  best_sum          numeric
+)
+language plpgsql as $$
+#variable_conflict use_column
+declare
+  v_item jsonb;
+  v_idx  integer;
+begin
+  if jsonb_typeof(p_items) <> 'array' then
+    raise exception 'hmh_record_attempts: p_items must be a json array';
+  end if;
+
+  for v_item, v_idx in
+    select e.value, (e.ord - 1)::integer
+      from jsonb_array_elements(p_items) with ordinality as e(value, ord)
+     order by e.ord
+  loop
+    return query
+      select v_idx, r.attempt_id, r.lesson_id, r.best_score, r.activities_passed, r.best_sum
+        from hmh_record_attempt(
+               p_student,
+               (v_item->>'activity_id')::bigint,
+               (v_item->>'score')::numeric,
+               coalesce(v_item->'meta', '{}'::jsonb),
+               v_item->>'metric_kind',
+               case when jsonb_typeof(v_item->'metric') = 'object' then v_item->'metric' end
+             ) r;
+  end loop;
+end $$;
+
+commit;
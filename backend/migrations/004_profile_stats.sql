@@ -0,0 +1,66 @@
+-- backend/migrations/004_profile_stats.sql
+-- hmh_profile_stats: everything the student profile page aggregates, in one
+-- call (GET /api/student/profile, via student/profile_stats.py):
+--   by_type          {activity type: {attempts, avg, passed}} over all attempts
+--   lessons_completed lesson_progress rows completed (or best >= 60)
+--   perfect_lesson    any completed lesson with best_score = 100
+--   weekend_days      distinct Sat/Sun weekdays among completions (0..2, UTC)
+--   recent_emotions   emotion labels from the last 5 attempts' meta
+--
+-- Apply: psql "$DATABASE_URL" -f backend/migrations/004_profile_stats.sql
+-- Try it: select hmh_profile_stats('<students_id>');
+
+begin;
+
+create index if not exists activity_attempts_student_id_idx
+  on activity_attempts (students_id, id desc);
+
+create or replace function hmh_profile_stats(p_student uuid)
+returns jsonb
+language sql stable as $$
+  with done as (
+    select lp.best_score, lp.completed_at
+      from lesson_progress lp
+      join lessons l on l.id = lp.lesson_id
+     where lp.students_id = p_student
+       and (lp.status = 'completed' or coalesce(lp.best_score, 0) >= 60)
+  ),
+  by_type as (
+    select a.type,
+           count(*)                                  as attempts,
+           avg(aa.score)                             as avg_score,
+           count(*) filter (where aa.score >= 60)    as passed
+      from activity_attempts aa
+      join activities a on a.id = aa.activities_id
+     where aa.students_id = p_student
+     group by a.type
+  ),
+  recent as (
+    select aa.id,
+           coalesce(aa.meta->>'recognized_emotion', aa.meta->>'emotion_label') as label
+      from activity_attempts aa
+     where aa.students_id = p_student
+     order by aa.id desc
+     limit 5
+  )
+  select jsonb_build_object(
+    'by_type', coalesce(
+      (select jsonb_object_agg(t.type, jsonb_build_object(
+                'attempts', t.attempts, 'avg', t.avg_score, 'passed', t.passed))
+         from by_type t
+        where t.type is not null),
+      '{}'::jsonb),
+    'lessons_completed', (select count(*) from done),
+    'perfect_lesson', exists (select 1 from done where best_score = 100),
+    'weekend_days', (
+      select count(distinct extract(isodow from (completed_at::timestamptz at time zone 'UTC')))
+        from done
+       where completed_at is not null
+         and extract(isodow from (completed_at::timestamptz at time zone 'UTC')) in (6, 7)),
+    'recent_emotions', coalesce(
+      (select jsonb_agg(r.label order by r.id desc) from recent r where r.label is not null),
+      '[]'::jsonb)
+  );
+$$;
+
+commit;
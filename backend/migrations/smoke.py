@@ -0,0 +1,137 @@
+# backend/migrations/smoke.py
+# Smoke check for the direct-Postgres path and the migrated functions, run
+# against a real database (a local copy or staging, never production data
+# you can't afford to lock briefly):
+#
+#   cd backend
+#   DATABASE_URL=postgresql://... python migrations/smoke.py
+#
+# Checks, through the same pool and helpers the app uses (utils/pg.py):
+#   - sql_exec / sql_one round trips, repeated past the prepare threshold
+#   - sql_stream over more rows than one server-side cursor fetch
+#   - 001-004 are applied (tables, functions, trigger)
+#   - hmh_profile_stats returns the documented shape
+#   - hmh_record_attempt / hmh_record_attempts write the attempt, metric and
+#     ledger rows, inside a transaction that is always rolled back
+# Exits 1 if any check fails; checks that need data (a student and an
+# activity) are skipped on an empty database.
+
+import json
+import os
+import sys
+import uuid
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions import pg_pool
+from utils.pg import sql_exec, sql_one, sql_stream
+
+FUNCTIONS = ("hmh_ledger_record", "hmh_ledger_rebuild_lesson", "hmh_record_attempt",
+             "hmh_record_attempts", "hmh_profile_stats")
+TABLES = ("student_activity_best", "student_lesson_ledger")
+STATS_KEYS = {"by_type", "lessons_completed", "perfect_lesson", "weekend_days", "recent_emotions"}
+
+_failed = 0
+
+
+def check(name, ok, detail=""):
+    global _failed
+    if ok is None:
+        print(f"SKIP  {name}  {detail}")
+        return
+    if not ok:
+        _failed += 1
+    print(f"{'ok  ' if ok else 'FAIL'}  {name}  {detail}")
+
+
+def _basics():
+    row, err = sql_one("select 1 as one, now() as at")
+    check("sql_one", not err and row and row.get("one") == 1, err or "")
+
+    errs = [sql_exec("select %s::int as n", (i,))[1] for i in range(8)]
+    check("sql_exec repeated (prepared)", not any(errs), next((e for e in errs if e), ""))
+
+    _, err = sql_exec("select * from no_such_table_hmh")
+    check("sql_exec error contract", bool(err), "error returned, not raised")
+
+    n = sum(1 for _ in sql_stream("select g from generate_series(1, %s) g", (2500,), batch_size=1000))
+    check("sql_stream", n == 2500, f"{n} rows")
+
+
+def _schema():
+    rows, err = sql_exec("select proname from pg_proc where proname = any(%s)", (list(FUNCTIONS),))
+    have = {r["proname"] for r in rows or []}
+    check("functions", not err and have == set(FUNCTIONS), err or f"missing: {sorted(set(FUNCTIONS) - have)}")
+
+    for t in TABLES:
+        row, err = sql_one("select to_regclass(%s) is not null as ok", (t,))
+        check(f"table {t}", not err and row and row["ok"], err or "")
+
+    row, err = sql_one(
+        "select count(*) as n from pg_trigger t join pg_class c on c.oid = t.tgrelid "
+        "where c.relname = 'activity_attempts' and t.tgname = 'hmh_ledger_on_attempt'"
+    )
+    check("ledger trigger", not err and row and row["n"] == 1, err or "")
+
+    row, err = sql_one("select hmh_profile_stats(%s) as stats", (str(uuid.uuid4()),))
+    stats = (row or {}).get("stats")
+    check("hmh_profile_stats shape", not err and isinstance(stats, dict) and set(stats) == STATS_KEYS,
+          err or "")
+
+
+def _record_rolled_back():
+    student, err = sql_one("select students_id from students limit 1")
+    activity, err2 = sql_one("select id from activities order by id limit 1")
+    if err or err2 or not student or not activity:
+        check("hmh_record_attempt", None, "no student/activity rows")
+        check("hmh_record_attempts", None, "no student/activity rows")
+        return
+    sid, aid = str(student["students_id"]), int(activity["id"])
+    metric = {"recognized_text": "smoke", "expected_text": "smoke", "accuracy": 100, "lang": "en"}
+
+    with pg_pool.connection() as conn:
+        with conn.transaction(force_rollback=True):
+            with conn.cursor() as cur:
+                cur.execute(
+                    "select * from hmh_record_attempt(%s, %s, %s, %s::jsonb, %s, %s::jsonb)",
+                    (sid, aid, 100, json.dumps({"layout": "smoke"}), "speech", json.dumps(metric)),
+                )
+                one = cur.fetchone()
+                check("hmh_record_attempt", bool(one and one["attempt_id"]), str(one))
+
+                cur.execute("select count(*) as n from speech_metrics where attempt_id = %s",
+                            (one["attempt_id"],))
+                check("  metric row", cur.fetchone()["n"] == 1)
+
+                cur.execute("select best_score from student_activity_best "
+                            "where students_id = %s and activities_id = %s", (sid, aid))
+                best = cur.fetchone()
+                check("  ledger row", bool(best) and float(best["best_score"]) == 100.0, str(best))
+
+                items = [{"activity_id": aid, "score": 40, "meta": {"layout": "smoke"}},
+                         {"activity_id": aid, "score": 80, "meta": {"layout": "smoke"}}]
+                cur.execute("select * from hmh_record_attempts(%s, %s::jsonb)", (sid, json.dumps(items)))
+                rows = cur.fetchall()
+                check("hmh_record_attempts", [r["idx"] for r in rows] == [0, 1]
+                      and rows[0]["attempt_id"] < rows[1]["attempt_id"], f"{len(rows)} rows")
+    ids = [one["attempt_id"]] + [r["attempt_id"] for r in rows]
+    row, err = sql_one("select count(*) as n from activity_attempts where id = any(%s)", (ids,))
+    check("rolled back", not err and row and row["n"] == 0, err or f"{(row or {}).get('n')} rows kept")
+
+
+def main():
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        print("DATABASE_URL is not set")
+        return 2
+    pg_pool.init_app(SimpleNamespace(config={"DATABASE_URL": url}))
+    _basics()
+    _schema()
+    _record_rolled_back()
+    print("FAILED" if _failed else "all checks passed")
+    return 1 if _failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
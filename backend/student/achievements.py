@@ -1,33 +1,285 @@
 # backend/student/achievements.py
 # Achievement awarding logic
 # Returns (inline_codes, profile_only_codes)
+#
+# Incremental engine: each worker keeps a small running state per student
+# (current pass streak, sound-pass count, per-lesson "all 100" flags, earned
+# codes) and folds every new attempt into it in O(1), so award checks never
+# rescan the attempt history. The state is built from the full history the
+# first time a student is seen in this worker, after forget() (attempts
+# deleted), every HMH_ACH_REBUILD_AFTER seconds, or via rebuild() after
+# backfills. When another worker recorded an attempt (per-student
+# "attempts" stamp, utils/stamps.py, compared on every use) or after
+# HMH_ACH_STATE_TTL seconds, it is instead brought up to date by folding
+# only the attempts with an id above the last one it read (state.upto).
+# Attempts that don't award anything (emotion, skips) still go through
+# observe_attempt() so streaks stay exact.
+# Folding is keyed on attempt id, so a retried task never counts an attempt
+# twice. A worker only folds into a state whose stamp it can compare-and-set
+# (stamps.bump_if), so two workers can't both fold against the same version.
 
+import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from utils.sb import sb_exec
+
+from extensions import supabase_client
+from utils.sb import sb_exec, sb_stream
+from utils import stamps
+from content.curriculum import curriculum
 
 PASS = 60
+CAS_TRIES = 3
 
 INLINE_CODES = {"first_correct", "three_in_a_row", "streak_master", "sharpshooter"}
 PROFILE_ONLY_CODES = {"scholar", "wildfire"}
 
+STATE_TTL = float(os.getenv("HMH_ACH_STATE_TTL", "3600"))            # fold forward after this
+REBUILD_AFTER = float(os.getenv("HMH_ACH_REBUILD_AFTER", "86400"))   # full rebuild after this
+STATE_MAX = int(os.getenv("HMH_ACH_STATE_MAX", "5000"))  # students kept per worker (LRU)
 
-def _has_achievement(sb, sid, code):
-    rows, err = sb_exec(
-        sb.table("student_achievements")
-          .select("id")
-          .eq("students_id", sid)
-          .eq("achievements_code", code)
-          .limit(1)
-    )
-    return bool(rows)
+
+def attempts_stamp_name(sid) -> str:
+    return f"attempts-{sid}"
+
+
+def reset_stamp_name(sid) -> str:
+    return f"attempts-reset-{sid}"
+
+
+def _score(v):
+    """float score, or None when missing/unparseable (breaks a streak, like before)."""
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class AchievementState:
+    """Running per-student counters; mutate only through AchievementEngine."""
+
+    def __init__(self, stamp: str, reset: str = ""):
+        self.stamp = stamp
+        self.reset = reset       # reset stamp at build time (forget() changes it)
+        self.built_at = time.monotonic()
+        self.checked_at = self.built_at
+        self.streak = 0          # consecutive passes at the end of the history
+        self.sound_passes = 0    # passing attempts with meta.layout == "sound"
+        self.lessons = {}        # lesson_id -> [scored_attempts, all_scores_100]
+        self.earned = set()
+        self.upto = 0            # highest attempt id seen by the rebuild
+        self.skipped = set()     # ids <= upto the rebuild left out (exclude=)
+        self.folded = set()      # ids folded since the rebuild
+
+    def has(self, attempt_id) -> bool:
+        """True if this attempt is already counted."""
+        try:
+            aid = int(attempt_id)
+        except (TypeError, ValueError):
+            return False
+        return aid in self.folded or (aid <= self.upto and aid not in self.skipped)
+
+    def fold(self, score, layout=None, lesson_id=None):
+        s = _score(score)
+        self.streak = self.streak + 1 if (s is not None and s >= PASS) else 0
+        if layout == "sound" and s is not None and s >= PASS:
+            self.sound_passes += 1
+        if lesson_id is not None and score is not None and s is not None:
+            entry = self.lessons.setdefault(int(lesson_id), [0, True])
+            entry[0] += 1
+            entry[1] = entry[1] and s == 100.0
+
+    def lesson_perfect(self, lesson_id) -> bool:
+        try:
+            entry = self.lessons.get(int(lesson_id)) if lesson_id else None
+        except (TypeError, ValueError):
+            print("Sharpshooter: invalid lesson_id:", repr(lesson_id))
+            return False
+        return bool(entry and entry[0] > 0 and entry[1])
 
 
-def _award_once(sb, sid, code):
+def _lesson_of(activity_id):
+    act = curriculum.snapshot().activity(activity_id) if activity_id is not None else None
+    return act.get("lesson_id") if act else None
+
+
+class AchievementEngine:
+    def __init__(self):
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def rebuild(self, sb, sid, exclude=()) -> AchievementState:
+        """
+        Recompute a student's state from their full attempt history (one
+        streamed pass). Attempt ids in `exclude` are skipped so a caller can
+        fold them itself, one at a time.
+        """
+        exclude = set(exclude or ())
+        sb = sb or supabase_client.client
+        stamp = stamps.read(attempts_stamp_name(sid))
+        state = AchievementState(stamp, stamps.read(reset_stamp_name(sid)))
+        rows = self._attempts_after(sb, sid, 0, "achievement rebuild")
+        self._fold_rows(sb, sid, state, rows, exclude, "achievement rebuild")
+        self._put(sid, state)
+        return state
+
+    def _attempts_after(self, sb, sid, upto, name):
+        """The student's attempts with id > upto, in id order (streamed)."""
+        return sb_stream(
+            lambda: sb.table("activity_attempts")
+                      .select("id, activities_id, score, layout:meta->>layout")
+                      .eq("students_id", sid)
+                      .gt("id", upto),
+            name=name,
+        )
+
+    def _fold_rows(self, sb, sid, state, rows, exclude, name):
+        """Fold attempt rows (id order) into state, then reload its earned codes."""
+        for r in rows:
+            aid = r.get("id")
+            if aid is not None:
+                aid = int(aid)
+                state.upto = max(state.upto, aid)
+                if aid in state.folded:
+                    state.folded.discard(aid)   # already counted; now covered by upto
+                    continue
+                if aid in exclude:
+                    state.skipped.add(aid)
+                    continue
+            state.fold(r.get("score"), r.get("layout"), _lesson_of(r.get("activities_id")))
+
+        earned, err = sb_exec(
+            sb.table("student_achievements").select("achievements_code").eq("students_id", sid)
+        )
+        if err:
+            raise RuntimeError(f"{name}: {err}")
+        state.earned = {r.get("achievements_code") for r in earned or []}
+
+    def _fold_forward(self, sb, sid, state, exclude) -> bool:
+        """
+        Bring a stale state up to date by folding only the attempts recorded
+        after state.upto. False (state untouched) when another worker's
+        attempt sits between ones this worker already folded: the streak
+        depends on order, so the caller rebuilds instead.
+        """
+        sb = sb or supabase_client.client
+        stamp = stamps.read(attempts_stamp_name(sid))
+        rows = list(self._attempts_after(sb, sid, state.upto, "achievement fold-forward"))
+        if state.folded:
+            last_own = max(state.folded)
+            for r in rows:
+                aid = r.get("id")
+                if aid is None or int(aid) in state.folded or int(aid) in exclude:
+                    continue
+                if int(aid) < last_own:
+                    return False
+        self._fold_rows(sb, sid, state, rows, exclude, "achievement fold-forward")
+        state.stamp = stamp
+        state.checked_at = time.monotonic()
+        return True
+
+    def _put(self, sid, state):
+        with self._lock:
+            self._states[sid] = state
+            self._states.move_to_end(sid)
+            while len(self._states) > STATE_MAX:
+                self._states.popitem(last=False)
+
+    def _cached(self, sid):
+        """(state, fresh): the cached state, None if it must be rebuilt; fresh
+        when it still reflects every recorded attempt."""
+        with self._lock:
+            state = self._states.get(sid)
+        if state is None:
+            return None, False
+        if (time.monotonic() - state.built_at > REBUILD_AFTER
+                or stamps.read(reset_stamp_name(sid)) != state.reset):
+            return None, False
+        fresh = (time.monotonic() - state.checked_at <= STATE_TTL
+                 and stamps.read(attempts_stamp_name(sid)) == state.stamp)
+        return state, fresh
+
+    def _claim(self, sb, sid, exclude):
+        """
+        A state that reflects every recorded attempt, with the stamp already
+        moved past it by this worker (compare-and-set). Returns (state,
+        new_stamp, reloaded); reloaded means it was just read from the
+        database, so it already counts every committed attempt.
+        """
+        name = attempts_stamp_name(sid)
+        for _ in range(CAS_TRIES):
+            state, fresh = self._cached(sid)
+            reloaded = not fresh
+            if state is not None and not fresh and not self._fold_forward(sb, sid, state, exclude):
+                state = None
+            if state is None:
+                state = self.rebuild(sb, sid, exclude=exclude)
+            new = stamps.bump_if(name, state.stamp)
+            if new is not None:
+                return state, new, reloaded
+            # another worker folded meanwhile (or the stamp can't be written):
+            # the next round folds forward from here
+        raise RuntimeError(f"could not claim the achievement state for {sid}; giving up for now")
+
+    def observe(self, sb, sid, score, *, attempt_id=None, activity_id=None, lesson_id=None,
+                layout=None) -> AchievementState:
+        """Fold one just-inserted attempt into the student's state."""
+        return self.observe_many(sb, sid, [{
+            "score": score, "attempt_id": attempt_id, "activity_id": activity_id,
+            "lesson_id": lesson_id, "layout": layout,
+        }])
+
+    def observe_many(self, sb, sid, items, on_fold=None) -> AchievementState:
+        """
+        Fold a batch of just-inserted attempts (dicts with score, attempt_id,
+        activity_id, lesson_id, layout) in order, calling on_fold(state, item)
+        after each one. Attempts the state already counts (a retried task)
+        are not folded again, but on_fold still runs for them; a rebuild
+        leaves the batch out so it is folded here.
+        """
+        exclude = {int(it["attempt_id"]) for it in items if it.get("attempt_id") is not None}
+        state, new_stamp, reloaded = self._claim(sb, sid, exclude)
+        for it in items:
+            aid = it.get("attempt_id")
+            # without an id only a reload can tell: it already read the row
+            if not (state.has(aid) if aid is not None else reloaded):
+                act = it.get("activity_id")
+                lid = _lesson_of(act) if act is not None else it.get("lesson_id")
+                state.fold(it.get("score"), it.get("layout"), lid)
+                if aid is not None:
+                    state.folded.add(int(aid))
+            if on_fold is not None:
+                on_fold(state, it)
+        state.stamp = new_stamp
+        return state
+
+    def forget(self, sid):
+        """Drop the state everywhere (e.g. after deleting attempts): forces a full rebuild."""
+        stamps.bump(reset_stamp_name(sid))
+        stamps.bump(attempts_stamp_name(sid))
+        with self._lock:
+            self._states.pop(sid, None)
+
+
+engine = AchievementEngine()
+
+
+def observe_attempt(sb, sid, score, *, attempt_id=None, activity_id=None, layout=None):
+    """For inserts that don't award anything; never fails the request."""
+    try:
+        engine.observe(sb, sid, score, attempt_id=attempt_id, activity_id=activity_id, layout=layout)
+    except Exception as e:
+        print("Achievement state update failed:", e)
+        engine.forget(sid)
+
+
+def _award_once(sb, sid, code, state):
     """
     Insert achievement once.
     Safe with Supabase v2 (no .select() after insert).
     """
-    if _has_achievement(sb, sid, code):
+    if code in state.earned:
         return False
 
     rows, err = sb_exec(
@@ -42,90 +294,12 @@ def _award_once(sb, sid, code):
         print("Achievement insert failed:", err, "code=", code, "student=", sid)
         return False
 
+    state.earned.add(code)
     return True
 
 
-def _consecutive_passes(sb, sid, max_lookback=50):
-    rows, _ = sb_exec(
-        sb.table("activity_attempts")
-          .select("score")
-          .eq("students_id", sid)
-          .order("id", desc=True)
-          .limit(max_lookback)
-    )
-    streak = 0
-    for r in rows or []:
-        try:
-            if float(r.get("score", 0)) >= PASS:
-                streak += 1
-            else:
-                break
-        except Exception:
-            break
-    return streak
-
-
-def _total_sound_passes(sb, sid):
-    # Fallback direct count (works without RPC)
-    rows, err = sb_exec(
-        sb.table("activity_attempts")
-          .select("id, meta, score")
-          .eq("students_id", sid)
-          .gte("score", PASS)
-    )
-    if err or not rows:
-        return 0
-    total = 0
-    for r in rows:
-        meta = r.get("meta") or {}
-        if meta.get("layout") == "sound":
-            total += 1
-    return total
-
-
-def _lesson_perfect(sb, sid, lesson_id: int) -> bool:
-    """
-    Sharpshooter:
-      True if ALL attempts in a lesson are 100.
-
-    Defensive:
-      • Ignores bad lesson_id
-      • Ignores rows with null scores
-    """
-    try:
-        if not lesson_id:
-            return False
-        try:
-            lid = int(lesson_id)
-        except Exception:
-            print("Sharpshooter: invalid lesson_id:", repr(lesson_id))
-            return False
-
-        rows, err = sb_exec(
-            sb.table("activity_attempts")
-              .select("score, activities!inner(lesson_id)")
-              .eq("students_id", sid)
-              .eq("activities.lesson_id", lid)
-        )
-        if err or not rows:
-            return False
-
-        scores = [
-            float(r.get("score") or 0)
-            for r in rows
-            if r.get("score") is not None
-        ]
-        if not scores:
-            return False
-
-        print(f"Sharpshooter debug → lesson_id={lid}, scores={scores}")
-        return all(s == 100.0 for s in scores)
-    except Exception as e:
-        print("Sharpshooter check failed:", e)
-        return False
-
-
-def check_and_award_achievements(sb, sid, score, *, lesson_id=None, layout=None):
+def check_and_award_achievements(sb, sid, score, *, lesson_id=None, layout=None, activity_id=None,
+                                 attempt_id=None):
     """
     Call AFTER recording the attempt.
     Args:
@@ -134,32 +308,53 @@ def check_and_award_achievements(sb, sid, score, *, lesson_id=None, layout=None)
       score: numeric
       lesson_id: for Sharpshooter
       layout: 'sound' | 'asr' | 'emotion' | ...
+      activity_id: the attempt's activity (maps it to its lesson)
+      attempt_id: the recorded attempt (a retry won't fold it twice)
+    """
+    inline, profile_only = [], []
+    state = engine.observe(sb, sid, score, attempt_id=attempt_id, activity_id=activity_id,
+                           lesson_id=lesson_id, layout=layout)
+    _evaluate(sb, sid, state, score, lesson_id, layout, inline, profile_only)
+    return inline, profile_only
+
+
+def check_and_award_batch(sb, sid, items):
+    """
+    check_and_award_achievements for an ordered batch of recorded attempts
+    (dicts with score, attempt_id, activity_id, lesson_id, layout): one
+    state lookup, and each attempt is evaluated right after it is folded,
+    exactly as if they had been submitted one by one.
     """
     inline, profile_only = [], []
+    engine.observe_many(
+        sb, sid, items,
+        on_fold=lambda state, it: _evaluate(sb, sid, state, it.get("score"), it.get("lesson_id"),
+                                            it.get("layout"), inline, profile_only),
+    )
+    return inline, profile_only
+
 
+def _evaluate(sb, sid, state, score, lesson_id, layout, inline, profile_only):
+    """Award whatever the latest folded attempt unlocks; appends to inline/profile_only."""
     # first_correct
     if score is not None and float(score) >= PASS:
-        if _award_once(sb, sid, "first_correct"):
+        if _award_once(sb, sid, "first_correct", state):
             inline.append("first_correct")
 
     # streaks
-    streak = _consecutive_passes(sb, sid)
-    if streak >= 3 and _award_once(sb, sid, "three_in_a_row"):
+    if state.streak >= 3 and _award_once(sb, sid, "three_in_a_row", state):
         inline.append("three_in_a_row")
-    if streak >= 5 and _award_once(sb, sid, "streak_master"):
+    if state.streak >= 5 and _award_once(sb, sid, "streak_master", state):
         inline.append("streak_master")
 
     # scholar (10 passing sound attempts)
     if layout == "sound" and (score is not None and float(score) >= PASS):
-        total_sound = _total_sound_passes(sb, sid)
-        print(f"Scholar check: total_sound={total_sound}")
-        if total_sound >= 10 and _award_once(sb, sid, "scholar"):
+        print(f"Scholar check: total_sound={state.sound_passes}")
+        if state.sound_passes >= 10 and _award_once(sb, sid, "scholar", state):
             profile_only.append("scholar")
 
     # sharpshooter (perfect lesson)
     if lesson_id and (score is not None and float(score) >= PASS):
-        if _lesson_perfect(sb, sid, lesson_id):
-            if _award_once(sb, sid, "sharpshooter"):
+        if state.lesson_perfect(lesson_id):
+            if _award_once(sb, sid, "sharpshooter", state):
                 inline.append("sharpshooter")
-
-    return inline, profile_only
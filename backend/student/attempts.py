@@ -0,0 +1,196 @@
+# backend/student/attempts.py
+# record_attempt(): store an attempt, its metric row and the ledger update
+# in ONE transactional call to hmh_record_attempt
+# (migrations/002_record_attempt.sql).
+#   - direct Postgres (sql_exec) when DATABASE_URL is set
+#   - otherwise PostgREST rpc()
+#   - if the function isn't deployed yet: legacy path (insert the attempt,
+#     queue the metric row on the background runner)
+# Returns (row, err); row = {attempt_id, lesson_id, best_score,
+# activities_passed, best_sum} (counters are None on the legacy path).
+#
+# record_attempts(): the same for an ordered batch in one call to
+# hmh_record_attempts (migrations/003_record_attempts_batch.sql).
+# build_attempt(): score a submission and shape its meta/metric row; shared
+# by POST /attempt and POST /attempts/batch.
+
+import json
+
+from extensions import supabase_client
+from utils.sb import sb_exec
+from utils.pg import pg_enabled, sql_exec, sql_one
+from utils.tasks import enqueue
+from student.scoring import score_submission
+from content.emotion.backends import backend_name
+
+METRIC_TABLES = {"speech": "speech_metrics", "emotion": "emotion_metrics"}
+
+_MISSING_MARKERS = ("does not exist", "could not find the function", "pgrst202")
+
+
+def _missing_function(err, name="hmh_record_attempt") -> bool:
+    e = str(err or "").lower()
+    return name in e and any(m in e for m in _MISSING_MARKERS)
+
+
+def _expected(act, lang, field):
+    i18n = (act.get("data") or {}).get("i18n") or {}
+    return (i18n.get(lang) or {}).get(field) or (i18n.get("en") or {}).get(field)
+
+
+def build_attempt(act, submission, lang="en"):
+    """
+    Score one submission for `act` (an activity row from the curriculum) and
+    build what record_attempt stores: {score, meta, metric_kind, metric}.
+    """
+    submission = submission or {}
+    a_type = (act.get("type") or "").lower()
+    score = score_submission(act, submission, lang)
+
+    # Metric row (ASR / Emotion)
+    metric_kind, metric = None, None
+    if a_type == "asr":
+        # Prefer server transcript if present; fallback to browser transcript
+        metric_kind = "speech"
+        metric = {
+            "recognized_text": submission.get("backend_text") or submission.get("transcript") or "",
+            "expected_text": (_expected(act, lang, "expected_speech") or "").lower(),
+            "accuracy": score,
+            "lang": lang,
+            "model_used": submission.get("model_used") or "hmh-whisper-auto",
+            "latency_ms": submission.get("latency_ms"),
+        }
+    elif a_type == "emotion":
+        det = (submission.get("detected") or {}).get("label")
+        if det:
+            metric_kind = "emotion"
+            metric = {
+                "detected_emotion": det,
+                "expected_emotion": _expected(act, lang, "expected_emotion"),
+                "confidence": (submission.get("detected") or {}).get("confidence"),
+                "model_backend": backend_name(),
+            }
+
+    meta = {
+        "action": submission.get("action"),
+        "layout": submission.get("layout"),
+        "lang": lang,
+        "wrong_count": submission.get("wrong_count"),
+        "choice_key": submission.get("choice_key"),
+        "correct_key": submission.get("correct_key"),
+        "session_id": submission.get("session_id"),
+        "submission": submission,
+    }
+    return {"score": score, "meta": meta, "metric_kind": metric_kind, "metric": metric}
+
+
+def _legacy(sid, activity_id, score, meta, metric_kind, metric):
+    sb = supabase_client.client
+    rows, err = sb_exec(
+        sb.table("activity_attempts").insert({
+            "students_id": sid,
+            "activities_id": activity_id,
+            "score": score,
+            "meta": meta or {},
+        })
+    )
+    if err:
+        return None, err
+    if not rows:
+        return None, "Insert returned no data"
+    attempt_id = rows[0]["id"]
+    if metric_kind:
+        enqueue("attempt.metrics", table=METRIC_TABLES[metric_kind], row={
+            **(metric or {}),
+            "attempt_id": attempt_id,
+            "students_id": sid,
+            "activities_id": activity_id,
+        })
+    return {"attempt_id": attempt_id, "lesson_id": None, "best_score": None,
+            "activities_passed": None, "best_sum": None}, None
+
+
+def record_attempt(sid, activity_id, score, meta=None, metric_kind=None, metric=None):
+    """
+    metric_kind: 'speech' | 'emotion' | None; metric: the metric columns
+    (attempt_id/students_id/activities_id are filled in).
+    """
+    if metric_kind is not None and metric_kind not in METRIC_TABLES:
+        raise ValueError(f"unknown metric kind {metric_kind!r}")
+    params = {
+        "p_student": sid,
+        "p_activity": int(activity_id),
+        "p_score": score,
+        "p_meta": meta or {},
+        "p_metric_kind": metric_kind,
+        "p_metric": metric,
+    }
+
+    if pg_enabled():
+        row, err = sql_one(
+            "select * from hmh_record_attempt(%(p_student)s, %(p_activity)s, %(p_score)s, "
+            "%(p_meta)s::jsonb, %(p_metric_kind)s, %(p_metric)s::jsonb)",
+            {**params,
+             "p_meta": json.dumps(params["p_meta"], default=str),
+             "p_metric": json.dumps(metric, default=str) if metric is not None else None},
+        )
+    else:
+        rows, err = sb_exec(supabase_client.client.rpc("hmh_record_attempt", params))
+        row = rows[0] if isinstance(rows, list) and rows else (rows if isinstance(rows, dict) else None)
+
+    if err and _missing_function(err):
+        print("[ATTEMPTS] hmh_record_attempt not deployed; using legacy inserts")
+        return _legacy(sid, activity_id, score, meta, metric_kind, metric)
+    if err:
+        return None, err
+    if not row:
+        return None, "hmh_record_attempt returned no row"
+    return dict(row), None
+
+
+def record_attempts(sid, items):
+    """
+    items: [{activity_id, score, meta, metric_kind, metric}, ...] in the
+    order they happened. Returns (rows, err) with one row per item, in order.
+    On the per-item fallback a failure can leave earlier items saved; those
+    rows are returned alongside the error.
+    """
+    for it in items:
+        if it.get("metric_kind") is not None and it["metric_kind"] not in METRIC_TABLES:
+            raise ValueError(f"unknown metric kind {it['metric_kind']!r}")
+    payload = [{
+        "activity_id": int(it["activity_id"]),
+        "score": it["score"],
+        "meta": it.get("meta") or {},
+        "metric_kind": it.get("metric_kind"),
+        "metric": it.get("metric"),
+    } for it in items]
+    if not payload:
+        return [], None
+
+    if pg_enabled():
+        rows, err = sql_exec(
+            "select * from hmh_record_attempts(%s, %s::jsonb) order by idx",
+            (sid, json.dumps(payload, default=str)),
+        )
+    else:
+        rows, err = sb_exec(
+            supabase_client.client.rpc("hmh_record_attempts", {"p_student": sid, "p_items": payload})
+        )
+        rows = sorted(rows or [], key=lambda r: r.get("idx") or 0)
+
+    if err and _missing_function(err, "hmh_record_attempts"):
+        print("[ATTEMPTS] hmh_record_attempts not deployed; recording one by one")
+        out = []
+        for it in payload:
+            row, err = record_attempt(sid, it["activity_id"], it["score"], it["meta"],
+                                      it["metric_kind"], it["metric"])
+            if err:
+                return out, err
+            out.append(row)
+        return out, None
+    if err:
+        return None, err
+    if len(rows) != len(payload):
+        return None, f"hmh_record_attempts returned {len(rows)} row(s) for {len(payload)} item(s)"
+    return [dict(r) for r in rows], None
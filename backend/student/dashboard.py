@@ -0,0 +1,213 @@
+# backend/student/dashboard.py
+# Student dashboard: chapter modes and per-lesson lock states.
+#   - dashboard_chapters(): the gating rules as a pure function of the
+#     curriculum snapshot, the student's lesson_progress and focus chapters
+#     (no I/O, so it can be timed or checked on its own)
+#   - dashboard_cache: computed payload per (student, lang), valid while the
+#     student's stamp and the curriculum version are unchanged, i.e. until an
+#     attempt, lesson completion, profile/level change or curriculum edit
+#     (every one of those already calls touch_student / bumps the curriculum).
+#     HMH_DASHBOARD_TTL bounds staleness across hosts (stamps are per host).
+
+import os
+from typing import Dict, Iterable
+
+from content.transform import public_url
+from utils.cache import TTLCache
+from utils.http_cache import student_parts
+
+DASHBOARD_TTL = float(os.getenv("HMH_DASHBOARD_TTL", "600"))
+DASHBOARD_MAX = int(os.getenv("HMH_DASHBOARD_MAX", "2000"))
+
+
+def _is_completed(prog: Dict[int, Dict[str, float]], lesson_id: int) -> bool:
+    p = prog.get(int(lesson_id))
+    if not p:
+        return False
+    return p.get("status") == "completed" or (p.get("best", 0.0) >= 60.0)
+
+
+def _chapter_complete_first5(prog: Dict[int, Dict[str, float]], lessons: Iterable[dict]) -> bool:
+    """
+    Consider first 5 lessons in sort_order as the completion gate.
+    """
+    ls = sorted([l for l in (lessons or []) if isinstance(l, dict)],
+                key=lambda x: (x.get("sort_order") or 9999))
+    ls = ls[:5]
+    if not ls:
+        return False
+    return all(_is_completed(prog, (l.get("id") or l.get("lesson_id"))) for l in ls)
+
+
+def dashboard_chapters(snap, per_ch_lessons, prog, focus_set, lang="en") -> list:
+    """
+    snap: curriculum snapshot (chapters + graph); per_ch_lessons: {chapter_id:
+    [lesson rows]}; prog: {lesson_id: {status, best}}; focus_set: chapter
+    numbers assigned to the student's speech level.
+    Returns the dashboard "chapters" list.
+    """
+    chapters = []
+    for c in snap.chapters or []:
+        cid = c.get("id") or c.get("chapters_id") or c.get("chapter_id")
+        if not cid:
+            continue
+        chapters.append({
+            "id": int(cid),
+            "code": c.get("code"),
+            "title_en": c.get("title_en"),
+            "title_tl": c.get("title_tl"),
+            "sort_order": int(c.get("sort_order") or 999),
+            "bg_path": c.get("bg_path"),
+        })
+
+    # helper: map lesson_id -> "completed"/"unlocked"/"locked"
+    def _lesson_state(lid: int) -> str:
+        p = prog.get(int(lid)) or {}
+        if (p.get("status") == "completed") or (float(p.get("best", 0.0)) >= 60.0):
+            return "completed"
+        if p.get("status") in ("unlocked", "in_progress"):
+            return "unlocked"
+        return "locked"
+
+    out = []
+    for ch in chapters:
+        cid = ch["id"]
+        ch_no = ch["sort_order"]
+        title = ch["title_en"] if lang == "en" else (ch.get("title_tl") or ch["title_en"])
+
+        raw_lessons = sorted(
+            per_ch_lessons.get(cid, []) or [],
+            key=lambda x: (x.get("sort_order") or 9999)
+        )
+
+        is_focus = ch_no in focus_set
+
+        # 🔹 NEW: sequential unlock based on previous chapter completion
+        prev_ch_no = ch_no - 1
+        prev_ch_completed = False
+        if prev_ch_no >= 1:
+            prev_ch_id = snap.graph.chapter_id_for_number(prev_ch_no)
+            if prev_ch_id:
+                prev_ch_completed = _chapter_complete_first5(prog, snap.graph.gate_lessons(prev_ch_id))
+
+        # "Future" means beyond assigned focus chapters AND previous chapter not yet completed
+        is_future = (ch_no > max(focus_set)) and (not prev_ch_completed)
+
+        # If any lesson in this chapter is unlocked/completed in lesson_progress,
+        # we override the blanket future lock and show the chapter as accessible.
+        chapter_has_access = any(
+            _lesson_state((L.get("id") or L.get("lesson_id"))) != "locked"
+            for L in raw_lessons
+            if isinstance(L, dict) and (L.get("id") or L.get("lesson_id"))
+        )
+
+        # consider backend unlocks explicitly (status=unlocked/completed)
+        real_chapter_unlocked = any(
+            (
+                prog.get((L.get("id") or L.get("lesson_id")), {})
+                .get("status") in ("unlocked", "completed")
+            )
+            for L in raw_lessons
+            if isinstance(L, dict)
+        )
+
+        # 🔹 NEW RULE:
+        # 1. If previous chapter is completed → this chapter is always open as review.
+        # 2. Else if it has any progress/unlock → open (focus or review).
+        # 3. Else: apply assigned chapter + future locking.
+        if prev_ch_completed:
+            mode = "review"
+        elif chapter_has_access or real_chapter_unlocked:
+            mode = "focus" if is_focus else "review"
+        else:
+            if is_focus:
+                mode = "focus"
+            elif is_future:
+                mode = "locked"
+            else:
+                mode = "review"
+
+        lessons_out = []
+        prev_completed = True  # for sequential gating inside focus chapters
+
+        for idx, L in enumerate(raw_lessons):
+            lid = L.get("id") or L.get("lesson_id")
+            if not lid:
+                continue
+
+            lsort = L.get("sort_order") or (idx + 1)
+            ltitle = L.get("title_en") if lang == "en" else (L.get("title_tl") or L.get("title_en"))
+            cover  = public_url(L.get("cover_path")) if L.get("cover_path") else None
+
+            real = _lesson_state(lid)
+
+            if mode == "locked":
+                status = "locked"
+            else:
+                # review and focus chapters gate lessons the same way
+                if real == "completed":
+                    status = "completed"
+                    prev_completed = True
+                elif real == "unlocked":
+                    status = "unlocked"
+                    prev_completed = False
+                else:
+                    if lsort == 1:
+                        status = "unlocked" if not is_future else "locked"
+                        prev_completed = (real == "completed")
+                    else:
+                        status = "unlocked" if prev_completed else "locked"
+                        prev_completed = (real == "completed")
+
+            lessons_out.append({
+                "id": int(lid),
+                "code": L.get("code"),
+                "title": ltitle,
+                "description_en": L.get("description_en"),
+                "description_tl": L.get("description_tl"),
+                "cover_path": cover,
+                "sort_order": int(lsort),
+                "status": status,
+            })
+
+        out.append({
+            "id": cid,
+            "code": ch.get("code"),
+            "number": ch_no,
+            "title": title,
+            "sort_order": ch_no,
+            "mode": mode,
+            "bg_path": public_url(ch.get("bg_path")),
+            "lessons": lessons_out,
+        })
+    return out
+
+
+class DashboardCache:
+    """(student, lang) -> computed dashboard payload, checked against student_parts()."""
+
+    def __init__(self):
+        self._cache = TTLCache(maxsize=DASHBOARD_MAX, ttl=DASHBOARD_TTL)
+
+    def versions(self, sid):
+        """Read BEFORE computing, so a write during the computation invalidates it."""
+        return student_parts(sid)
+
+    def get(self, sid, lang):
+        item = self._cache.get((sid, lang))
+        if item is None:
+            return None
+        parts, payload = item
+        if parts != self.versions(sid):
+            self._cache.pop((sid, lang))
+            return None
+        return payload
+
+    def put(self, sid, lang, parts, payload):
+        self._cache.set((sid, lang), (parts, payload))
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+dashboard_cache = DashboardCache()
@@ -0,0 +1,112 @@
+# backend/student/ledger.py
+# Read side of the best-score ledger (migrations/001_progress_ledger.sql).
+# student_lesson_ledger holds, per (student, lesson), how many activities
+# have a best score >= 60 and the sum of best scores; a trigger on
+# activity_attempts keeps it current. Lesson totals come from the curriculum
+# store, so "is this lesson passed?" is one indexed row read.
+#
+# If the ledger tables aren't there yet (migration not applied), every
+# helper falls back to computing the same numbers from activity_attempts.
+
+from typing import Dict, Iterable
+
+from extensions import supabase_client
+from utils.sb import sb_exec
+from utils.pg import pg_enabled, sql_exec
+from content.curriculum import curriculum
+
+PASS = 60.0
+
+
+def _ledger_rows(sid, lesson_ids):
+    """{lesson_id: {"activities_passed", "best_sum"}} or (None, err)."""
+    if pg_enabled():
+        rows, err = sql_exec(
+            """
+            select lesson_id, activities_passed, best_sum
+              from student_lesson_ledger
+             where students_id = %s and lesson_id = any(%s)
+            """,
+            (sid, list(lesson_ids)),
+        )
+    else:
+        rows, err = sb_exec(
+            supabase_client.client.table("student_lesson_ledger")
+              .select("lesson_id, activities_passed, best_sum")
+              .eq("students_id", sid)
+              .in_("lesson_id", list(lesson_ids))
+        )
+    if err:
+        return None, err
+    return {
+        int(r["lesson_id"]): {
+            "activities_passed": int(r.get("activities_passed") or 0),
+            "best_sum": float(r.get("best_sum") or 0.0),
+        }
+        for r in rows or []
+    }, None
+
+
+def _rows_from_attempts(sid, lesson_ids):
+    """Same shape as _ledger_rows, computed from raw attempts (fallback)."""
+    snap = curriculum.snapshot()
+    lesson_of = {}
+    for lid in lesson_ids:
+        for aid in snap.activity_ids(lid):
+            lesson_of[aid] = int(lid)
+    out = {}
+    if not lesson_of:
+        return out
+    atts, err = sb_exec(
+        supabase_client.client.table("activity_attempts")
+          .select("activities_id, score")
+          .in_("activities_id", list(lesson_of))
+          .eq("students_id", sid)
+    )
+    if err:
+        print("[LEDGER] attempt fallback failed:", err)
+        return out
+    best: Dict[int, float] = {}
+    for a in atts or []:
+        aid = a.get("activities_id")
+        if aid is None:
+            continue
+        best[aid] = max(best.get(aid, 0.0), float(a.get("score") or 0.0))
+    for aid, sc in best.items():
+        row = out.setdefault(lesson_of[aid], {"activities_passed": 0, "best_sum": 0.0})
+        row["activities_passed"] += 1 if sc >= PASS else 0
+        row["best_sum"] += sc
+    return out
+
+
+def lesson_counters(sid, lesson_ids: Iterable[int]) -> Dict[int, dict]:
+    """Ledger counters for several lessons in one query (missing lessons → zeros)."""
+    lesson_ids = [int(l) for l in lesson_ids if l is not None]
+    if not lesson_ids:
+        return {}
+    rows, err = _ledger_rows(sid, lesson_ids)
+    if err:
+        print("[LEDGER] ledger read failed, using attempts:", err)
+        rows = _rows_from_attempts(sid, lesson_ids)
+    return {lid: rows.get(lid, {"activities_passed": 0, "best_sum": 0.0}) for lid in lesson_ids}
+
+
+def lesson_status(sid, lesson_id):
+    """(passed, avg_best) for one lesson: passed = every activity has best >= 60."""
+    total = len(curriculum.snapshot().activity_ids(lesson_id))
+    if not total:
+        return False, 0.0
+    c = lesson_counters(sid, [lesson_id])[int(lesson_id)]
+    return c["activities_passed"] >= total, c["best_sum"] / total
+
+
+def lessons_passed(sid, lesson_ids: Iterable[int]) -> set:
+    """Subset of lesson_ids the student has passed (one query)."""
+    snap = curriculum.snapshot()
+    counters = lesson_counters(sid, lesson_ids)
+    passed = set()
+    for lid, c in counters.items():
+        total = len(snap.activity_ids(lid))
+        if total and c["activities_passed"] >= total:
+            passed.add(lid)
+    return passed
@@ -0,0 +1,88 @@
+# backend/student/post_attempt.py
+# Secondary work after an attempt row is committed, run on the background
+# task runner (utils/tasks.py) so the student's response only waits for the
+# attempt insert itself:
+#   - achievement evaluation (or just folding the attempt into the
+#     achievement state for layouts that never award)
+#   - speech_metrics / emotion_metrics rows, only on the legacy path of
+#     student/attempts.py (hmh_record_attempt writes them atomically)
+# Achievement tasks are enqueued with the student as order_key, so the
+# per-student achievement state sees attempts in the order they were
+# recorded, even when one of them has to be retried.
+# Newly earned badges reach the client through GET /achievements/recent.
+
+from datetime import datetime
+
+from extensions import supabase_client
+from utils.sb import sb_exec
+from utils.tasks import task, enqueue
+from student.achievements import check_and_award_achievements, check_and_award_batch, observe_attempt
+
+
+def _order_key(sid) -> str:
+    return f"achievements:{sid}"
+
+
+@task("attempt.metrics")
+def _insert_metrics(table, row):
+    _, err = sb_exec(supabase_client.client.table(table).insert(row))
+    if err:
+        raise RuntimeError(f"{table} insert failed: {err}")
+
+
+@task("attempt.achievements")
+def _award(sid, score, lesson_id=None, layout=None, activity_id=None, attempt_id=None):
+    inline, profile = check_and_award_achievements(
+        supabase_client.client, sid, score,
+        lesson_id=lesson_id, layout=layout, activity_id=activity_id, attempt_id=attempt_id,
+    )
+    if inline or profile:
+        print(f"Achievements for {sid}: inline={inline} profile={profile}")
+
+
+@task("attempt.achievements_batch")
+def _award_batch(sid, items):
+    inline, profile = check_and_award_batch(supabase_client.client, sid, items)
+    if inline or profile:
+        print(f"Achievements for {sid} (batch of {len(items)}): inline={inline} profile={profile}")
+
+
+@task("attempt.observe")
+def _observe(sid, score, activity_id=None, layout=None, attempt_id=None):
+    observe_attempt(supabase_client.client, sid, score, attempt_id=attempt_id,
+                    activity_id=activity_id, layout=layout)
+
+
+def after_attempt(sid, score, *, attempt_id, activity_id, lesson_id=None, layout=None,
+                  award=True) -> str:
+    """
+    Queue the follow-up work for committed attempt `attempt_id`. Returns the
+    UTC timestamp to pass as ?since= when polling for new achievements.
+    """
+    since = datetime.utcnow().isoformat()
+    try:
+        if award:
+            enqueue("attempt.achievements", order_key=_order_key(sid), sid=sid, score=score,
+                    lesson_id=lesson_id, layout=layout, activity_id=activity_id,
+                    attempt_id=attempt_id)
+        else:
+            enqueue("attempt.observe", order_key=_order_key(sid), sid=sid, score=score,
+                    activity_id=activity_id, layout=layout, attempt_id=attempt_id)
+    except Exception as e:
+        print("Post-attempt enqueue failed:", e)
+    return since
+
+
+def after_attempts(sid, items) -> str:
+    """
+    after_attempt for a recorded batch (POST /attempts/batch): one task that
+    evaluates achievements over the whole batch, in order. items: dicts with
+    score, attempt_id, activity_id, lesson_id, layout.
+    """
+    since = datetime.utcnow().isoformat()
+    try:
+        if items:
+            enqueue("attempt.achievements_batch", order_key=_order_key(sid), sid=sid, items=list(items))
+    except Exception as e:
+        print("Post-attempt enqueue failed:", e)
+    return since
@@ -0,0 +1,141 @@
+# backend/student/profile_stats.py
+# Aggregated numbers for the student profile page, computed in one grouped
+# query (hmh_profile_stats, migrations/004_profile_stats.sql) and cached per
+# student until their stamp changes (utils/http_cache.touch_student: every
+# attempt, lesson completion and profile edit bumps it).
+#
+#   stats, err = profile_stats(sid)
+#   stats = {
+#     "by_type": {"asr": {"attempts": 12, "avg": 71.5, "passed": 9}, ...},
+#     "lessons_completed": 4, "perfect_lesson": False,
+#     "weekend_days": 1, "recent_emotions": ["happy", ...],
+#   }
+#
+# Without the function deployed, the same dict is computed from one
+# attempts-by-type read plus lesson_progress and the last 5 metas.
+
+import os
+from datetime import datetime
+
+from extensions import supabase_client
+from utils.sb import sb_exec
+from utils.pg import pg_enabled, sql_one
+from utils.cache import TTLCache
+from utils.http_cache import student_version
+
+STATS_TTL = float(os.getenv("HMH_PROFILE_STATS_TTL", "600"))
+PASS = 60.0
+
+_cache = TTLCache(maxsize=2000, ttl=STATS_TTL)
+
+
+def _missing_function(err) -> bool:
+    e = str(err or "").lower()
+    return "hmh_profile_stats" in e and ("does not exist" in e or "could not find the function" in e
+                                         or "pgrst202" in e)
+
+
+def _from_tables(sid):
+    """Fallback: same shape as hmh_profile_stats, aggregated here."""
+    sb = supabase_client.client
+    atts, err = sb_exec(
+        sb.table("activity_attempts")
+          .select("score, activities!inner(type)")
+          .eq("students_id", sid)
+    )
+    if err:
+        return None, err
+    by_type = {}
+    for r in atts or []:
+        t = (r.get("activities") or {}).get("type")
+        if not t:
+            continue
+        sc = float(r.get("score") or 0)
+        agg = by_type.setdefault(t, {"attempts": 0, "sum": 0.0, "passed": 0})
+        agg["attempts"] += 1
+        agg["sum"] += sc
+        agg["passed"] += 1 if sc >= PASS else 0
+    for agg in by_type.values():
+        agg["avg"] = agg.pop("sum") / agg["attempts"]
+
+    prog, err = sb_exec(
+        sb.table("lesson_progress")
+          .select("status, best_score, completed_at, lessons!inner(id)")
+          .eq("students_id", sid)
+    )
+    if err:
+        return None, err
+    done = [r for r in prog or []
+            if r.get("status") == "completed" or (r.get("best_score") or 0) >= PASS]
+    weekend = set()
+    for r in done:
+        try:
+            d = datetime.fromisoformat(r.get("completed_at") or "")
+        except (TypeError, ValueError):
+            continue
+        if d.weekday() in (5, 6):  # Sat=5, Sun=6
+            weekend.add(d.weekday())
+
+    metas, err = sb_exec(
+        sb.table("activity_attempts")
+          .select("meta")
+          .eq("students_id", sid)
+          .order("id", desc=True)
+          .limit(5)
+    )
+    if err:
+        return None, err
+    recent = []
+    for r in metas or []:
+        meta = r.get("meta") or {}
+        emo = meta.get("recognized_emotion") or meta.get("emotion_label")
+        if emo:
+            recent.append(emo)
+
+    return {
+        "by_type": by_type,
+        "lessons_completed": len(done),
+        "perfect_lesson": any((r.get("best_score") or 0) == 100 for r in done),
+        "weekend_days": len(weekend),
+        "recent_emotions": recent,
+    }, None
+
+
+def _compute(sid):
+    if pg_enabled():
+        row, err = sql_one("select hmh_profile_stats(%s) as stats", (sid,))
+        stats = (row or {}).get("stats")
+    else:
+        stats, err = sb_exec(supabase_client.client.rpc("hmh_profile_stats", {"p_student": sid}))
+    if err and _missing_function(err):
+        print("[PROFILE_STATS] hmh_profile_stats not deployed; aggregating in Python")
+        return _from_tables(sid)
+    if err:
+        return None, err
+    if not isinstance(stats, dict):
+        return None, "hmh_profile_stats returned no data"
+    return stats, None
+
+
+def profile_stats(sid):
+    """(stats, err); served from cache until the student's stamp moves."""
+    version = student_version(sid)   # read first: a write during compute invalidates
+    hit = _cache.get(sid)
+    if hit is not None and hit[0] == version:
+        return hit[1], None
+    stats, err = _compute(sid)
+    if err:
+        return None, err
+    _cache.set(sid, (version, stats))
+    return stats, None
+
+
+def avg_for(stats, a_type) -> float:
+    """Average score for one activity type, rounded like the profile shows it."""
+    agg = (stats.get("by_type") or {}).get(a_type) or {}
+    return round(float(agg["avg"]), 1) if agg.get("attempts") and agg.get("avg") is not None else 0
+
+
+def passed_for(stats, types) -> int:
+    by_type = stats.get("by_type") or {}
+    return sum(int((by_type.get(t) or {}).get("passed") or 0) for t in types)
@@ -0,0 +1,183 @@
+# backend/student/progress_buffer.py
+# Write-behind buffer for lesson_runtime_progress.
+# The lesson player saves its position after nearly every activity; only the
+# latest state per (student, lesson, lang) matters, so saves land here and a
+# flusher thread upserts them in one bulk statement every
+# HMH_PROGRESS_FLUSH seconds (and at exit).
+#   - put()      keep the newest state for the key (by client updated_at)
+#   - get()      read-through for the resume GET (buffer wins over the DB)
+#   - discard()  drop pending saves (lesson completed / progress cleared)
+# If the bulk upsert fails, each row is upserted on its own so one bad row
+# can't hold back the rest; a row the database keeps rejecting is dropped
+# after HMH_PROGRESS_RETRIES tries and appended to the dead-letter log
+# (HMH_PROGRESS_DEAD). Transport errors (database unreachable) don't count
+# toward that limit.
+# The buffer is per process: with several workers a resume that lands on
+# another worker can be up to one flush interval behind (one activity at
+# most at the default interval).
+
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from extensions import supabase_client
+from utils.sb import sb_exec
+from utils.tasks import TASK_DIR
+
+FLUSH_EVERY = float(os.getenv("HMH_PROGRESS_FLUSH", "2"))   # seconds
+MAX_PENDING = int(os.getenv("HMH_PROGRESS_MAX", "500"))     # flush early past this many keys
+ROW_RETRIES = int(os.getenv("HMH_PROGRESS_RETRIES", "5"))   # rejected writes before a row is dead-lettered
+DEAD_LETTER = os.getenv("HMH_PROGRESS_DEAD") or os.path.join(TASK_DIR, "progress-dead.jsonl")
+
+TABLE = "lesson_runtime_progress"
+CONFLICT = "students_id,lesson_id,lang"
+
+
+def _ts(v) -> str:
+    return v.isoformat() if isinstance(v, datetime) else str(v or "")
+
+
+def _rejected(err) -> bool:
+    """True when the database answered and refused the write (vs. not reachable)."""
+    return str(err).startswith("APIError")
+
+
+class ProgressBuffer:
+    def __init__(self, every: float = FLUSH_EVERY):
+        self.every = every
+        self._rows = {}            # (sid, lesson_id, lang) -> row
+        self._fails = {}           # key -> rejected writes of the pending row
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    # ---- lifecycle ----
+    def start(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._rows = {}     # inherited from the parent before fork: not ours to write
+                self._fails = {}
+            self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="hmh-progress", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.every)
+            self._wake.clear()
+            self.flush()
+
+    # ---- writes ----
+    def put(self, row: dict):
+        row = {**row, "updated_at": _ts(row.get("updated_at"))}
+        key = (str(row["students_id"]), int(row["lesson_id"]), row["lang"])
+        self.start()
+        with self._lock:
+            cur = self._rows.get(key)
+            if cur is None or cur["updated_at"] <= row["updated_at"]:
+                self._rows[key] = row
+                self._fails.pop(key, None)
+            full = len(self._rows) >= MAX_PENDING
+        if full:
+            self._wake.set()
+
+    def discard(self, sid, lesson_id, lang=None):
+        # Waits out an in-flight flush so it can't re-create a row the
+        # caller is about to delete.
+        with self._flush_lock, self._lock:
+            for key in [k for k in self._rows
+                        if k[0] == str(sid) and k[1] == int(lesson_id) and (lang is None or k[2] == lang)]:
+                self._rows.pop(key, None)
+                self._fails.pop(key, None)
+
+    def _upsert(self, rows):
+        _, err = sb_exec(supabase_client.client.table(TABLE).upsert(rows, on_conflict=CONFLICT))
+        return err
+
+    def _done(self, key, row):
+        """Drop a written (or dead-lettered) row, unless a newer save arrived meanwhile. Holds _lock."""
+        if self._rows.get(key) is row:
+            del self._rows[key]
+            self._fails.pop(key, None)
+
+    def _dead_letter(self, row, tries, err):
+        try:
+            os.makedirs(os.path.dirname(DEAD_LETTER) or ".", exist_ok=True)
+            with open(DEAD_LETTER, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"row": row, "tries": tries, "error": str(err), "at": time.time()},
+                                   default=str) + "\n")
+        except OSError as e:
+            print("[PROGRESS] dead-letter write failed:", e)
+
+    def flush(self) -> int:
+        """
+        Upsert everything pending in one statement. Rows stay readable in the
+        buffer until the write succeeds. If the statement fails, rows are
+        upserted one by one: the good ones land, and a row the database
+        rejects is retried next tick, up to ROW_RETRIES times.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = dict(self._rows)
+            if not batch:
+                return 0
+            err = self._upsert(list(batch.values()))
+            if not err:
+                with self._lock:
+                    for key, row in batch.items():
+                        self._done(key, row)
+                return len(batch)
+            if not _rejected(err):
+                print(f"[PROGRESS] flush of {len(batch)} row(s) failed, will retry:", err)
+                return 0
+            return self._flush_rows(batch)
+
+    def _flush_rows(self, batch) -> int:
+        """Per-row fallback after a rejected bulk upsert."""
+        written = 0
+        for key, row in batch.items():
+            err = self._upsert([row])
+            if err and not _rejected(err):
+                print("[PROGRESS] database unreachable, will retry:", err)
+                break
+            with self._lock:
+                if not err:
+                    self._done(key, row)
+                    written += 1
+                    continue
+                if self._rows.get(key) is not row:
+                    continue   # superseded by a newer save: that one gets its own tries
+                tries = self._fails.get(key, 0) + 1
+                self._fails[key] = tries
+                if tries >= ROW_RETRIES:
+                    self._done(key, row)
+            if tries >= ROW_RETRIES:
+                print(f"[PROGRESS] dropping row for {key} after {tries} rejected writes:", err)
+                self._dead_letter(row, tries, err)
+            else:
+                print(f"[PROGRESS] row for {key} rejected (try {tries}), will retry:", err)
+        return written
+
+    # ---- reads ----
+    def get(self, sid, lesson_id, lang=None):
+        """Pending row for this lang, or the newest pending row of any lang."""
+        with self._lock:
+            if lang is not None:
+                return self._rows.get((str(sid), int(lesson_id), lang))
+            rows = [r for k, r in self._rows.items() if k[0] == str(sid) and k[1] == int(lesson_id)]
+        return max(rows, key=lambda r: r["updated_at"]) if rows else None
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+
+progress_buffer = ProgressBuffer()
+atexit.register(progress_buffer.flush)
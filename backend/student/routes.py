@@ -5,34 +5,42 @@ from __future__ import annotations
 import traceback
 import random
 import json 
-from typing import Dict, List, Optional, Any, Iterable
-from flask import Blueprint, request, jsonify
+from typing import Dict, List, Optional, Any
+from flask import Blueprint, Response, request, jsonify
 from datetime import datetime, timezone
 import io, os, mimetypes
 from werkzeug.utils import secure_filename
 from student.services import chapter_complete_firstN_live 
 from extensions import supabase_client
-from utils.sb import sb_exec
+from utils.sb import sb_exec, sb_gather
+from utils.http_cache import conditional, student_parts, touch_student
+from utils.idempotency import idempotent, stored_json
 from auth.jwt_utils import require_student
-from content.transform import pick_branch
+from auth.identity import identity
 from content.transform import public_url
-from student.achievements import check_and_award_achievements 
-from utils.time import mnl_day_bounds_utc
+from content.curriculum import curriculum
+from content.bundles import bundles
+from student.achievements import INLINE_CODES, PROFILE_ONLY_CODES
+from student.post_attempt import after_attempt, after_attempts
+from student.attempts import build_attempt, record_attempt, record_attempts
+from student.progress_buffer import progress_buffer
+from student.dashboard import dashboard_cache, dashboard_chapters
+from student.profile_stats import profile_stats, avg_for, passed_for
+from student.session_state import session_index
 
 
 from student.services import (
     lessons_grouped_by_chapter,
     can_start_lesson,
-    chapter_number,
     recompute_lesson_completion, 
 )
 
-from student.scoring import (
-    score_recognition, score_listening, score_mcq, score_asr, score_emotion
-)
 
 student_bp = Blueprint("student", __name__)
 BUCKET = "hmh-images"
+ATTEMPT_BATCH_MAX = int(os.getenv("HMH_ATTEMPT_BATCH_MAX", "100"))   # attempts per /attempts/batch
+SESSION_KEYS = ("id", "minutes_allowed", "mood", "language", "status", "started_at", "ended_at")
+SESSION_COLUMNS = ", ".join(SESSION_KEYS)
 
 # -------------------------------------------------------------------
 # Helpers
@@ -52,49 +60,54 @@ def _focus_chapter_numbers(level: str) -> set[int]:
         return {3, 4}
     return {5, 6}  # verbal
 
-def _progress_by_lesson(sb, sid) -> Dict[int, Dict[str, float]]:
+def _progress_by_lesson(sb, sid) -> Optional[Dict[int, Dict[str, float]]]:
     """
     Return { lesson_id: {"status": "completed"/..., "best": float_score} }
     Pull from lesson_progress first; you can add best_score updates elsewhere.
+    None if lesson_progress couldn't be read.
     """
     rows, err = sb_exec(
         sb.table("lesson_progress")
           .select("lesson_id,status,best_score")
           .eq("students_id", sid)
     )
+    if err:
+        print("lesson_progress read failed:", err)
+        return None
     prog: Dict[int, Dict[str, float]] = {}
-    if not err:
-        for r in rows or []:
-            lid = r.get("lesson_id")
-            if lid is None:
-                continue
-            prog[int(lid)] = {
-                "status": (r.get("status") or "").lower(),
-                "best": float(r.get("best_score") or 0),
-            }
+    for r in rows or []:
+        lid = r.get("lesson_id")
+        if lid is None:
+            continue
+        prog[int(lid)] = {
+            "status": (r.get("status") or "").lower(),
+            "best": float(r.get("best_score") or 0),
+        }
     return prog
 
-def _is_completed(prog: Dict[int, Dict[str, float]], lesson_id: int) -> bool:
-    p = prog.get(int(lesson_id))
-    if not p:
-        return False
-    return p.get("status") == "completed" or (p.get("best", 0.0) >= 60.0)
-
-def _chapter_complete_first5(prog: Dict[int, Dict[str, float]], lessons: Iterable[dict]) -> bool:
-    """
-    Consider first 5 lessons in sort_order as the completion gate.
-    """
-    ls = sorted([l for l in (lessons or []) if isinstance(l, dict)],
-                key=lambda x: (x.get("sort_order") or 9999))
-    ls = ls[:5]
-    if not ls:
-        return False
-    return all(_is_completed(prog, (l.get("id") or l.get("lesson_id"))) for l in ls)
-
 # -------------------------------------------------------------------
 # Student Profile (GET/PUT) — single definition (no duplicates)
 # -------------------------------------------------------------------
 
+def _profile_rows(me):
+    """Identity profile in sb_exec's (rows, err) shape."""
+    row, err = me.profile()
+    if err:
+        return None, err
+    return ([row] if row else []), None
+
+
+def _last_session_rows(sid):
+    """Latest session (mood, minutes, times) from the session index, as (rows, err)."""
+    state, err = session_index.state(sid)
+    if err:
+        return None, err
+    last = state.latest
+    if not last:
+        return [], None
+    return [{k: last.get(k) for k in ("mood", "minutes_allowed", "started_at", "ended_at")}], None
+
+
 @student_bp.get("/profile", endpoint="profile")
 @require_student
 def get_profile():
@@ -102,15 +115,34 @@ def get_profile():
     sid = request.user_id
 
     # ----------------------------------------
-    # Fetch base student info
+    # Fetch base student info + everything the profile needs, concurrently
     # ----------------------------------------
-    s, err = sb_exec(
-        sb.table("students").select(
-            "students_id, first_name, last_name, middle_initial, birthday, email, login_id, photo_url, speech_level, sex"
-        ).eq("students_id", sid).limit(1)
-    )
+    me = identity()
+    res = sb_gather({
+        "student": lambda: _profile_rows(me),
+        "last session": lambda: _last_session_rows(sid),
+        # one grouped query, cached until this student's next attempt
+        "stats": lambda: profile_stats(sid),
+        "current lesson": lambda: sb_exec(
+            sb.table("lesson_progress")
+              .select("lesson_id, status, lessons!inner(title_en, title_tl)")
+              .eq("students_id", sid)
+              .neq("status", "completed")
+              .order("lesson_id")
+              .limit(1)
+        ),
+        "achievements": lambda: sb_exec(
+            sb.table("student_achievements")
+              .select(
+                "achievements_code, earned_at, "
+                "achievements:achievements_code(code, name, description, icon_path)"
+              )
+              .eq("students_id", sid)
+        ),
+    })
 
-    if err or not s:
+    s = res["student"]
+    if not s:
         _, ierr = sb_exec(
             sb.table("students").insert({
                 "students_id": sid,
@@ -122,11 +154,8 @@ def get_profile():
         if ierr:
             return jsonify({"error": f"Profile create failed: {ierr}"}), 500
 
-        s, err = sb_exec(
-            sb.table("students").select(
-                "students_id, first_name, last_name, middle_initial, birthday, email, login_id, photo_url, speech_level, sex"
-            ).eq("students_id", sid).limit(1)
-        )
+        me.forget()
+        s, err = _profile_rows(me)
         if err or not s:
             return jsonify({"error": "Profile not found"}), 404
 
@@ -136,8 +165,8 @@ def get_profile():
     # Assign default only if photo_url is NULL (not empty string)
     if student.get("photo_url") is None:
         default_url = _default_photo_for_gender(student.get("sex"))
-        student["photo_url"] = default_url
         sb.table("students").update({"photo_url": default_url}).eq("students_id", sid).execute()
+        me.patch({"photo_url": default_url})
 
 
         # ----------------------------------------
@@ -152,50 +181,21 @@ def get_profile():
     }
 
     # Last session info
-    sess_rows, _ = sb_exec(
-        sb.table("sessions")
-          .select("mood, minutes_allowed, started_at, ended_at")
-          .eq("students_id", sid)
-          .order("id", desc=True)
-          .limit(1)
-    )
+    sess_rows = res["last session"]
     last_session = sess_rows[0] if sess_rows else None
 
     # ----------------------------------------
-    # Lesson progress + completions
+    # Lesson completions, averages by type, recent emotions
+    # (student/profile_stats.py)
     # ----------------------------------------
-    prog_rows, _ = sb_exec(
-        sb.table("lesson_progress")
-          .select("lesson_id, status, best_score, completed_at, lessons!inner(chapter_id)")
-          .eq("students_id", sid)
-    )
-
-    lessons_completed = [
-        r for r in (prog_rows or [])
-        if r.get("status") == "completed" or (r.get("best_score") or 0) >= 60
-    ]
-    stats["lessonsCompleted"] = len(lessons_completed)
+    agg = res["stats"] or {}
+    stats["lessonsCompleted"] = int(agg.get("lessons_completed") or 0)
+    stats["perfectLesson"] = bool(agg.get("perfect_lesson"))      # Sharpshooter
+    stats["weekendLessons"] = int(agg.get("weekend_days") or 0)   # Weekend Warrior (Sat + Sun)
 
-    # ----------------------------------------
-    # Speech stats (avg ASR)
-    # ----------------------------------------
-    speech_rows, _ = sb_exec(
-        sb.table("activity_attempts")
-          .select("score, activities!inner(type)")
-          .eq("students_id", sid)
-    )
-    speech_scores = [
-        float(r["score"]) for r in (speech_rows or [])
-        if r.get("activities", {}).get("type") == "asr"
-    ]
-    avg_speech = round(sum(speech_scores) / len(speech_scores), 1) if speech_scores else 0
-
-    # Emotion stats
-    emo_scores = [
-        float(r["score"]) for r in (speech_rows or [])
-        if r.get("activities", {}).get("type") == "emotion"
-    ]
-    avg_emo = round(sum(emo_scores) / len(emo_scores), 1) if emo_scores else 0
+    avg_speech = avg_for(agg, "asr")
+    avg_emo = avg_for(agg, "emotion")
+    recent_emotions = list(agg.get("recent_emotions") or [])
 
     # ----------------------------------------
     # Adaptive Scholar logic
@@ -208,84 +208,19 @@ def get_profile():
     else:
         target_types = ["tts", "listening"]  # short sentences
 
-    act_rows, _ = sb_exec(
-        sb.table("activity_attempts")
-          .select("score, activities!inner(type)")
-          .eq("students_id", sid)
-    )
-    passed_acts = [
-        r for r in (act_rows or [])
-        if r.get("activities", {}).get("type") in target_types
-        and (r.get("score") or 0) >= 60
-    ]
-    stats["activitiesPassed"] = len(passed_acts)
-
-    # ----------------------------------------
-    # Perfect lesson (Sharpshooter)
-    # ----------------------------------------
-    stats["perfectLesson"] = any(
-        (r.get("best_score") or 0) == 100 for r in lessons_completed
-    )
-
-    # ----------------------------------------
-    # Weekend Warrior (Sat + Sun)
-    # ----------------------------------------
-    import datetime
-    weekend_days = set()
-    for r in lessons_completed:
-        dt = r.get("completed_at")
-        if not dt:
-            continue
-        try:
-            d = datetime.datetime.fromisoformat(dt)
-            if d.weekday() in (5, 6):  # Sat=5, Sun=6
-                weekend_days.add(d.weekday())
-        except Exception:
-            continue
-    stats["weekendLessons"] = len(weekend_days)
-
-    # ----------------------------------------
-    # Recent emotions
-    # ----------------------------------------
-    emo_attempts, _ = sb_exec(
-        sb.table("activity_attempts")
-          .select("meta")
-          .eq("students_id", sid)
-          .order("id", desc=True)
-          .limit(5)
-    )
-    recent_emotions = []
-    for e in (emo_attempts or []):
-        meta = e.get("meta") or {}
-        emo = meta.get("recognized_emotion") or meta.get("emotion_label")
-        if emo:
-            recent_emotions.append(emo)
+    stats["activitiesPassed"] = passed_for(agg, target_types)
 
     # ----------------------------------------
     # Current lesson (first unfinished)
     # ----------------------------------------
-    lesson_rows, _ = sb_exec(
-        sb.table("lesson_progress")
-          .select("lesson_id, status, lessons!inner(title_en, title_tl)")
-          .eq("students_id", sid)
-          .neq("status", "completed")
-          .order("lesson_id")
-          .limit(1)
-    )
+    lesson_rows = res["current lesson"]
     current_lesson = lesson_rows[0] if lesson_rows else None
 
     # ----------------------------------------
     # Achievements (optional Supabase table)
     # ----------------------------------------
     
-    achievements, _ = sb_exec(
-        sb.table("student_achievements")
-          .select(
-            "achievements_code, earned_at, "
-            "achievements:achievements_code(code, name, description, icon_path)"
-          )
-          .eq("students_id", sid)
-    )
+    achievements = res["achievements"]
 
 
     # ----------------------------------------
@@ -354,6 +289,7 @@ def update_profile():
           .update({"photo_url": public_url}) \
           .eq("students_id", sid) \
           .execute()
+        touch_student(sid)
 
         return jsonify({"photo_url": public_url})
 
@@ -371,6 +307,7 @@ def update_profile():
           .update(updates) \
           .eq("students_id", sid) \
           .execute()
+        touch_student(sid)
 
     return jsonify({"ok": True, "updated": updates})
 
@@ -391,6 +328,7 @@ def update_email():
         .update({"email": email}) \
         .eq("students_id", sid) \
         .execute()
+    touch_student(sid)
 
     return jsonify({"ok": True, "email": email})
 
@@ -420,52 +358,39 @@ def _default_photo_for_gender(sex: str) -> str:
 
 @student_bp.get("/student-dashboard", endpoint="student_dashboard")
 @require_student
+@conditional(lambda **kw: student_parts(request.user_id))
 def student_dashboard():
     sb = supabase_client.client
     sid = request.user_id
     lang = (request.args.get("lang") or "en").lower()
 
-    # S1: Student
-    srows, serr = sb_exec(
-        sb.table("students")
-          .select("speech_level, first_name, photo_url, sex")
-          .eq("students_id", sid)
-          .limit(1)
-    )
+    # S0: computed snapshot (student/dashboard.py), valid until this student's
+    # progress/profile or the curriculum changes
+    parts = dashboard_cache.versions(sid)
+    cached = dashboard_cache.get(sid, lang)
+    if cached is not None:
+        return jsonify(cached)
+
+    # S1: Student (request-scoped profile memo)
+    me = identity()
+    srow, serr = me.profile("speech_level, first_name, photo_url, sex")
     if serr:
         return jsonify({"ok": False, "stage": "S1-students", "error": str(serr)}), 500
 
     # Auto-assign gender-based avatar if missing
-    if srows and not srows[0].get("photo_url"):
-        default_url = _default_photo_for_gender(srows[0].get("sex"))
-        srows[0]["photo_url"] = default_url
+    if srow and not srow.get("photo_url"):
+        default_url = _default_photo_for_gender(srow.get("sex"))
         sb.table("students").update({"photo_url": default_url}).eq("students_id", sid).execute()
+        me.patch({"photo_url": default_url})
 
-    level = _normalize_level(srows[0].get("speech_level") if srows else "non_verbal")
-    student_name = srows[0].get("first_name") if srows else "Student"
+    level = _normalize_level(srow.get("speech_level") if srow else "non_verbal")
+    student_name = srow.get("first_name") if srow else "Student"
 
-    # S2: Chapters
-    ch_rows, cerr = sb_exec(
-        sb.table("chapters")
-          .select("id, code, title_en, title_tl, sort_order, bg_path")
-          .order("sort_order")
-    )
-    if cerr:
-        return jsonify({"ok": False, "stage": "S2-chapters", "error": str(cerr)}), 500
-
-    chapters = []
-    for c in ch_rows or []:
-        cid = c.get("id") or c.get("chapters_id") or c.get("chapter_id")
-        if not cid:
-            continue
-        chapters.append({
-            "id": int(cid),
-            "code": c.get("code"),
-            "title_en": c.get("title_en"),
-            "title_tl": c.get("title_tl"),
-            "sort_order": int(c.get("sort_order") or 999),
-            "bg_path": c.get("bg_path"),
-        })
+    # S2: Chapters (curriculum store, no round trip)
+    try:
+        snap = curriculum.snapshot()
+    except Exception as e:
+        return jsonify({"ok": False, "stage": "S2-chapters", "error": str(e)}), 500
 
     # S3: Lessons grouped by chapter
     try:
@@ -474,158 +399,23 @@ def student_dashboard():
         return jsonify({"ok": False, "stage": "S3-lessons_grouped_by_chapter", "error": str(e)}), 500
 
     # S4: Progress + focus sets
-    prog = _progress_by_lesson(sb, sid)            # {lesson_id: {status,best}}
+    prog = _progress_by_lesson(sb, sid)            # {lesson_id: {status,best}} or None
     focus_set = _focus_chapter_numbers(level)      # e.g., {1,2} for non_verbal
 
-    # helper: map lesson_id -> "completed"/"unlocked"/"locked"
-    def _lesson_state(lid: int) -> str:
-        p = prog.get(int(lid)) or {}
-        if (p.get("status") == "completed") or (float(p.get("best", 0.0)) >= 60.0):
-            return "completed"
-        if p.get("status") in ("unlocked", "in_progress"):
-            return "unlocked"
-        return "locked"
-
-    out = []
-    for ch in chapters:
-        cid = ch["id"]
-        ch_no = ch["sort_order"]
-        title = ch["title_en"] if lang == "en" else (ch.get("title_tl") or ch["title_en"])
-
-        raw_lessons = sorted(
-            per_ch_lessons.get(cid, []) or [],
-            key=lambda x: (x.get("sort_order") or 9999)
-        )
-
-        is_focus = ch_no in focus_set
-
-        # 🔹 NEW: sequential unlock based on previous chapter completion
-        prev_ch_no = ch_no - 1
-        prev_ch_completed = False
-        if prev_ch_no >= 1:
-            prev_ch_id = next((c2["id"] for c2 in chapters if c2["sort_order"] == prev_ch_no), None)
-            if prev_ch_id:
-                prev_lessons = per_ch_lessons.get(prev_ch_id, [])
-                prev_ch_completed = _chapter_complete_first5(prog, prev_lessons)
-
-        # "Future" means beyond assigned focus chapters AND previous chapter not yet completed
-        is_future = (ch_no > max(focus_set)) and (not prev_ch_completed)
-
-        # If any lesson in this chapter is unlocked/completed in lesson_progress,
-        # we override the blanket future lock and show the chapter as accessible.
-        chapter_has_access = any(
-            _lesson_state((L.get("id") or L.get("lesson_id"))) != "locked"
-            for L in raw_lessons
-            if isinstance(L, dict) and (L.get("id") or L.get("lesson_id"))
-        )
-
-        # consider backend unlocks explicitly (status=unlocked/completed)
-        real_chapter_unlocked = any(
-            (
-                prog.get((L.get("id") or L.get("lesson_id")), {})
-                .get("status") in ("unlocked", "completed")
-            )
-            for L in raw_lessons
-            if isinstance(L, dict)
-        )
-
-        # 🔹 NEW RULE:
-        # 1. If previous chapter is completed → this chapter is always open as review.
-        # 2. Else if it has any progress/unlock → open (focus or review).
-        # 3. Else: apply assigned chapter + future locking.
-        if prev_ch_completed:
-            mode = "review"
-        elif chapter_has_access or real_chapter_unlocked:
-            mode = "focus" if is_focus else "review"
-        else:
-            if is_focus:
-                mode = "focus"
-            elif is_future:
-                mode = "locked"
-            else:
-                mode = "review"
-
-        lessons_out = []
-        prev_completed = True  # for sequential gating inside focus chapters
-
-        for idx, L in enumerate(raw_lessons):
-            lid = L.get("id") or L.get("lesson_id")
-            if not lid:
-                continue
-
-            lsort = L.get("sort_order") or (idx + 1)
-            ltitle = L.get("title_en") if lang == "en" else (L.get("title_tl") or L.get("title_en"))
-            ldesc  = L.get("description_en") if lang == "en" else (L.get("description_tl") or L.get("description_en"))
-            cover  = public_url(L.get("cover_path")) if L.get("cover_path") else None
-
-            real = _lesson_state(lid)
-
-            if mode == "locked":
-                status = "locked"
-
-            elif mode == "review":
-                # Sequential gating also applies to review chapters
-                if real == "completed":
-                    status = "completed"
-                    prev_completed = True
-                elif real == "unlocked":
-                    status = "unlocked"
-                    prev_completed = False
-                else:
-                    if lsort == 1:
-                        status = "unlocked" if not is_future else "locked"
-                        prev_completed = (real == "completed")
-                    else:
-                        status = "unlocked" if prev_completed else "locked"
-                        prev_completed = (real == "completed")
-
-            else:  # mode == "focus"
-                if real == "completed":
-                    status = "completed"
-                    prev_completed = True
-                elif real == "unlocked":
-                    status = "unlocked"
-                    prev_completed = False
-                else:
-                    if lsort == 1:
-                        status = "unlocked" if not is_future else "locked"
-                        prev_completed = (real == "completed")
-                    else:
-                        status = "unlocked" if prev_completed else "locked"
-                        prev_completed = (real == "completed")
-
-            lessons_out.append({
-                "id": int(lid),
-                "code": L.get("code"),
-                "title": ltitle,
-                "description_en": L.get("description_en"),
-                "description_tl": L.get("description_tl"),
-                "cover_path": cover,
-                "sort_order": int(lsort),
-                "status": status,
-            })
-
-        out.append({
-            "id": cid,
-            "code": ch.get("code"),
-            "number": ch_no,
-            "title": title,
-            "sort_order": ch_no,
-            "mode": mode,
-            "bg_path": public_url(ch.get("bg_path")),
-            "lessons": lessons_out,
-        })
-
-    return jsonify({
+    # S5: Chapter modes + lesson states
+    payload = {
         "ok": True,
         "student": {
             "students_id": sid,
             "name": student_name,
             "speech_level": level,
-            "photo_url": srows[0].get("photo_url") if srows else None,
+            "photo_url": srow.get("photo_url") if srow else None,
         },
-        "chapters": out
-    })
+        "chapters": dashboard_chapters(snap, per_ch_lessons, prog or {}, focus_set, lang),
+    }
+    if prog is not None:   # never keep a dashboard built without progress
+        dashboard_cache.put(sid, lang, parts, payload)
+    return jsonify(payload)
 
 
 # ----------------------------------------------------------
@@ -633,82 +423,44 @@ def student_dashboard():
 # ----------------------------------------------------------
 @student_bp.get("/lesson/<int:lesson_id>/activities")
 @require_student
+@conditional(lambda **kw: student_parts(request.user_id))
 def student_lesson_activities(lesson_id: int):
     """
     Returns i18n-picked, storage-resolved activities for a lesson.
     Enforces chapter/lesson access using speech_level rules.
     """
-    import json
-
-    sb = supabase_client.client
     sid = request.user_id
     lang = (request.args.get("lang") or request.headers.get("X-HMH-Lang") or "en").lower()
 
     # Student level (normalize for focus_map)
-    srows, serr = sb_exec(
-        sb.table("students").select("speech_level").eq("students_id", sid).limit(1)
-    )
-    if serr or not srows:
+    srow, serr = identity().profile("speech_level")
+    if serr or not srow:
         return jsonify({"ok": False, "error": "student not found"}), 404
-    level = _normalize_level(srows[0].get("speech_level"))
+    level = _normalize_level(srow.get("speech_level"))
 
     # Lesson row
-    lrow, lerr = sb_exec(
-        sb.table("lessons")
-          .select("id,chapter_id,code,title_en,title_tl,sort_order")
-          .eq("id", lesson_id).limit(1)
-    )
-    if lerr:
-        return jsonify({"ok": False, "where": "lessons", "error": str(lerr)}), 500
-    if not lrow:
+    try:
+        lesson = curriculum.find_lesson(lesson_id)
+    except Exception as e:
+        return jsonify({"ok": False, "where": "lessons", "error": str(e)}), 500
+    if not lesson:
         return jsonify({"ok": False, "error": f"Lesson {lesson_id} not found"}), 404
-    lesson = lrow[0]
 
     # Guard: focus sequential / review always / locked never
-    per_ch_lessons = lessons_grouped_by_chapter() or {}
-    if not can_start_lesson(sid, level, lesson, per_ch_lessons):
+    if not can_start_lesson(sid, level, lesson):
         return jsonify({"ok": False, "error": "locked"}), 403
 
-    # ✅ Fetch activities
-    rows, err = sb_exec(
-        sb.table("activities")
-          .select("id,lesson_id,type,sort_order,spiral_tag,difficulty,affective_level,"
-                  "supports,prompt_en,prompt_tl,data")
-          .eq("lesson_id", lesson_id)
-          .order("sort_order")
-    )
-    if err:
-        return jsonify({"ok": False, "where": "activities", "error": str(err)}), 500
-
-    #  Convert stringified JSON fields into dicts
-    for r in (rows or []):
-        if isinstance(r.get("data"), str):
-            try:
-                r["data"] = json.loads(r["data"])
-            except Exception:
-                pass
-
-    # Resolve i18n
-    activities = [pick_branch(r, lang) for r in (rows or [])]
-
-    return jsonify({
-        "ok": True,
-        "meta": {
-            "lesson_id": lesson["id"],
-            "chapter_id": lesson["chapter_id"],
-            "lesson_code": lesson["code"],
-            "lesson_title": lesson["title_en"] if lang == "en" else (lesson.get("title_tl") or lesson["title_en"]),
-            "count": len(activities),
-            "lang": lang,
-        },
-        "activities": activities
-    })
+    # ✅ Activities: precompiled per-language bundle (content/bundles.py)
+    body, _ = bundles.get(lesson_id, lang)
+    if body is None:
+        return jsonify({"ok": False, "error": f"Lesson {lesson_id} not found"}), 404
+    return Response(body, mimetype="application/json")
 
 
 @student_bp.post("/attempt")
 @require_student
+@idempotent
 def attempt():
-    sb = supabase_client.client
     j = (request.get_json(silent=True) or {})
     activity_id = j.get("activity_id")
     lang = (j.get("lang") or "en").lower()
@@ -729,170 +481,209 @@ def attempt():
     # ------------------------------
     # Fetch activity
     # ------------------------------
-    rows, err = sb_exec(
-        sb.table("activities")
-          .select("id,type,prompt_en,prompt_tl,supports,data,sort_order")
-          .eq("id", activity_id)
-          .limit(1)
-    )
-    if err or not rows:
+    act = curriculum.find_activity(activity_id)
+    if not act:
         return jsonify({"error": "Activity not found"}), 404
 
-    act = rows[0]
-    a_type = (act.get("type") or "").lower()
-
     # ------------------------------
-    # Score computation
+    # Score + meta/metric rows (student/attempts.py)
     # ------------------------------
-    score = 0.0
-    if a_type == "mcq":
-        ch = submission.get("choice_key")
-        correct = submission.get("correct_key")
-        score = 100.0 if (ch and correct and ch == correct) else 0.0
-    elif a_type == "recognition":
-        score = score_recognition(act, submission)
-    elif a_type in ("listening", "tts"):
-        score = score_listening(act, submission)
-    elif a_type == "asr": 
-        score = score_asr(act, submission, lang=lang)
-    elif a_type == "emotion":
-        score = score_emotion(act, submission)
-    else:
-        score = 0.0  # unknown type hard-fail safe
+    built = build_attempt(act, submission, lang)
+    score = built["score"]
 
     # ------------------------------
-    # Save attempt 
+    # Save attempt + metric + ledger (one transactional call)
     # ------------------------------
-    enriched_meta = {
-        "action": submission.get("action"),
-        "layout": submission.get("layout"),
-        "lang": lang,
-        "wrong_count": submission.get("wrong_count"),
-        "choice_key": submission.get("choice_key"),
-        "correct_key": submission.get("correct_key"),
-        "session_id": submission.get("session_id"),
-        "submission": submission,
-    }
-
     try:
-        insert_result = sb.table("activity_attempts").insert({
-            "students_id": sid,
-            "activities_id": activity_id,
-            "score": score,
-            "meta": enriched_meta
-        }).execute()
-
-        attempt_rows = insert_result.data if hasattr(insert_result, "data") else None
-        if not attempt_rows:
-            raise Exception("Insert returned no data")
-
-        attempt_id = attempt_rows[0]["id"]
+        rec, err = record_attempt(sid, activity_id, score, built["meta"],
+                                  built["metric_kind"], built["metric"])
+        if err:
+            raise Exception(err)
+        attempt_id = rec["attempt_id"]
         print(f"Attempt saved id={attempt_id}, student={sid}, score={score}")
+        touch_student(sid)
     except Exception as e:
         print("Attempt insert failed:", e)
         return jsonify({"error": f"DB insert failed: {str(e)}"}), 500
 
     # ------------------------------
-    # Metrics (ASR / Emotion)
+    # Achievements — evaluated in the background; the client polls
+    # /achievements/recent?since=<achievements_since>
     # ------------------------------
-    try:
-        if a_type == "asr":
-            # Prefer server transcript if present; fallback to browser transcript
-            recog_text = submission.get("backend_text") or submission.get("transcript") or ""
-            i18n = (act.get("data") or {}).get("i18n", {})
-            expect_text = (
-                (i18n.get(lang) or {}).get("expected_speech")
-                or (i18n.get("en") or {}).get("expected_speech")
-                or ""
-            )
-            model_used = submission.get("model_used") or "hmh-whisper-auto"
-            latency_ms = submission.get("latency_ms")
-
-            sb.table("speech_metrics").insert({
-                "attempt_id": attempt_id,
-                "students_id": sid,
-                "activities_id": activity_id,
-                "recognized_text": recog_text,
-                "expected_text": (expect_text or "").lower(),
-                "accuracy": score,
-                "lang": lang,
-                "model_used": model_used,
-                "latency_ms": latency_ms
-            }).execute()
-
-        elif a_type == "emotion":
-            det = (submission.get("detected") or {}).get("label")
-            conf = (submission.get("detected") or {}).get("confidence")
-            expected = (
-                ((act.get("data") or {}).get("i18n") or {}).get(lang, {},).get("expected_emotion")
-                or ((act.get("data") or {}).get("i18n") or {}).get("en", {},).get("expected_emotion")
-            )
-
-            if det:
-                sb.table("emotion_metrics").insert({
-                    "attempt_id": attempt_id,
-                    "students_id": sid,
-                    "activities_id": activity_id,
-                    "detected_emotion": det,
-                    "expected_emotion": expected,
-                    "confidence": conf,
-                    "model_backend": "DeepFace-opencv"
-                }).execute()
-
-    except Exception as e:
-        print("Metric logging failed:", e)
+    lesson_id = _attempt_lesson_id(j, submission, act)
+
+    since = after_attempt(
+        sid,
+        score,
+        attempt_id=attempt_id,
+        activity_id=activity_id,
+        lesson_id=lesson_id,
+        layout=submission.get("layout"),
+    )
 
     # ------------------------------
-    # Achievements
+    # Final response
     # ------------------------------
-    new_inline, new_profile = [], []
-    try:
-        print("Checking possible achievements for", sid)
+    return jsonify({
+        "score": float(score),
+        "passed": bool(score >= 60.0),
+        "attempt_id": attempt_id,
+        "inline_achievements": [],
+        "profile_achievements": [],
+        "achievements_pending": True,
+        "achievements_since": since,
+    })
 
-        # prefer provided lesson_id; if absent, derive from activity_id
-        lesson_id = j.get("lesson_id") or submission.get("lesson_id")
-        if lesson_id is not None:
-            try:
-                lesson_id = int(lesson_id)
-            except Exception:
-                lesson_id = None
 
-        if not lesson_id:
-            lr, le = sb_exec(
-                sb.table("activities").select("lesson_id").eq("id", activity_id).limit(1)
-            )
-            if not le and lr:
-                lesson_id = lr[0]["lesson_id"]
+def _attempt_lesson_id(j, submission, act):
+    """Prefer the lesson_id the client sent; if absent, derive it from the activity."""
+    lesson_id = j.get("lesson_id") or submission.get("lesson_id")
+    if lesson_id is not None:
+        try:
+            lesson_id = int(lesson_id)
+        except Exception:
+            lesson_id = None
+    return lesson_id or act.get("lesson_id")
 
-        layout = submission.get("layout")
 
-        inline_codes, profile_codes = check_and_award_achievements(
-            sb,
-            sid,
-            score,
-            lesson_id=lesson_id,
-            layout=layout,
-        )
+@student_bp.post("/attempts/batch")
+@require_student
+@idempotent
+def attempts_batch():
+    """
+    Records an ordered list of attempts in one request (answers queued on a
+    tablet while the classroom network was down).
+    Body:
+      {
+        "lang": "en",                       # default for items without one
+        "attempts": [
+          {"activity_id": 12, "submission": {...}, "lang": "en", "lesson_id": 3,
+           "idempotency_key": "..."},   # key of the failed POST /attempt, if any
+          ...
+        ]
+      }
+    Every item is scored like POST /attempt; all of them are saved in one
+    transaction and achievements are evaluated once over the whole batch.
+    Items whose activity doesn't exist are reported and skipped, as are items
+    whose original POST /attempt did reach the server (its stored response
+    is returned instead).
+    """
+    sid = request.user_id
+    j = request.get_json(silent=True) or {}
+    lang = (j.get("lang") or "en").lower()
+    items = j.get("attempts")
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "attempts must be a non-empty list"}), 400
+    if len(items) > ATTEMPT_BATCH_MAX:
+        return jsonify({"error": f"At most {ATTEMPT_BATCH_MAX} attempts per batch"}), 400
+
+    results = [None] * len(items)
+    to_save, pending = [], []
+    for i, it in enumerate(items):
+        it = it if isinstance(it, dict) else {}
+        activity_id = it.get("activity_id")
+        already = stored_json(str(it.get("idempotency_key") or ""), "student.attempt")
+        if already is not None:
+            results[i] = {"index": i, "activity_id": activity_id, "ok": True, "duplicate": True,
+                          "attempt_id": already.get("attempt_id"), "score": already.get("score"),
+                          "passed": already.get("passed")}
+            continue
+        act = curriculum.find_activity(activity_id) if activity_id else None
+        if not act:
+            results[i] = {"index": i, "activity_id": activity_id, "ok": False, "error": "Activity not found"}
+            continue
+        submission = it.get("submission") or {}
+        built = build_attempt(act, submission, (it.get("lang") or lang).lower())
+        to_save.append({"activity_id": act.get("id", activity_id), **built})
+        pending.append((i, act, it, submission, built["score"]))
+
+    rows, err = record_attempts(sid, to_save)
+    if rows:
+        touch_student(sid)
+
+    observed = []
+    for (i, act, it, submission, score), row in zip(pending, rows or []):
+        results[i] = {
+            "index": i,
+            "activity_id": act.get("id"),
+            "ok": True,
+            "attempt_id": row["attempt_id"],
+            "score": float(score),
+            "passed": bool(score >= 60.0),
+        }
+        observed.append({
+            "attempt_id": row["attempt_id"],
+            "activity_id": act.get("id"),
+            "lesson_id": _attempt_lesson_id(it, submission, act),
+            "layout": submission.get("layout"),
+            "score": float(score),
+        })
+    since = after_attempts(sid, observed)
 
-        new_inline = inline_codes or []
-        new_profile = profile_codes or []
+    saved = len(observed)
+    print(f"Attempt batch: student={sid} saved={saved}/{len(items)}")
+    if err:
+        print("Attempt batch insert failed:", err)
+        for i, act, *_ in pending[saved:]:
+            results[i] = {"index": i, "activity_id": act.get("id"), "ok": False, "error": "not saved"}
+        return jsonify({
+            "ok": False,
+            "error": f"DB insert failed: {err}",
+            "saved": saved,
+            "results": results,
+            "achievements_since": since,
+        }), 500
 
-        print("Inline achievements:", new_inline)
-        print("Profile-only achievements:", new_profile)
+    return jsonify({
+        "ok": True,
+        "saved": saved,
+        "results": results,
+        "achievements_pending": bool(observed),
+        "achievements_since": since,
+    })
 
-    except Exception as e:
-        print("Achievement logic failed gracefully:", e)
-        new_inline, new_profile = [], []
 
+@student_bp.get("/achievements/recent")
+@require_student
+def recent_achievements():
+    """
+    Badges earned after ?since= (UTC ISO, from an attempt response), split
+    into inline (celebrate now) and profile-only codes. Polled by the client.
+    """
+    sb = supabase_client.client
+    sid = request.user_id
+    since = request.args.get("since")
 
-    # ------------------------------
-    # Final response
-    # ------------------------------
+    q = (
+        sb.table("student_achievements")
+          .select(
+            "achievements_code, earned_at, "
+            "achievements:achievements_code(code, name, description, icon_path)"
+          )
+          .eq("students_id", sid)
+    )
+    if since:
+        q = q.gt("earned_at", since)
+    rows, err = sb_exec(q.order("earned_at", desc=True).limit(20))
+    if err:
+        return jsonify({"ok": False, "error": str(err)}), 500
+
+    items = []
+    for r in rows or []:
+        a = r.get("achievements") or {}
+        items.append({
+            "code": r.get("achievements_code"),
+            "name": a.get("name"),
+            "description": a.get("description"),
+            "icon_path": a.get("icon_path"),
+            "earned_at": r.get("earned_at"),
+        })
     return jsonify({
-        "score": float(score),
-        "passed": bool(score >= 60.0),
-        "inline_achievements": new_inline,
-        "profile_achievements": new_profile
+        "ok": True,
+        "inline": [i for i in items if i["code"] in INLINE_CODES],
+        "profile": [i for i in items if i["code"] in PROFILE_ONLY_CODES],
+        "now": datetime.utcnow().isoformat(),
     })
 
 # ----------------------------------------------------------
@@ -903,11 +694,17 @@ def attempt():
 def get_lesson_progress(lesson_id: int):
     """
     Try exact (student, lesson, lang). If none, fall back to latest ANY lang row.
+    Saves still waiting in the write-behind buffer win over the table.
     """
     sb = supabase_client.client
     sid = request.user_id
     lang = (request.args.get("lang") or request.headers.get("X-HMH-Lang") or "en").lower()
 
+    # 0) pending save for this lang
+    pending = progress_buffer.get(sid, lesson_id, lang)
+    if pending:
+        return _progress_response(pending)
+
     # 1) exact lang
     rows, err = sb_exec(
         sb.table("lesson_runtime_progress")
@@ -933,11 +730,17 @@ def get_lesson_progress(lesson_id: int):
         if err2:
             return jsonify({"ok": False, "error": str(err2)}), 500
         rows = rows2
+        pending = progress_buffer.get(sid, lesson_id)
+        if pending and (not rows or str(pending["updated_at"]) >= str(rows[0].get("updated_at") or "")):
+            rows = [pending]
 
     if not rows:
         return jsonify({"ok": True, "progress": None})
 
-    r = rows[0]
+    return _progress_response(rows[0])
+
+
+def _progress_response(r):
     return jsonify({
         "ok": True,
         "progress": {
@@ -974,6 +777,7 @@ def save_lesson_progress(lesson_id: int):
     clear = bool(j.get("clear"))
 
     if clear:
+        progress_buffer.discard(sid, lesson_id, lang)
         _, derr = sb_exec(
             sb.table("lesson_runtime_progress")
               .delete()
@@ -1003,12 +807,8 @@ def save_lesson_progress(lesson_id: int):
         ) if j.get("updated_at") else datetime.now(timezone.utc),
     }
 
-    # Use RPC-like UPSERT behavior
-    q = sb.table("lesson_runtime_progress").upsert(payload, on_conflict="students_id,lesson_id,lang")
-    _, uerr = sb_exec(q)
-    if uerr:
-        return jsonify({"ok": False, "error": str(uerr)}), 500
-
+    # Write-behind: upserted in bulk by the flusher (student/progress_buffer.py)
+    progress_buffer.put(payload)
     return jsonify({"ok": True})
 
 @student_bp.post("/lesson/<int:lesson_id>/complete")
@@ -1020,81 +820,59 @@ def complete_lesson(lesson_id: int):
     try:
         is_completed = recompute_lesson_completion(sb, sid, int(lesson_id))
 
+        snap = curriculum.snapshot()
+
         # Current lesson row
-        lrow, _ = sb_exec(
-            sb.table("lessons")
-              .select("id, chapter_id, sort_order")
-              .eq("id", lesson_id).limit(1)
-        )
-        if not lrow:
+        lesson = snap.lesson(lesson_id)
+        if not lesson:
             return jsonify({"ok": False, "error": "Lesson not found"}), 404
 
-        ch_id = int(lrow[0]["chapter_id"])
-        sort_order = int(lrow[0]["sort_order"])
+        ch_id = int(lesson["chapter_id"])
 
-        # Lessons in current chapter (active only)
-        lessons, _ = sb_exec(
-            sb.table("lessons")
-              .select("id, sort_order, is_active")
-              .eq("chapter_id", ch_id)
-              .eq("is_active", True)
-              .order("sort_order")
-        )
+        graph = snap.graph
 
         # 1) Next-lesson unlock (only if this lesson is completed)
         next_lesson_id = None
         if is_completed:
-            for L in lessons or []:
-                if int(L["sort_order"]) == sort_order + 1:
-                    next_lesson_id = int(L["id"])
-                    sb_exec(
-                        sb.table("lesson_progress")
-                          .upsert({
-                              "students_id": sid,
-                              "lesson_id": next_lesson_id,
-                              "status": "unlocked",
-                              "unlocked_at": datetime.now(timezone.utc)
-                          }, on_conflict="students_id,lesson_id")
-                    )
-                    break
+            next_lesson_id = graph.next_lesson(lesson_id, active_only=True)
+            if next_lesson_id:
+                sb_exec(
+                    sb.table("lesson_progress")
+                      .upsert({
+                          "students_id": sid,
+                          "lesson_id": next_lesson_id,
+                          "status": "unlocked",
+                          "unlocked_at": datetime.now(timezone.utc)
+                      }, on_conflict="students_id,lesson_id")
+                )
 
         # 2) Chapter completion (first 5 active lessons)
-        chapter_completed = chapter_complete_firstN_live(sid, lessons or [], N=5)
+        chapter_completed = chapter_complete_firstN_live(
+            sid, graph.gate_lessons(ch_id, active_only=True), N=graph.gate_n
+        )
 
         # 3) If chapter completed → unlock first active lesson of the NEXT chapter (works for all chapters)
         next_chapter_unlocked = False
         if chapter_completed:
-            ch_rows, _ = sb_exec(
-                sb.table("chapters").select("id, sort_order").order("sort_order")
-            )
-            sorted_chs = sorted(ch_rows or [], key=lambda x: int(x["sort_order"]))
-            for idx, c in enumerate(sorted_chs):
-                if int(c["id"]) == ch_id and idx + 1 < len(sorted_chs):
-                    next_ch_id = int(sorted_chs[idx + 1]["id"])
-                    next_lessons, _ = sb_exec(
-                        sb.table("lessons")
-                          .select("id, sort_order")
-                          .eq("chapter_id", next_ch_id)
-                          .eq("is_active", True)
-                          .order("sort_order")
-                    )
-                    if next_lessons:
-                        first_lesson_id = int(next_lessons[0]["id"])
-                        sb_exec(
-                            sb.table("lesson_progress")
-                              .upsert({
-                                  "students_id": sid,
-                                  "lesson_id": first_lesson_id,
-                                  "status": "unlocked",
-                                  "unlocked_at": datetime.now(timezone.utc)
-                              }, on_conflict="students_id,lesson_id")
-                        )
-                        next_chapter_unlocked = True
-                    break
-
-        # Cleanup runtime progress
+            next_ch_id = graph.next_chapter(ch_id)
+            first_lesson_id = graph.first_lesson(next_ch_id)
+            if first_lesson_id:
+                sb_exec(
+                    sb.table("lesson_progress")
+                      .upsert({
+                          "students_id": sid,
+                          "lesson_id": first_lesson_id,
+                          "status": "unlocked",
+                          "unlocked_at": datetime.now(timezone.utc)
+                      }, on_conflict="students_id,lesson_id")
+                )
+                next_chapter_unlocked = True
+
+        # Cleanup runtime progress (pending saves first, so a flush can't bring it back)
+        progress_buffer.discard(sid, lesson_id)
         sb.table("lesson_runtime_progress").delete() \
           .eq("students_id", sid).eq("lesson_id", lesson_id).execute()
+        touch_student(sid)
 
         return jsonify({
             "ok": True,
@@ -1136,17 +914,27 @@ def create_session():
     mood = j.get("mood")
     language = (j.get("language") or "en").lower()
 
-    # (a) block if any active/pending exists
-    act_rows, act_err = sb_exec(
-        sb.table("sessions")
-          .select("id")
-          .eq("students_id", sid)
-          .in_("status", ["pending", "active"])
-          .limit(1)
-    )
-    if act_err:
-        return jsonify({"error": f"session lookup failed: {act_err}"}), 500
-    if act_rows:
+    # Session index (student/session_state.py): no query when warm
+    state, st_err = session_index.state(sid)
+    if st_err:
+        return jsonify({"error": f"session lookup failed: {st_err}"}), 500
+
+    # (a) block if any active/pending exists. The index only knows the newest
+    # row, so unless that one is open, ask the table (authoritative, and
+    # creating a session is rare).
+    blocked = bool(state.current)
+    if not blocked:
+        act_rows, act_err = sb_exec(
+            sb.table("sessions")
+              .select("id")
+              .eq("students_id", sid)
+              .in_("status", ["pending", "active"])
+              .limit(1)
+        )
+        if act_err:
+            return jsonify({"error": f"session lookup failed: {act_err}"}), 500
+        blocked = bool(act_rows)
+    if blocked:
         return jsonify({
             "ok": False,
             "blocked": True,
@@ -1155,18 +943,7 @@ def create_session():
         }), 403
 
     # (b) block if a session already STARTED today (Manila day)
-    start_utc, end_utc = mnl_day_bounds_utc()
-    today_rows, day_err = sb_exec(
-        sb.table("sessions")
-          .select("id")
-          .eq("students_id", sid)
-          .gte("started_at", start_utc)
-          .lt("started_at", end_utc)
-          .limit(1)
-    )
-    if day_err:
-        return jsonify({"error": f"session day check failed: {day_err}"}), 500
-    if today_rows:
+    if state.started_today():
         return jsonify({
             "ok": False,
             "blocked": True,
@@ -1175,7 +952,7 @@ def create_session():
         }), 403
 
     # create pending session (no started_at yet)
-    _, ierr = sb_exec(
+    rows, ierr = sb_exec(
         sb.table("sessions").insert({
             "students_id": sid,
             "mood": mood,
@@ -1190,17 +967,20 @@ def create_session():
     if ierr:
         return jsonify({"error": f"insert session failed: {ierr}"}), 500
 
-    rows, ferr = sb_exec(
-        sb.table("sessions")
-          .select("id, minutes_allowed, mood, language, status, started_at, ended_at")
-          .eq("students_id", sid)
-          .order("id", desc=True)
-          .limit(1)
-    )
-    if ferr or not rows:
-        return jsonify({"error": f"could not fetch session: {ferr}"}), 500
+    if not rows:
+        rows, ferr = sb_exec(
+            sb.table("sessions")
+              .select(SESSION_COLUMNS)
+              .eq("students_id", sid)
+              .order("id", desc=True)
+              .limit(1)
+        )
+        if ferr or not rows:
+            return jsonify({"error": f"could not fetch session: {ferr}"}), 500
 
-    return jsonify({"ok": True, "session": rows[0]})
+    sess = {k: rows[0].get(k) for k in SESSION_KEYS}
+    session_index.record(sid, sess)
+    return jsonify({"ok": True, "session": sess})
 
 
 @student_bp.post("/activate-session")
@@ -1218,18 +998,10 @@ def activate_session():
 
     # Before activating, check Manila day uniqueness
     sid = request.user_id
-    start_utc, end_utc = mnl_day_bounds_utc()
-    today_rows, derr = sb_exec(
-        sb.table("sessions")
-          .select("id")
-          .eq("students_id", sid)
-          .gte("started_at", start_utc)
-          .lt("started_at", end_utc)
-          .limit(1)
-    )
+    state, derr = session_index.state(sid)
     if derr:
         return jsonify({"error": f"session day check failed: {derr}"}), 500
-    if today_rows:
+    if state.started_today():
         # They already started one today
         return jsonify({"ok": False, "blocked": True, "reason": "session_recent"}), 403
 
@@ -1248,7 +1020,7 @@ def activate_session():
 
     rows, ferr = sb_exec(
         sb.table("sessions")
-          .select("id, minutes_allowed, mood, language, status, started_at, ended_at")
+          .select(SESSION_COLUMNS)
           .eq("id", sess_id)
           .eq("students_id", request.user_id)
           .limit(1)
@@ -1256,6 +1028,7 @@ def activate_session():
     if ferr or not rows:
         return jsonify({"error": f"fetch after activate failed: {ferr}"}), 500
 
+    session_index.record(sid, rows[0])
     return jsonify({"ok": True, "session": rows[0]})
 
 
@@ -1270,18 +1043,13 @@ def end_session():
     j = request.get_json(silent=True) or {}
     sess_id = j.get("session_id")
 
-    # fallback: latest active
+    # fallback: latest active (session index)
     if not sess_id:
-        rows, ferr = sb_exec(
-            sb.table("sessions")
-              .select("id")
-              .eq("students_id", request.user_id)
-              .eq("status", "active")
-              .order("id", desc=True).limit(1)
-        )
-        if ferr or not rows:
+        state, ferr = session_index.state(request.user_id, expire=False)
+        cur = state.current if state else None
+        if ferr or not cur or (cur.get("status") or "").lower() != "active":
             return jsonify({"error": "no active session found"}), 404
-        sess_id = rows[0]["id"]
+        sess_id = cur["id"]
 
     now_iso = _now_utc_iso()
     _, uerr = sb_exec(
@@ -1293,4 +1061,5 @@ def end_session():
     if uerr:
         return jsonify({"error": f"end failed: {uerr}"}), 500
 
+    session_index.record(request.user_id, {"id": int(sess_id), "status": "ended", "ended_at": now_iso})
     return jsonify({"ok": True})
@@ -175,3 +175,26 @@ def score_emotion(act, submission):
     det = _norm_emotion(det_raw)
 
     return 100.0 if (det == exp and conf >= 0.55) else 0.0
+
+
+# -------------------------------
+# Dispatch
+# -------------------------------
+
+def score_submission(act, submission, lang: str = "en") -> float:
+    """Score a submission with the scorer for the activity's type (unknown types → 0)."""
+    submission = submission or {}
+    a_type = _safe_lower(act.get("type"))
+    if a_type == "mcq":
+        ch = submission.get("choice_key")
+        correct = submission.get("correct_key")
+        return 100.0 if (ch and correct and ch == correct) else 0.0
+    if a_type == "recognition":
+        return score_recognition(act, submission)
+    if a_type in ("listening", "tts"):
+        return score_listening(act, submission)
+    if a_type == "asr":
+        return score_asr(act, submission, lang=lang)
+    if a_type == "emotion":
+        return score_emotion(act, submission)
+    return 0.0  # unknown type hard-fail safe
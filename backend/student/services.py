@@ -14,6 +14,8 @@ from datetime import datetime, timezone
 from extensions import supabase_client
 from utils.sb import sb_exec
 from content.transform import pick_branch, public_url
+from content.curriculum import curriculum
+from student import ledger
 
 # --------------------------------------------------------------------
 # Normalization & focus helpers
@@ -93,79 +95,24 @@ def _chapter_complete_first5(
 def lesson_passed(students_id: str, lesson_id: int) -> bool:
     """
     Return True if the student has a >= 60 best attempt for every activity in the lesson.
+    (best-score ledger, student/ledger.py)
     """
-    sb = supabase_client.client
-
-    acts, err = sb_exec(
-        sb.table("activities")
-          .select("id")
-          .eq("lesson_id", lesson_id)
-          .order("sort_order")
-    )
-    if err:
-        return False
-    act_ids = [a.get("id") for a in (acts or []) if isinstance(a, dict)]
-    if not act_ids:
-        return False
-
-    atts, err = sb_exec(
-        sb.table("activity_attempts")
-          .select("activities_id,score")
-          .in_("activities_id", act_ids)
-          .eq("students_id", students_id)
-    )
-    best: Dict[int, float] = {}
-    for a in atts or []:
-        aid = a.get("activities_id")
-        sc = float(a.get("score") or 0.0)
-        if aid is None:
-            continue
-        best[aid] = max(best.get(aid, 0.0), sc)
-
-    return all(best.get(aid, 0.0) >= 60.0 for aid in act_ids)
+    return int(lesson_id) in ledger.lessons_passed(students_id, [lesson_id])
 
 def lessons_grouped_by_chapter() -> Dict[int, List[Dict[str, Any]]]:
     """
-    Return all lessons grouped by chapter_id.
+    Return all lessons grouped by chapter_id (served from the curriculum store).
     Shape: { chapter_id: [ {id, chapter_id, code, title_en, title_tl, sort_order, ...}, ... ] }
     """
-    sb = supabase_client.client
-    lessons, err = sb_exec(
-        sb.table("lessons")
-          .select(
-              "id,chapter_id,code,title_en,title_tl,sort_order,is_active,"
-              "cover_path,description_en,description_tl"
-          )
-          .order("chapter_id")
-          .order("sort_order")
-    )
-    if err:
-        return {}
-
-    grouped: Dict[int, List[Dict[str, Any]]] = {}
-    for l in lessons or []:
-        if not isinstance(l, dict):
-            continue
-        ch_id = l.get("chapter_id")
-        if ch_id is None:
-            continue
-        grouped.setdefault(int(ch_id), []).append(l)
-    return grouped
+    snap = curriculum.snapshot()
+    return {cid: list(rows) for cid, rows in snap.lessons_by_chapter.items()}
 
 def chapter_number(chapter_id: int) -> Optional[int]:
     """
     Return the sort_order (1, 2, 3, …) for a given chapter_id.
     """
-    sb = supabase_client.client
-    row, err = sb_exec(
-        sb.table("chapters")
-          .select("sort_order")
-          .eq("id", chapter_id)
-          .limit(1)
-    )
-    if err or not row:
-        return None
-    return row[0].get("sort_order")
+    ch = curriculum.snapshot().chapter(chapter_id)
+    return ch.get("sort_order") if ch else None
 
 # --------------------------------------------------------------------
 # Dashboard decoration (for the "pretty" payload)
@@ -301,12 +248,14 @@ def decorate_dashboard_payload(
 # Lesson gating — used by /lesson/<id>/activities
 # --------------------------------------------------------------------
 
-def can_start_lesson(students_id, level, lesson, per_chapter_lessons):
+def can_start_lesson(students_id, level, lesson, per_chapter_lessons=None):
     """
     NEW RULE:
     - Assigned chapters (focus_set) still determine FOCUS styling.
     - BUT sequential unlocking ALWAYS overrides speech-level gating.
     - If a lesson is unlocked or completed in lesson_progress → allow it.
+    The previous lesson comes from the curriculum graph; per_chapter_lessons
+    is accepted for older callers but no longer needed.
     """
 
     from extensions import supabase_client
@@ -321,7 +270,6 @@ def can_start_lesson(students_id, level, lesson, per_chapter_lessons):
     prog = {int(r["lesson_id"]): r for r in (prog_rows or [])}
 
     lid = lesson.get("id")
-    ch_id = lesson.get("chapter_id")
     lsort = lesson.get("sort_order", 1)
 
     # 1. Immediate override:
@@ -333,16 +281,13 @@ def can_start_lesson(students_id, level, lesson, per_chapter_lessons):
             return True
 
     # 2. Sequential unlocking inside the chapter (fallback)
-    lessons = sorted(per_chapter_lessons.get(ch_id, []), key=lambda x: (x.get("sort_order") or 999))
-
     # Lesson 1 ALWAYS allowed
     if lsort == 1:
         return True
 
     # Check if previous lesson is completed
-    prev = next((x for x in lessons if x.get("sort_order") == lsort - 1), None)
-    if prev:
-        prev_id = prev.get("id")
+    prev_id = curriculum.snapshot().graph.prev_lesson(lid)
+    if prev_id:
         p = prog.get(prev_id)
         if p and ((p.get("status") == "completed") or (p.get("best_score") or 0) >= 60):
             return True
@@ -364,52 +309,15 @@ def recompute_lesson_completion(sb, sid, lesson_id):
     This prevents lessons from getting stuck in 'in_progress'.
     """
 
-    # 1) fetch all activities for this lesson
-    acts, err = sb_exec(
-        sb.table("activities")
-          .select("id")
-          .eq("lesson_id", lesson_id)
-    )
-    if err or not acts:
-        return False
-
-    act_ids = [a["id"] for a in acts if isinstance(a, dict) and a.get("id")]
-    if not act_ids:
-        return False
-
-    # 2) fetch all attempts for those activities
-    atts, err = sb_exec(
-        sb.table("activity_attempts")
-          .select("activities_id, score")
-          .in_("activities_id", act_ids)
-          .eq("students_id", sid)
-    )
-    if err:
+    # 1) all activities for this lesson (curriculum store, no round trip)
+    if not curriculum.snapshot().activity_ids(lesson_id):
         return False
 
-    # 3) compute BEST score per activity
-    best_by_activity = {}
-    for a in atts or []:
-        aid = a.get("activities_id")
-        sc = float(a.get("score") or 0.0)
-        if aid:
-            best_by_activity[aid] = max(best_by_activity.get(aid, 0.0), sc)
-
-    # 4) determine if lesson is passed
-    #    (must have a best score for EVERY activity, and all ≥ 60)
-    if len(best_by_activity) != len(act_ids):
-        passed = False
-    else:
-        passed = all(score >= 60.0 for score in best_by_activity.values())
-
-    # 5) compute average best score
-    avg_best = (
-        sum(best_by_activity.values()) / len(act_ids)
-        if best_by_activity
-        else 0.0
-    )
+    # 2) passed + average best score from the best-score ledger
+    #    (must have a best score ≥ 60 for EVERY activity)
+    passed, avg_best = ledger.lesson_status(sid, lesson_id)
 
-    # 6) upsert lesson_progress with auto-complete
+    # 3) upsert lesson_progress with auto-complete
     payload = {
         "students_id": sid,
         "lesson_id": lesson_id,
@@ -444,40 +352,26 @@ def recompute_lesson_completion(sb, sid, lesson_id):
 
 def chapter_complete_firstN_live(students_id: str, lessons: list[dict], N: int = 5) -> bool:
     """Return True iff the first N **active** lessons are completed based on attempts
-    (every activity in each lesson has best ≥ 60). Ignores lesson_progress cache."""
-    from .services import lesson_passed  
-
+    (every activity in each lesson has best ≥ 60). Ignores lesson_progress cache.
+    One ledger read for all N lessons."""
     active = [l for l in (lessons or []) if (l.get("is_active") is True or l.get("is_active") is None)]
     firstN = sorted(active, key=lambda x: (x.get("sort_order") or 9999))[:N]
-    if not firstN:
+    ids = [int(L.get("id") or L.get("lesson_id")) for L in firstN if (L.get("id") or L.get("lesson_id"))]
+    if not firstN or len(ids) != len(firstN):
         return False
-    for L in firstN:
-        lid = L.get("id") or L.get("lesson_id")
-        if not lid or not lesson_passed(students_id, int(lid)):
-            return False
-    return True
+    return ledger.lessons_passed(students_id, ids) >= set(ids)
 
 
 
 def student_completed_all_lessons(students_id: str) -> bool:
     """
-    Return True if the student has completed all active lessons.
-    Completion is per your existing rule: lesson_progress.status='completed'
-    for lessons where lessons.is_active = TRUE.
-    """
-    total_sql = """
-      SELECT COUNT(*)::int AS total
-      FROM lessons
-      WHERE is_active = TRUE
+    Return True if the student has completed all active lessons, i.e. every
+    activity of every is_active lesson has a best score >= 60 (the same rule
+    recompute_lesson_completion uses to mark lesson_progress completed).
+    One best-score ledger read.
     """
-    done_sql = """
-      SELECT COUNT(*)::int AS done
-      FROM lesson_progress lp
-      JOIN lessons l ON l.id = lp.lesson_id
-      WHERE lp.students_id = %(sid)s
-        AND lp.status = 'completed'
-        AND l.is_active = TRUE
-    """
-    total = sb_exec(total_sql)[0]["total"]
-    done = sb_exec(done_sql, {"sid": students_id})[0]["done"]
-    return total > 0 and done >= total
\ No newline at end of file
+    snap = curriculum.snapshot()
+    active_ids = [lid for lid, l in snap.lessons_by_id.items() if l.get("is_active") is True]
+    if not active_ids:
+        return False
+    return ledger.lessons_passed(students_id, active_ids) >= set(active_ids)
@@ -0,0 +1,305 @@
+# backend/student/session_state.py
+# In-memory session index per student, so session-status checks (login,
+# create/activate/end session, check_session_expired, profile) don't query
+# `sessions` on every call.
+#   - per student: the latest session row and the last started_at (for the
+#     "one started session per Manila day" rule), loaded with 2 reads on
+#     first use
+#   - every write goes through record(), which updates the index and bumps
+#     the per-student "sessions-<sid>" stamp so other workers on the host
+#     reload (utils/stamps.py); HMH_SESSION_STATE_TTL bounds staleness
+#     across hosts
+#   - expiry: active sessions expire at started_at + minutes_allowed. The
+#     sweeper thread wakes at the next known expiry (or every
+#     HMH_SESSION_SWEEP seconds) and closes due sessions in one bulk
+#     UPDATE; the periodic full sweep also catches sessions no worker has
+#     indexed, and only one worker per host runs it per interval.
+#   - reads check expiry too, so a lagging sweeper never reports an expired
+#     session as active.
+
+import heapq
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from extensions import supabase_client
+from utils import stamps
+from utils.sb import sb_exec
+from utils.pg import pg_enabled, sql_exec
+from utils.time import mnl_day_bounds_utc
+
+STATE_TTL = float(os.getenv("HMH_SESSION_STATE_TTL", "300"))
+STATE_MAX = int(os.getenv("HMH_SESSION_STATE_MAX", "5000"))
+SWEEP_EVERY = float(os.getenv("HMH_SESSION_SWEEP", "60"))
+
+COLUMNS = "id, status, minutes_allowed, mood, language, started_at, ended_at"
+SWEEP_STAMP = "session-sweep"
+
+
+def stamp_name(sid) -> str:
+    return f"sessions-{sid}"
+
+
+def _parse(ts):
+    if not ts:
+        return None
+    try:
+        d = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return d if d.tzinfo else d.replace(tzinfo=timezone.utc)
+
+
+def expires_at(row):
+    """UTC expiry of an active session row, or None."""
+    start = _parse((row or {}).get("started_at"))
+    if start is None:
+        return None
+    try:
+        return start + timedelta(minutes=float(row.get("minutes_allowed") or 0))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_due(row) -> bool:
+    """Active session that has run past its minutes (or already has ended_at)."""
+    if not row or (row.get("status") or "").lower() != "active":
+        return False
+    if row.get("ended_at"):
+        return True
+    exp = expires_at(row)
+    return bool(exp and datetime.now(timezone.utc) >= exp)
+
+
+class SessionState:
+    def __init__(self, stamp, latest, last_started_at):
+        self.stamp = stamp
+        self.loaded_at = time.monotonic()
+        self.latest = latest                    # newest sessions row (or None)
+        self.last_started_at = last_started_at  # newest non-null started_at
+
+    @property
+    def current(self):
+        """The active/pending session, if the newest row is one."""
+        st = ((self.latest or {}).get("status") or "").lower()
+        return self.latest if st in ("active", "pending") else None
+
+    def started_today(self) -> bool:
+        started = _parse(self.last_started_at)
+        if started is None:
+            return False
+        start_utc, end_utc = mnl_day_bounds_utc()
+        return _parse(start_utc) <= started < _parse(end_utc)
+
+
+class SessionIndex:
+    def __init__(self):
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self._due = []          # heap of (expiry_ts, sid, session_id)
+        self._wake = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    # ---- index ----
+    def _load(self, sid):
+        sid = str(sid)
+        sb = supabase_client.client
+        stamp = stamps.read(stamp_name(sid))
+        latest, err = sb_exec(
+            sb.table("sessions").select(COLUMNS)
+              .eq("students_id", sid)
+              .order("id", desc=True).limit(1)
+        )
+        if err:
+            return None, err
+        started, err = sb_exec(
+            sb.table("sessions").select("started_at")
+              .eq("students_id", sid)
+              .not_.is_("started_at", "null")
+              .order("started_at", desc=True).limit(1)
+        )
+        if err:
+            return None, err
+        state = SessionState(stamp, latest[0] if latest else None,
+                             started[0]["started_at"] if started else None)
+        self._put(sid, state)
+        return state, None
+
+    def _put(self, sid, state):
+        with self._lock:
+            self._states[sid] = state
+            self._states.move_to_end(sid)
+            while len(self._states) > STATE_MAX:
+                self._states.popitem(last=False)
+        self._schedule(sid, state.current)
+
+    def state(self, sid, expire=True):
+        """(SessionState, err); with expire=True any due expiry is applied first."""
+        sid = str(sid)
+        self.start()   # no-op once running; restarts the sweeper in a forked worker
+        with self._lock:
+            state = self._states.get(sid)
+        if (state is None
+                or time.monotonic() - state.loaded_at > STATE_TTL
+                or stamps.read(stamp_name(sid)) != state.stamp):
+            state, err = self._load(sid)
+            if err:
+                return None, err
+        cur = state.current
+        if expire and is_due(cur):
+            self.close([cur["id"]])
+            with self._lock:
+                state = self._states.get(sid) or state
+            if (state.current or {}).get("id") == cur["id"]:
+                # nothing closed here (someone else did, or the update failed): re-read
+                state, err = self._load(sid)
+                if err:
+                    return None, err
+        return state, None
+
+    def record(self, sid, row):
+        """Call after writing a sessions row (insert/activate/end) with its new values."""
+        sid = str(sid)
+        with self._lock:
+            state = self._states.get(sid)
+        if state is None:   # not indexed here: just tell other workers to reload
+            stamps.bump(stamp_name(sid))
+            return None
+        latest = state.latest
+        if latest is None or int(row.get("id") or 0) >= int(latest.get("id") or 0):
+            latest = {**(latest if latest and latest.get("id") == row.get("id") else {}), **row}
+        last_started = state.last_started_at
+        if row.get("started_at") and (not last_started or _parse(row["started_at"]) > _parse(last_started)):
+            last_started = row["started_at"]
+        new = SessionState(stamps.bump(stamp_name(sid)), latest, last_started)
+        self._put(sid, new)
+        return new
+
+    # ---- expiry ----
+    def _schedule(self, sid, cur):
+        if not cur or (cur.get("status") or "").lower() != "active":
+            return
+        exp = expires_at(cur)
+        if exp is None:
+            return
+        with self._lock:
+            heapq.heappush(self._due, (exp.timestamp(), str(sid), cur["id"]))
+        self.start()
+        self._wake.set()
+
+    def close(self, session_ids):
+        """End these sessions (if still active) in one UPDATE; refresh the index."""
+        if not session_ids:
+            return
+        now_iso = datetime.now(timezone.utc).isoformat()
+        rows, err = sb_exec(
+            supabase_client.client.table("sessions")
+              .update({"status": "ended", "ended_at": now_iso})
+              .in_("id", list(session_ids))
+              .eq("status", "active")
+        )
+        if err:
+            print("[SESSIONS] close failed:", err)
+            return
+        self._closed(rows or [])
+
+    def _closed(self, rows):
+        for r in rows:
+            sid = r.get("students_id")
+            if sid is None:
+                continue
+            self.record(str(sid), {k: r.get(k) for k in ("id", "status", "ended_at") if k in r})
+        if rows:
+            print(f"[SESSIONS] expired {len(rows)} session(s)")
+
+    def _sweep_all(self):
+        """Close every expired active session (not just indexed ones)."""
+        if pg_enabled():
+            rows, err = sql_exec(
+                """
+                update sessions
+                   set status = 'ended', ended_at = now()
+                 where status = 'active'
+                   and started_at is not null
+                   and started_at + make_interval(mins => coalesce(minutes_allowed, 0)::int) <= now()
+                returning id, students_id, status, ended_at
+                """
+            )
+            if err:
+                print("[SESSIONS] sweep failed:", err)
+                return
+            self._closed([{**r, "ended_at": str(r.get("ended_at"))} for r in rows or []])
+            return
+        rows, err = sb_exec(
+            supabase_client.client.table("sessions")
+              .select("id, started_at, minutes_allowed")
+              .eq("status", "active")
+        )
+        if err:
+            print("[SESSIONS] sweep failed:", err)
+            return
+        now = datetime.now(timezone.utc)
+        due = []
+        for r in rows or []:
+            exp = expires_at(r)
+            if exp is not None and exp <= now:
+                due.append(r["id"])
+        self.close(due)
+
+    def _sweep_lease(self) -> bool:
+        """One full sweep per interval per host: the first worker to bump wins."""
+        last = stamps.read(SWEEP_STAMP)
+        try:
+            last_ns = int(last.split("-")[0]) if last else 0
+        except ValueError:
+            last_ns = 0
+        if time.time_ns() - last_ns < SWEEP_EVERY * 0.9 * 1e9:
+            return False
+        stamps.bump(SWEEP_STAMP)
+        return True
+
+    # ---- sweeper thread ----
+    def start(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="hmh-sessions", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        next_full = time.time()
+        while True:
+            self._wake.clear()
+            now = time.time()
+            due = []
+            with self._lock:
+                while self._due and self._due[0][0] <= now:
+                    due.append(heapq.heappop(self._due)[2])
+                nxt = self._due[0][0] if self._due else None
+            try:
+                if due:
+                    self.close(due)
+                if now >= next_full:
+                    next_full = now + SWEEP_EVERY
+                    if self._sweep_lease():
+                        self._sweep_all()
+            except Exception as e:
+                print("[SESSIONS] sweeper error:", e)
+            wait = next_full - time.time()
+            if nxt is not None:
+                wait = min(wait, nxt - time.time())
+            self._wake.wait(max(0.5, wait))
+
+
+session_index = SessionIndex()
+
+
+def init_app(app):
+    session_index.start()
@@ -1,34 +1,22 @@
 #/student/session_utils.py
 # Utilities for checking and updating student session status.
+# Reads come from the session index (student/session_state.py, no query
+# when the index is warm); expired sessions are also closed in bulk by its
+# background sweeper.
 
-from datetime import datetime, timezone, timedelta
-from utils.sb import sb_exec
-from extensions import supabase_client
+from student.session_state import session_index, is_due
 
 def check_session_expired(student_id):
-    sb = supabase_client.client
-    rows, _ = sb_exec(
-        sb.table("sessions")
-          .select("id,started_at,minutes_allowed,ended_at")
-          .eq("students_id", student_id)
-          .eq("status", "active")
-          .order("id", desc=True).limit(1)
-    )
-    if not rows:
+    state, err = session_index.state(student_id, expire=False)
+    if err or state is None:
         return None, False
 
-    sess = rows[0]
-    if sess.get("ended_at"):
-        return sess, True
+    sess = state.current
+    if not sess or (sess.get("status") or "").lower() != "active":
+        return None, False
 
-    start = datetime.fromisoformat(sess["started_at"].replace("Z","+00:00"))
-    expiry = start + timedelta(minutes=sess["minutes_allowed"])
-    if datetime.now(timezone.utc) >= expiry:
-        _, _ = sb_exec(
-            sb.table("sessions")
-              .update({"ended_at": datetime.now(timezone.utc).isoformat(), "status": "ended"})
-              .eq("id", sess["id"])
-        )
+    if is_due(sess):
+        session_index.close([sess["id"]])
         return sess, True
 
     return sess, False
@@ -2,6 +2,9 @@ from flask import Blueprint, request, jsonify, make_response
 from auth.jwt_utils import require_teacher
 from extensions import supabase_client
 from content.transform import pick_branch, public_url
+from content.curriculum import curriculum
+from content.bundles import bundles
+from utils.http_cache import conditional, curriculum_parts
 import time
 import re
 import secrets
@@ -9,6 +12,36 @@ from datetime import datetime, timezone
 
 manage_lessons_bp = Blueprint("manage_lessons", __name__)
 
+# endpoints that write nothing the curriculum store holds
+_NO_CONTENT_WRITE = {"translate_payload", "upload_temp_media", "cleanup_temp_uploads"}
+
+
+@manage_lessons_bp.after_request
+def _invalidate_curriculum(response):
+    """Write-through invalidation: any successful content write drops the curriculum cache."""
+    if (
+        request.method in ("POST", "PUT", "PATCH", "DELETE")
+        and response.status_code < 400
+        and (request.endpoint or "").rsplit(".", 1)[-1] not in _NO_CONTENT_WRITE
+    ):
+        curriculum.invalidate()
+        _publish_bundles()
+    return response
+
+
+def _publish_bundles():
+    """Prebuild the edited lesson's student bundles (others keep their bytes)."""
+    args = request.view_args or {}
+    try:
+        lesson_id = args.get("lesson_id")
+        if lesson_id is None and args.get("activity_id") is not None:
+            act = curriculum.find_activity(args["activity_id"])
+            lesson_id = act.get("lesson_id") if act else None
+        if lesson_id is not None:
+            bundles.publish(lesson_id)
+    except Exception as e:
+        print("[BUNDLES] publish failed:", e)
+
 ALLOWED_TYPES = {"mcq", "asr", "emotion", "recognition", "listening", "tts"}
 ALLOWED_LAYOUTS = {"sound", "image", "sequence", "choose", "asr", "emotion"}
 ALLOWED_BUCKETS = {"hmh-images", "hmh-audio"}
@@ -386,6 +419,7 @@ def _extract_media_paths_from_activity_row(row: dict) -> list[str]:
 # -------------------------
 @manage_lessons_bp.get("/chapters")
 @require_teacher
+@conditional(lambda **kw: curriculum_parts())
 def get_chapters():
     res = _sb().table("chapters").select("*").order("sort_order").execute()
     chapters = res.data or []
@@ -395,6 +429,7 @@ def get_chapters():
 
 @manage_lessons_bp.get("/chapters/<int:chapter_id>/lessons")
 @require_teacher
+@conditional(lambda **kw: curriculum_parts())
 def get_lessons(chapter_id: int):
     res = (
         _sb()
@@ -411,6 +446,7 @@ def get_lessons(chapter_id: int):
 
 @manage_lessons_bp.get("/lessons/<int:lesson_id>/activities")
 @require_teacher
+@conditional(lambda **kw: curriculum_parts())
 def get_activities_for_lesson(lesson_id: int):
     """
      only active activities
@@ -12,7 +12,10 @@ from collections import defaultdict
 
 from auth.jwt_utils import require_teacher
 from extensions import supabase_client
-from utils.sb import sb_exec
+from utils.sb import sb_exec, sb_safe_select, sb_try_rows, sb_gather, sb_stream
+from utils.pg import pg_enabled, sql_stream
+from utils.loader import get_loader
+from utils.http_cache import touch_student
 
 
 
@@ -56,23 +59,6 @@ def greet_ph():
 
 
 
-# Safe select helper
-def sb_safe_select(q):
-    rows, err = sb_exec(q)
-    if err:
-        print("Supabase select error:", err)
-        return []
-    return rows or []
-
-
-
-
-# Retry wrapper for transient hiccups (net/RLS/signed URLs)
-import time
-
-
-
-
 def make_initials(first, last):
     f = (first or "").strip()[:1].upper()
     l = (last or "").strip()[:1].upper()
@@ -81,35 +67,6 @@ def make_initials(first, last):
 
 
 
-def sb_try_rows(name, fn, retries=2, delay=0.2):
-    """
-    Call sb_exec via fn() with small retries so brief failures
-    don't collapse sections of the dashboard to empty arrays/zeros.
-    Usage: rows = sb_try_rows("students", lambda: sb_exec(sb.table("students").select("id")))
-    """
-    last_err = None
-    for attempt in range(retries + 1):
-        try:
-            rows, err = fn()
-            if err:
-                last_err = err
-                print(f"[WARN] {name} attempt {attempt+1} failed:", err)
-            else:
-                return rows or []
-        except Exception as ex:
-            last_err = ex
-            print(f"[EXCEPTION] {name} attempt {attempt+1}:", ex)
-        time.sleep(delay)
-    print(f"[ERROR] {name} giving up after {retries+1} attempts:", last_err)
-    return []
-
-
-
-
-
-
-
-
 # ======================= Student payload sanitizers =======================
 ALLOWED_STUDENT_FIELDS = [
     # Required
@@ -347,63 +304,56 @@ def overview():
 
 
 
-    def safe_exec(name, fn):
-        try:
-            rows, err = fn()
-            if err:
-                print(f"[WARN] {name} failed:", err)
-                return []
-            return rows or []
-        except Exception as ex:
-            print(f"[EXCEPTION] {name}:", ex)
-            return []
-
-
-
+    teacher_id = request.user["sub"]
+    since_utc = (now_ph() - timedelta(days=60)).astimezone(timezone.utc).isoformat()
+    day_start = today_start_utc()
 
-    # --- Teacher (minimal columns); do not early-return on failure ---
-    teacher = None
-    try:
-        teacher, terr = sb_exec(
+    # --- Independent queries run concurrently (latency ≈ slowest one) ---
+    res = sb_gather({
+        "teacher": lambda: sb_exec(
             sb.table("teachers")
-            .select("teachers_id,first_name,last_name,login_id")
-            .eq("teachers_id", request.user["sub"])
+            .select("teachers_id,first_name,last_name,login_id,photo_url")
+            .eq("teachers_id", teacher_id)
             .maybe_single()
-        )
-        if terr:
-            print("Teacher fetch failed:", terr)
-            teacher = None
-    except Exception as ex:
-        print("Teacher fetch exception:", ex)
-        teacher = None
+        ),
+        # one Active-students read feeds both the count and the diagnosis chart
+        "students": lambda: sb_exec(
+            sb.table("students")
+              .select("students_id,diagnosis")
+              .eq("record_status", "Active")
+        ),
+        "sessions": lambda: sb_exec(sb.table("sessions").select("id").gte("started_at", day_start)),
+        "attempts": lambda: sb_exec(
+            sb.table("activity_attempts")
+              .select("score, created_at")
+              .gte("created_at", since_utc)
+        ),
+        "recent sessions": lambda: sb_exec(
+            sb.table("sessions")
+            .select("students:students_id(first_name,last_name,photo_url,login_id),started_at")
+            .gte("started_at", day_start)
+            .order("started_at", desc=True)
+            .limit(10)
+        ),
+        "last_session_per_student": lambda: sb_exec(sb.rpc("last_session_per_student", {})),
+    }, retries=2)
 
 
 
 
-    # Try to add teacher photo best-effort
-    # Try to add teacher photo best-effort
+    # --- Teacher (minimal columns); do not early-return on failure ---
+    teacher = res["teacher"] or None
     if teacher:
         # ⭐ ADD INITIALS FOR TEACHER DASHBOARD
         teacher["initials"] = make_initials(
             teacher.get("first_name"),
             teacher.get("last_name")
         )
-
-
-        try:
-            t_photo_row, tperr = sb_exec(
-                sb.table("teachers")
-                .select("photo_url")
-                .eq("teachers_id", teacher["teachers_id"])
-                .maybe_single()
-            )
-            if not tperr and t_photo_row and t_photo_row.get("photo_url"):
-                teacher["photo_url"] = t_photo_row["photo_url"]
-                _inject_resolved_photo(teacher, bucket="hmh-images")
-
-
-        except Exception as ex:
-            print("Teacher photo fetch exception:", ex)
+        # photo best-effort
+        if teacher.get("photo_url"):
+            _inject_resolved_photo(teacher, bucket="hmh-images")
+        else:
+            teacher.pop("photo_url", None)
 
 
 
@@ -411,19 +361,8 @@ def overview():
 
 
     # --- Basic counts ---
-    students_rows = sb_try_rows(
-    "students",
-    lambda: sb_exec(
-        sb.table("students")
-          .select("students_id")
-          .eq("record_status", "Active")
-    )
-)
-
-    sessions_rows = sb_try_rows(
-        "sessions",
-        lambda: sb_exec(sb.table("sessions").select("id").gte("started_at", today_start_utc()))
-    )
+    students_rows = res["students"]
+    sessions_rows = res["sessions"]
     students_count = len(students_rows)
     sessions_today = len(sessions_rows)
 
@@ -485,14 +424,7 @@ def overview():
 
 
     # ---- ALWAYS use activity_attempts (ignore the broken RPC) ----
-    since_utc = (now_ph() - timedelta(days=60)).astimezone(timezone.utc).isoformat()
-
-
-    rows = sb_safe_select(
-        sb.table("activity_attempts")
-          .select("score, created_at")
-          .gte("created_at", since_utc)
-    )
+    rows = res["attempts"]
 
 
     shaped = [
@@ -515,14 +447,7 @@ def overview():
 
 
     # --- Diagnosis distribution ---
-    diag_rows = sb_try_rows(
-    "students diagnosis",
-    lambda: sb_exec(
-        sb.table("students")
-          .select("diagnosis")
-          .eq("record_status", "Active")
-    )
-)
+    diag_rows = students_rows
 
     diag_counts = {"ASD": 0, "DS": 0, "GDD": 0, "SPEECH DELAY": 0, "ADHD": 0, "Unspecified": 0}
     for r in diag_rows:
@@ -538,16 +463,7 @@ def overview():
 
 
     # --- Recently active students ---
-    recent_active = sb_try_rows(
-        "recent sessions",
-        lambda: sb_exec(
-            sb.table("sessions")
-            .select("students:students_id(first_name,last_name,photo_url,login_id),started_at")
-            .gte("started_at", today_start_utc())
-            .order("started_at", desc=True)
-            .limit(10)
-        )
-    )
+    recent_active = res["recent sessions"]
     for r in recent_active:
         st = r.get("students")
         if isinstance(st, dict):
@@ -560,7 +476,7 @@ def overview():
     days = int(request.args.get("inactive_days", "7"))
     cutoff = now_ph() - timedelta(days=days)
     cutoff_utc = cutoff.astimezone(timezone.utc)
-    last_rows = sb_try_rows("last_session_per_student", lambda: sb_exec(sb.rpc("last_session_per_student", {})))
+    last_rows = res["last_session_per_student"]
 
 
 
@@ -679,30 +595,22 @@ def analytics():
 
     try:
         # --- raw reads (SELECT-only; no schema changes) ---
-        emo_rows = sb_safe_select(
-            sb.table("emotion_metrics")
-              .select("expected_emotion, detected_emotion, created_at")
-        )
-
-
-
+        # small lookup tables first; emotion_metrics and activity_attempts are
+        # streamed below and folded in a single pass each: through a
+        # server-side cursor when DATABASE_URL is set (sql_stream), else
+        # page by page over PostgREST (sb_stream)
+        def _scan(query, params, sb_query, name):
+            if pg_enabled():
+                return sql_stream(query, params)
+            return sb_stream(sb_query, name=name)
 
         since_sessions = (now_ph() - timedelta(days=DAYS_FOR_SESSIONS)).astimezone(timezone.utc).isoformat()
-        sess_rows = sb_safe_select(
-            sb.table("sessions")
-              .select("students_id, mood, started_at, ended_at")
-              .gte("started_at", since_sessions)
-        )
-
-
-
-
-        since_attempts = (now_ph() - timedelta(days=DAYS_FOR_ATTEMPTS)).astimezone(timezone.utc).isoformat()
-        att_rows = sb_safe_select(
-            sb.table("activity_attempts")
-              .select("students_id, activities_id, score, created_at")
-              .gte("created_at", since_attempts)
-        )
+        sess_rows = list(sb_stream(
+            lambda: sb.table("sessions")
+              .select("id, students_id, mood, started_at, ended_at")
+              .gte("started_at", since_sessions),
+            name="analytics sessions",
+        ))
 
 
 
@@ -742,15 +650,35 @@ def analytics():
 
 
 
-        # ============ 1) Emotion Recognition Distribution ============
+        def _ph_week(dt):
+            return dt.astimezone(timezone(timedelta(hours=8))).strftime("%Y-%V")  # ISO week
+
+
+
+
+        # ============ 1) Emotion Recognition Distribution + weekly match (one pass) ============
         emo_stats = {}
-        for r in emo_rows:
+        emo_week = {}
+        for r in _scan(
+            "select id, expected_emotion, detected_emotion, created_at from emotion_metrics",
+            None,
+            lambda: sb.table("emotion_metrics")
+              .select("id, expected_emotion, detected_emotion, created_at"),
+            "analytics emotion_metrics",
+        ):
             exp = (r.get("expected_emotion") or "Unspecified").strip() or "Unspecified"
             det = (r.get("detected_emotion") or "").strip()
             b = emo_stats.setdefault(exp, {"ok": 0, "n": 0})
             b["n"] += 1
             if det and det.lower() == exp.lower():
                 b["ok"] += 1
+
+            # emotion from emotion_metrics as % correct per week
+            dt = _parse_dt(r.get("created_at"))
+            if dt:
+                ok = int(det.lower() == (r.get("expected_emotion") or "").strip().lower())
+                agg = emo_week.setdefault(_ph_week(dt), {"ok": 0, "n": 0})
+                agg["ok"] += ok; agg["n"] += 1
         emotion_distribution = [
             {"emotion": k, "avg_match": round(100.0 * v["ok"] / max(v["n"], 1), 1)}
             for k, v in sorted(emo_stats.items())
@@ -792,40 +720,68 @@ def analytics():
 
 
 
-        # ============ 3) Performance Trends (two series: speech vs emotion) ============
+        # sessions per student for the mood lookup
+        sess_by_student = {}
+        for s in sess_rows:
+            sid = str(s.get("students_id") or "")
+            st = _parse_dt(s.get("started_at"))
+            en = _parse_dt(s.get("ended_at")) or (st + timedelta(hours=2) if st else None)
+            if not sid or not st or not en:
+                continue
+            sess_by_student.setdefault(sid, []).append({
+                "start": st, "end": en,
+                "mood": (s.get("mood") or "Unspecified").strip() or "Unspecified"
+            })
+        for arr in sess_by_student.values():
+            arr.sort(key=lambda x: x["start"])
+
+
+
+
+        # ============ 3-5) Speech trend, mood vs performance, lesson difficulty (one pass) ============
         # SPEECH comes from activity_attempts where activities.type == 'asr' (or 'speech' if ever used)
+        since_attempts = (now_ph() - timedelta(days=DAYS_FOR_ATTEMPTS)).astimezone(timezone.utc).isoformat()
         speech_week = {}
-        for a in att_rows:
+        mood_sum = {}
+        lesson_agg = {}
+        for a in _scan(
+            "select id, students_id, activities_id, score, created_at"
+            "  from activity_attempts where created_at >= %s",
+            (since_attempts,),
+            lambda: sb.table("activity_attempts")
+              .select("id, students_id, activities_id, score, created_at")
+              .gte("created_at", since_attempts),
+            "analytics activity_attempts",
+        ):
             sc = a.get("score")
             if sc is None:
                 continue
-            act = act_by_id.get(int(a.get("activities_id") or -1))
-            # 👇 THIS is the line you were looking for
-            if not act or (act.get("type") or "").lower() not in ("asr", "speech"):
-                continue
-            dt = _parse_dt(a.get("created_at"))
-            if not dt:
-                continue
-            ph = dt.astimezone(timezone(timedelta(hours=8)))
-            key = ph.strftime("%Y-%V")  # ISO week
-            agg = speech_week.setdefault(key, {"sum": 0.0, "n": 0})
-            agg["sum"] += float(sc); agg["n"] += 1
-
+            aid = a.get("activities_id")
+            act = act_by_id.get(int(aid)) if aid is not None else None
+            ts = _parse_dt(a.get("created_at"))
 
+            # speech weekly average
+            if act and ts and (act.get("type") or "").lower() in ("asr", "speech"):
+                agg = speech_week.setdefault(_ph_week(ts), {"sum": 0.0, "n": 0})
+                agg["sum"] += float(sc); agg["n"] += 1
 
+            # mood of the session the attempt fell in
+            sid = str(a.get("students_id") or "")
+            if ts and sid in sess_by_student:
+                mood = None
+                for s in sess_by_student[sid]:
+                    if s["start"] <= ts <= s["end"]:
+                        mood = s["mood"]; break
+                if mood:
+                    agg = mood_sum.setdefault(mood, {"sum": 0.0, "n": 0})
+                    agg["sum"] += float(sc); agg["n"] += 1
 
-        # emotion from emotion_metrics as % correct per week
-        emo_week = {}
-        for r in emo_rows:
-            dt = _parse_dt(r.get("created_at"))
-            if not dt:
-                continue
-            ph = dt.astimezone(timezone(timedelta(hours=8)))
-            key = ph.strftime("%Y-%V")
-            ok = int((r.get("detected_emotion") or "").strip().lower()
-                     == (r.get("expected_emotion") or "").strip().lower())
-            agg = emo_week.setdefault(key, {"ok": 0, "n": 0})
-            agg["ok"] += ok; agg["n"] += 1
+            # per-lesson accuracy
+            lid = act.get("lesson_id") if act else None
+            if lid is not None:
+                title = lesson_title.get(int(lid), f"Lesson {lid}")
+                agg = lesson_agg.setdefault(title, {"sum": 0.0, "n": 0})
+                agg["sum"] += float(sc); agg["n"] += 1
 
 
 
@@ -844,39 +800,6 @@ def analytics():
 
 
 
-        # ============ 4) Mood vs Performance ============
-        sess_by_student = {}
-        for s in sess_rows:
-            sid = str(s.get("students_id") or "")
-            st = _parse_dt(s.get("started_at"))
-            en = _parse_dt(s.get("ended_at")) or (st + timedelta(hours=2) if st else None)
-            if not sid or not st or not en:
-                continue
-            sess_by_student.setdefault(sid, []).append({
-                "start": st, "end": en,
-                "mood": (s.get("mood") or "Unspecified").strip() or "Unspecified"
-            })
-        for arr in sess_by_student.values():
-            arr.sort(key=lambda x: x["start"])
-
-
-
-
-        mood_sum = {}
-        for a in att_rows:
-            sid = str(a.get("students_id") or "")
-            sc = a.get("score")
-            ts = _parse_dt(a.get("created_at"))
-            if sc is None or not ts or sid not in sess_by_student:
-                continue
-            mood = None
-            for s in sess_by_student[sid]:
-                if s["start"] <= ts <= s["end"]:
-                    mood = s["mood"]; break
-            if not mood:
-                continue
-            agg = mood_sum.setdefault(mood, {"sum": 0.0, "n": 0})
-            agg["sum"] += float(sc); agg["n"] += 1
         mood_performance = [
             {"mood": k, "avg_accuracy": round(v["sum"]/max(v["n"],1), 1)}
             for k, v in sorted(mood_sum.items())
@@ -885,21 +808,6 @@ def analytics():
 
 
 
-        # ============ 5) Lesson Difficulty ============
-        lesson_agg = {}
-        for a in att_rows:
-            sc = a.get("score"); aid = a.get("activities_id")
-            if sc is None or aid is None:
-                continue
-            act = act_by_id.get(int(aid))
-            if not act:
-                continue
-            lid = act.get("lesson_id")
-            if lid is None:
-                continue
-            title = lesson_title.get(int(lid), f"Lesson {lid}")
-            agg = lesson_agg.setdefault(title, {"sum": 0.0, "n": 0})
-            agg["sum"] += float(sc); agg["n"] += 1
         lesson_difficulty = [
             {"lesson": k, "avg_accuracy": round(v["sum"]/max(v["n"],1), 1)}
             for k, v in lesson_agg.items()
@@ -1358,6 +1266,7 @@ def update_student(students_id):
         print("❗ update_student failed.\n  students_id:", students_id, "\n  payload:", payload, "\n  error:", e2s)
         status = 403 if ("rls" in e2s.lower() or "permission" in e2s.lower()) else 500
         return jsonify({"error": e2s, "payload": payload}), status
+    touch_student(str(students_id))  # level/profile change: invalidate the student's cached views
 
 
 
@@ -1406,6 +1315,7 @@ def delete_student(students_id):
     if err:
         return jsonify({"error": str(err)}), 500
 
+    touch_student(str(students_id))
     return jsonify({"ok": True, "archived": True})
 
 
@@ -1781,15 +1691,10 @@ def student_overview(students_id):
         )
         current_lesson, current_chapter = None, None
         if prog:
-            lesson_id = prog[0]["lesson_id"]
-            lesson_row, _ = sb_exec(
-                sb.table("lessons").select("title_en, chapter_id").eq("id", lesson_id).maybe_single()
-            )
+            lesson_row = get_loader("lessons", columns="title_en, chapter_id").load(prog[0]["lesson_id"])
             if lesson_row:
                 current_lesson = lesson_row.get("title_en")
-                chap_row, _ = sb_exec(
-                    sb.table("chapters").select("title_en").eq("id", lesson_row.get("chapter_id")).maybe_single()
-                )
+                chap_row = get_loader("chapters", columns="title_en").load(lesson_row.get("chapter_id"))
                 if chap_row:
                     current_chapter = chap_row.get("title_en")
 
@@ -1881,28 +1786,22 @@ def student_activity_log(students_id):
             .order("updated_at", desc=True)
             .limit(300)
         )
-        for r in progress:
-            status = (r.get("status") or "").strip().lower()
-            if status != "completed":
-                continue
+        completed = [r for r in progress if (r.get("status") or "").strip().lower() == "completed"]
 
+        # one lessons query + one chapters query for the whole log
+        lessons = get_loader("lessons", columns="title_en, chapter_id")
+        chapters = get_loader("chapters", columns="title_en")
+        lesson_map = lessons.load_many(r.get("lesson_id") for r in completed if r.get("lesson_id") is not None)
+        chapters.queue(l.get("chapter_id") for l in lesson_map.values() if l)
+
+        for r in completed:
             lesson_id = r.get("lesson_id")
             title_en, chapter_title = None, None
             if lesson_id is not None:
-                lesson_row, _ = sb_exec(
-                    sb.table("lessons")
-                    .select("title_en, chapter_id")
-                    .eq("id", lesson_id)
-                    .maybe_single()
-                )
+                lesson_row = lessons.load(lesson_id)
                 if lesson_row:
                     title_en = lesson_row.get("title_en")
-                    chap_row, _ = sb_exec(
-                        sb.table("chapters")
-                        .select("title_en")
-                        .eq("id", lesson_row.get("chapter_id"))
-                        .maybe_single()
-                    )
+                    chap_row = chapters.load(lesson_row.get("chapter_id"))
                     if chap_row:
                         chapter_title = chap_row.get("title_en")
 
@@ -0,0 +1,114 @@
+# backend/utils/http_cache.py
+# Conditional GET (ETag / If-None-Match -> 304) for read endpoints whose
+# output only depends on versions we already track:
+#   - curriculum content: content.curriculum snapshot version + stamp
+#   - one student's progress/profile: a per-student stamp (utils/stamps.py)
+#     bumped by every write that changes what they see (attempt, lesson
+#     complete, profile edit, teacher level change)
+# The ETag is computed BEFORE the view runs, so a match skips all of the
+# view's queries. Responses are "private, no-cache": browsers keep them but
+# revalidate every time, and shared proxies never store them.
+# Stamps are per host, so a host that didn't see a write would keep
+# answering 304. The ETag also changes every HMH_ETAG_WINDOW seconds,
+# which bounds that staleness the same way the in-process caches' TTLs do.
+#
+#   @student_bp.get("/student-dashboard")
+#   @require_student
+#   @conditional(lambda **kw: student_parts(request.user_id))
+#   def student_dashboard(): ...
+
+import hashlib
+import os
+import time
+from functools import wraps
+
+from flask import request, make_response
+
+from utils import stamps
+
+CACHE_CONTROL = "private, no-cache"
+ETAG_WINDOW = float(os.getenv("HMH_ETAG_WINDOW", "300"))   # seconds; 0 = stamps only (single host)
+
+
+def student_stamp_name(sid) -> str:
+    return f"student-{sid}"
+
+
+def student_version(sid) -> str:
+    return stamps.read(student_stamp_name(sid))
+
+
+def touch_student(sid):
+    """Call after any write that changes a student's dashboard/profile/progress."""
+    if sid:
+        stamps.bump(student_stamp_name(sid))
+
+
+def curriculum_parts():
+    from content.curriculum import curriculum, STAMP_NAME
+    return (curriculum.snapshot().version, stamps.read(STAMP_NAME))
+
+
+def student_parts(sid):
+    return (sid, student_version(sid)) + curriculum_parts()
+
+
+def etag_for(*parts) -> str:
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def _matches(tag: str) -> bool:
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    for cand in header.split(","):
+        cand = cand.strip()
+        if cand.startswith("W/"):
+            cand = cand[2:]
+        if cand == "*" or cand == tag:
+            return True
+    return False
+
+
+def _window() -> int:
+    return int(time.time() // ETAG_WINDOW) if ETAG_WINDOW > 0 else 0
+
+
+def conditional(parts_fn):
+    """
+    parts_fn(**view_args) returns the versions the response depends on (or
+    None to skip caching). Path, query string, X-HMH-Lang and the current
+    time window are always mixed in.
+    """
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                parts = parts_fn(**kwargs)
+            except Exception as e:
+                print("[HTTP_CACHE] version lookup failed:", e)
+                parts = None
+            if parts is None:
+                return fn(*args, **kwargs)
+
+            tag = etag_for(
+                request.path,
+                request.query_string.decode("utf-8", "replace"),
+                request.headers.get("X-HMH-Lang", ""),
+                _window(),
+                *parts,
+            )
+            if _matches(tag):
+                resp = make_response("", 304)
+            else:
+                resp = make_response(fn(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.headers["ETag"] = tag
+            resp.headers["Cache-Control"] = CACHE_CONTROL
+            resp.vary.add("X-HMH-Lang")
+            resp.vary.add("Authorization")
+            return resp
+        return wrapper
+    return deco
@@ -0,0 +1,191 @@
+# backend/utils/idempotency.py
+# Idempotency keys for submission endpoints (attempt, ASR, emotion).
+# A client that retries after a dropped connection sends the same
+# Idempotency-Key header; the first response is stored for
+# HMH_IDEMPOTENCY_TTL seconds and replayed as-is, so scoring, inference and
+# inserts run once.
+#   - keys are scoped to (caller, endpoint, key): two students can't collide
+#   - a retry that arrives while the first request is still running waits
+#     for it (up to HMH_IDEMPOTENCY_WAIT seconds), then gets 409
+#   - 5xx responses are not stored: the retry runs for real
+#   - requests without the header behave exactly as before
+# Responses live in files under HMH_IDEMPOTENCY_DIR so every gunicorn worker
+# on the host sees them (a retry rarely lands on the same worker), with a
+# small in-process TTLCache in front.
+#
+#   @student_bp.post("/attempt")
+#   @require_student
+#   @idempotent
+#   def attempt(): ...
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from functools import wraps
+
+from flask import Response, jsonify, make_response, request
+
+from utils.cache import TTLCache
+
+HEADER = "Idempotency-Key"
+IDEM_DIR = os.getenv("HMH_IDEMPOTENCY_DIR") or os.path.join(tempfile.gettempdir(), "hmh-idempotency")
+IDEM_TTL = float(os.getenv("HMH_IDEMPOTENCY_TTL", "600"))    # seconds a response is replayable
+IDEM_WAIT = float(os.getenv("HMH_IDEMPOTENCY_WAIT", "30"))   # max wait on an in-flight twin (ASR can be slow)
+MAX_KEY_LEN = 128
+SWEEP_EVERY = 200   # stores between sweeps of expired files
+
+_memo = TTLCache(maxsize=2048, ttl=IDEM_TTL)
+_stores = 0
+
+
+def _path(digest: str, suffix: str) -> str:
+    return os.path.join(IDEM_DIR, f"{digest}.{suffix}")
+
+
+def _digest(key: str, endpoint=None) -> str:
+    caller = getattr(request, "user_id", None) or request.remote_addr or ""
+    return hashlib.sha1(f"{caller}|{endpoint or request.endpoint}|{key}".encode("utf-8")).hexdigest()
+
+
+def _load(digest: str):
+    rec = _memo.get(digest)
+    if rec is not None:
+        return rec
+    try:
+        with open(_path(digest, "json"), encoding="utf-8") as f:
+            rec = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - rec.get("at", 0) > IDEM_TTL:
+        return None
+    _memo.set(digest, rec)
+    return rec
+
+
+def _store(digest: str, resp: Response):
+    global _stores
+    rec = {
+        "at": time.time(),
+        "status": resp.status_code,
+        "mimetype": resp.mimetype,
+        "body": resp.get_data(as_text=True),
+    }
+    _memo.set(digest, rec)
+    try:
+        tmp = _path(digest, f"{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rec, f)
+        os.replace(tmp, _path(digest, "json"))
+    except OSError as e:
+        print("[IDEMPOTENCY] store failed:", e)
+    _stores += 1
+    if _stores % SWEEP_EVERY == 0:
+        _sweep()
+
+
+def _claim(digest: str) -> bool:
+    """True if this request owns the key (no twin in flight)."""
+    lock = _path(digest, "lock")
+    try:
+        os.makedirs(IDEM_DIR, exist_ok=True)
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(fd)
+        return True
+    except FileExistsError:
+        # a lock older than the wait window belongs to a request that died
+        try:
+            if time.time() - os.path.getmtime(lock) > IDEM_WAIT:
+                os.utime(lock)
+                return True
+        except OSError:
+            pass
+        return False
+    except OSError as e:
+        print("[IDEMPOTENCY] lock failed, running unguarded:", e)
+        return True
+
+
+def _release(digest: str):
+    try:
+        os.remove(_path(digest, "lock"))
+    except OSError:
+        pass
+
+
+def _sweep():
+    cutoff = time.time() - IDEM_TTL
+    try:
+        names = os.listdir(IDEM_DIR)
+    except OSError:
+        return
+    for name in names:
+        p = os.path.join(IDEM_DIR, name)
+        try:
+            if os.path.getmtime(p) < cutoff:
+                os.remove(p)
+        except OSError:
+            pass
+
+
+def stored_json(key: str, endpoint: str):
+    """
+    Parsed body of a successful response already stored for `key` on another
+    endpoint (same caller), else None. Lets the batch endpoint skip queued
+    items whose single submission did reach the server.
+    """
+    if not key or len(key) > MAX_KEY_LEN:
+        return None
+    rec = _load(_digest(key, endpoint))
+    if rec is None or rec.get("status", 500) >= 300:
+        return None
+    try:
+        return json.loads(rec["body"])
+    except (TypeError, ValueError):
+        return None
+
+
+def _replay(rec) -> Response:
+    resp = Response(rec["body"], status=rec["status"], mimetype=rec.get("mimetype") or "application/json")
+    resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+
+def idempotent(fn):
+    """Replay the stored response for a repeated Idempotency-Key (see module header)."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (request.headers.get(HEADER) or "").strip()
+        if not key:
+            return fn(*args, **kwargs)
+        if len(key) > MAX_KEY_LEN:
+            return jsonify({"error": f"{HEADER} too long"}), 400
+
+        digest = _digest(key)
+        rec = _load(digest)
+        if rec is not None:
+            return _replay(rec)
+
+        if not _claim(digest):
+            deadline = time.monotonic() + IDEM_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(0.25)
+                rec = _load(digest)
+                if rec is not None:
+                    return _replay(rec)
+                if not os.path.exists(_path(digest, "lock")):
+                    break   # twin failed (5xx) without storing: run it ourselves
+            else:
+                return jsonify({"error": "A request with this Idempotency-Key is still in progress"}), 409
+            if not _claim(digest):
+                return jsonify({"error": "A request with this Idempotency-Key is still in progress"}), 409
+
+        try:
+            resp = make_response(fn(*args, **kwargs))
+            if resp.status_code < 500 and not resp.is_streamed:
+                _store(digest, resp)
+            return resp
+        finally:
+            _release(digest)
+    return wrapper
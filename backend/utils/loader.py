@@ -0,0 +1,123 @@
+# backend/utils/loader.py
+# DataLoader-style batched lookups.
+# Call sites queue the keys they will need, then read them back; every flush
+# resolves all pending keys of a table with ONE in_() query and memoizes the
+# rows for the rest of the request (loaders live on flask.g), so loops over
+# lesson_progress etc. cost O(1) round trips instead of O(n).
+#
+#   lessons = get_loader("lessons", columns="id, title_en, chapter_id")
+#   lessons.queue(r["lesson_id"] for r in progress)
+#   row = lessons.load(lesson_id)      # first call flushes the whole queue
+
+import threading
+
+from flask import g, has_app_context
+
+from extensions import supabase_client
+from utils.sb import sb_exec
+
+IN_CHUNK = 300  # keep in_() URLs well under PostgREST/proxy limits
+
+
+def _norm(k):
+    return None if k is None else str(k)
+
+
+class BatchLoader:
+    """
+    Rows of `table` by `key`. With many=False each key maps to one row (or
+    None); with many=True to a list of rows (e.g. achievements by student).
+    """
+
+    def __init__(self, table, key="id", columns="*", many=False, sb=None):
+        self.table = table
+        self.key = key
+        self.many = many
+        cols = [c.strip() for c in columns.split(",")] if columns != "*" else ["*"]
+        if "*" not in cols and key not in cols:
+            cols.insert(0, key)
+        self.columns = ",".join(cols)
+        self._sb = sb
+        self._memo = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    @property
+    def sb(self):
+        return self._sb or supabase_client.client
+
+    def queue(self, keys):
+        """Remember keys to fetch on the next flush (already-known keys are skipped)."""
+        with self._lock:
+            for k in keys:
+                nk = _norm(k)
+                if nk is not None and nk not in self._memo:
+                    self._pending.add(nk)
+        return self
+
+    def flush(self):
+        with self._lock:
+            pending = sorted(self._pending)
+            self._pending.clear()
+        if not pending:
+            return
+        found = {}
+        for i in range(0, len(pending), IN_CHUNK):
+            chunk = pending[i:i + IN_CHUNK]
+            rows, err = sb_exec(
+                self.sb.table(self.table).select(self.columns).in_(self.key, chunk)
+            )
+            if err:
+                # leave these keys unresolved so a later load can retry
+                print(f"[LOADER] {self.table}.{self.key} batch failed:", err)
+                continue
+            for r in rows or []:
+                nk = _norm(r.get(self.key))
+                if self.many:
+                    found.setdefault(nk, []).append(r)
+                else:
+                    found[nk] = r
+            for nk in chunk:
+                found.setdefault(nk, [] if self.many else None)
+        with self._lock:
+            self._memo.update(found)
+
+    def load(self, k):
+        nk = _norm(k)
+        if nk is None:
+            return [] if self.many else None
+        if nk not in self._memo:
+            self.queue([k])
+            self.flush()
+        return self._memo.get(nk, [] if self.many else None)
+
+    def load_many(self, keys) -> dict:
+        keys = list(keys)
+        self.queue(keys)
+        self.flush()
+        return {k: self._memo.get(_norm(k), [] if self.many else None) for k in keys}
+
+    def prime(self, k, value):
+        """Seed/overwrite the memo, e.g. after inserting a row."""
+        with self._lock:
+            self._memo[_norm(k)] = value
+
+    def clear(self, k=None):
+        with self._lock:
+            if k is None:
+                self._memo.clear()
+            else:
+                self._memo.pop(_norm(k), None)
+
+
+def get_loader(table, key="id", columns="*", many=False, sb=None) -> BatchLoader:
+    """Request-scoped loader (shared per table/key/columns); a fresh one outside requests."""
+    if not has_app_context():
+        return BatchLoader(table, key, columns, many, sb)
+    loaders = getattr(g, "_hmh_loaders", None)
+    if loaders is None:
+        loaders = g._hmh_loaders = {}
+    ident = (table, key, columns, many)
+    if ident not in loaders:
+        loaders[ident] = BatchLoader(table, key, columns, many, sb)
+    return loaders[ident]
@@ -0,0 +1,83 @@
+# backend/utils/pg.py
+# Direct Postgres execution path (psycopg pool from extensions.pg_pool).
+# Same (rows, err) contract as sb_exec, but takes SQL + params, so hot read
+# paths can run one joined query instead of several PostgREST round trips.
+# Rows come back as dicts; repeated queries are prepared server-side once
+# they pass HMH_PG_PREPARE_THRESHOLD executions on a connection.
+# Point DATABASE_URL at a local Postgres to exercise it in development;
+# migrations/smoke.py checks this module against it.
+
+import re
+import time
+import uuid
+
+from extensions import pg_pool
+from utils.query_stats import record
+
+PG_TIMEOUT = 5.0  # seconds to wait for a free pooled connection
+_FROM_RE = re.compile(r"\b(?:from|into|update)\s+([a-zA-Z_][\w.]*)", re.IGNORECASE)
+
+
+def pg_enabled() -> bool:
+    return pg_pool.enabled
+
+
+def _describe_sql(query: str):
+    """(first table, statement verb) for utils.query_stats."""
+    m = _FROM_RE.search(query or "")
+    verb = (query or "").strip().split(None, 1)[0].lower() if (query or "").strip() else "?"
+    return (m.group(1) if m else "?"), verb
+
+
+def sql_exec(query: str, params=None):
+    """Run one statement. Returns (list_of_dict_rows, None) or (None, "Err: msg")."""
+    if not pg_pool.enabled:
+        return None, "RuntimeError: DATABASE_URL not configured"
+    t0 = time.perf_counter()
+    rows, err = None, None
+    try:
+        with pg_pool.connection(timeout=PG_TIMEOUT) as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                rows = cur.fetchall() if cur.description else []
+    except Exception as e:
+        err = f"{type(e).__name__}: {e}"
+    table, op = _describe_sql(query)
+    record(table, op, (time.perf_counter() - t0) * 1000.0, len(rows or []), err, source="pg")
+    return rows, err
+
+
+def sql_one(query: str, params=None):
+    """Like sql_exec but returns the first row (or None)."""
+    rows, err = sql_exec(query, params)
+    if err:
+        return None, err
+    return (rows[0] if rows else None), None
+
+
+def sql_stream(query: str, params=None, batch_size: int = 1000):
+    """
+    Yield dict rows through a server-side (named) cursor, batch_size rows per
+    network fetch, so large exports never materialize in memory. The pooled
+    connection is held until the generator is exhausted or closed. Errors
+    raise (like sb_stream); the whole scan is recorded as one query.
+    """
+    if not pg_pool.enabled:
+        raise RuntimeError("DATABASE_URL not configured")
+    t0 = time.perf_counter()
+    n, err = 0, None
+    try:
+        with pg_pool.connection(timeout=PG_TIMEOUT) as conn:
+            with conn.transaction():
+                with conn.cursor(name=f"hmh_{uuid.uuid4().hex[:12]}") as cur:
+                    cur.itersize = batch_size
+                    cur.execute(query, params)
+                    for row in cur:
+                        n += 1
+                        yield row
+    except Exception as e:
+        err = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        table, op = _describe_sql(query)
+        record(table, op, (time.perf_counter() - t0) * 1000.0, n, err, source="pg")
@@ -0,0 +1,178 @@
+# backend/utils/query_stats.py
+# Request-scoped query instrumentation.
+# sb_exec / sql_exec call record() for every round trip; the entries land in
+# a per-request list on flask.g (fan-out threads share it through the copied
+# context). after_request checks the per-endpoint query budget and, when
+# asked to, logs a one-line summary and flags repeated table/op pairs (likely
+# N+1 loops). Only the over-budget warning is logged by default.
+# Process-wide histograms are kept for /health/queries.
+#
+#   HMH_QUERY_LOG=1                 per-request summary lines (default off)
+#   HMH_QUERY_BUDGET=15             default max queries per request (0 = off)
+#   HMH_QUERY_BUDGETS=student.attempt=8,teacher.overview=10
+#   HMH_QUERY_SLOW_MS=500           log individual slow queries (default off)
+#   HMH_QUERY_STATS_ENDPOINT=1      expose GET /health/queries
+
+import os
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request, jsonify
+
+QUERY_LOG = os.getenv("HMH_QUERY_LOG", "0") == "1"
+DEFAULT_BUDGET = int(os.getenv("HMH_QUERY_BUDGET", "15"))
+SLOW_MS = float(os.getenv("HMH_QUERY_SLOW_MS", "0"))  # 0 = off
+STATS_ENDPOINT = os.getenv("HMH_QUERY_STATS_ENDPOINT", "0") == "1"
+REPEAT_WARN = int(os.getenv("HMH_QUERY_REPEAT_WARN", "5"))  # same table/op this often = N+1 smell
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def _parse_budgets(raw: str) -> dict:
+    out = {}
+    for part in (raw or "").split(","):
+        if "=" in part:
+            name, _, n = part.partition("=")
+            try:
+                out[name.strip()] = int(n)
+            except ValueError:
+                pass
+    return out
+
+
+BUDGETS = _parse_budgets(os.getenv("HMH_QUERY_BUDGETS", ""))
+
+
+def _bucket(value, bounds):
+    for b in bounds:
+        if value <= b:
+            return f"<={b}"
+    return f">{bounds[-1]}"
+
+
+class _Histograms:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tables = {}     # "table:op" -> {"n", "ms", "rows", "errors", "latency": Counter}
+        self.endpoints = {}  # endpoint -> {"requests", "queries", "ms", "over_budget", "per_request": Counter}
+
+    def add_query(self, table, op, ms, rows, err):
+        key = f"{table}:{op}"
+        with self._lock:
+            t = self.tables.setdefault(key, {"n": 0, "ms": 0.0, "rows": 0, "errors": 0, "latency": Counter()})
+            t["n"] += 1
+            t["ms"] += ms
+            t["rows"] += rows
+            t["errors"] += bool(err)
+            t["latency"][_bucket(ms, LATENCY_BUCKETS_MS)] += 1
+
+    def add_request(self, endpoint, n, ms, over_budget):
+        with self._lock:
+            e = self.endpoints.setdefault(
+                endpoint, {"requests": 0, "queries": 0, "ms": 0.0, "over_budget": 0, "per_request": Counter()}
+            )
+            e["requests"] += 1
+            e["queries"] += n
+            e["ms"] += ms
+            e["over_budget"] += over_budget
+            e["per_request"][_bucket(n, COUNT_BUCKETS)] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            tables = {
+                k: {
+                    "n": v["n"], "avg_ms": round(v["ms"] / v["n"], 1), "rows": v["rows"],
+                    "errors": v["errors"], "latency": dict(v["latency"]),
+                }
+                for k, v in self.tables.items()
+            }
+            endpoints = {
+                k: {
+                    "requests": v["requests"],
+                    "avg_queries": round(v["queries"] / v["requests"], 2),
+                    "avg_db_ms": round(v["ms"] / v["requests"], 1),
+                    "over_budget": v["over_budget"],
+                    "budget": budget_for(k),
+                    "queries_per_request": dict(v["per_request"]),
+                }
+                for k, v in self.endpoints.items()
+            }
+        return {"tables": tables, "endpoints": endpoints}
+
+
+histograms = _Histograms()
+
+
+def budget_for(endpoint: str) -> int:
+    return BUDGETS.get(endpoint or "", DEFAULT_BUDGET)
+
+
+def describe_builder(q):
+    """(table, op) of a supabase-py/postgrest builder, best effort."""
+    path = str(getattr(q, "path", "") or "")
+    method = str(getattr(q, "http_method", "") or "").upper()
+    name = path.rstrip("/").rsplit("/", 1)[-1] or "?"
+    if "/rpc/" in path:
+        return name, "rpc"
+    if method == "POST":
+        prefer = str((getattr(q, "headers", None) or {}).get("Prefer", ""))
+        return name, "upsert" if "resolution=" in prefer else "insert"
+    return name, {"GET": "select", "HEAD": "count", "PATCH": "update", "DELETE": "delete"}.get(method, method.lower() or "?")
+
+
+def record(table: str, op: str, ms: float, rows: int, err=None, source: str = "sb"):
+    histograms.add_query(table, op, ms, rows, err)
+    if SLOW_MS and ms >= SLOW_MS:
+        where = request.endpoint if has_request_context() else "-"
+        print(f"[QUERY] slow {source} {table}:{op} {ms:.0f}ms rows={rows} endpoint={where}")
+    if not has_request_context():
+        return
+    log = getattr(g, "_hmh_queries", None)
+    if log is not None:
+        log.append((table, op, ms, rows, bool(err)))  # list.append is atomic; fan-out threads share it
+
+
+def row_count(data) -> int:
+    if isinstance(data, list):
+        return len(data)
+    return 1 if data else 0
+
+
+def init_app(app):
+    @app.before_request
+    def _start_query_log():
+        g._hmh_queries = []
+        g._hmh_t0 = time.perf_counter()
+
+    @app.after_request
+    def _summarize_queries(response):
+        log = getattr(g, "_hmh_queries", None)
+        if log is None:
+            return response
+        endpoint = request.endpoint or request.path
+        n = len(log)
+        db_ms = sum(e[2] for e in log)
+        budget = budget_for(endpoint)
+        over = bool(budget) and n > budget
+        histograms.add_request(endpoint, n, db_ms, over)
+
+        if not (over or (n and QUERY_LOG)):
+            return response
+        per = Counter(f"{t}:{op}" for t, op, _, _, _ in log)
+        top = ", ".join(f"{k}x{c}" for k, c in per.most_common(4))
+        if QUERY_LOG:
+            total_ms = (time.perf_counter() - g._hmh_t0) * 1000.0
+            print(f"[QUERY] {request.method} {endpoint} queries={n} db={db_ms:.0f}ms total={total_ms:.0f}ms [{top}]")
+            repeats = [k for k, c in per.items() if c >= REPEAT_WARN]
+            if repeats:
+                print(f"[QUERY] ⚠️ {endpoint} repeats {', '.join(repeats)} (possible N+1)")
+        if over:
+            print(f"[QUERY] ⚠️ {endpoint} made {n} queries (budget {budget}) [{top}]")
+        return response
+
+    if STATS_ENDPOINT:
+        @app.get("/health/queries")
+        def _query_stats():
+            return jsonify(histograms.snapshot())
@@ -1,7 +1,19 @@
 # backend/utils/sb.py
 # this file is for Supabase utility functions
 
-def sb_exec(q):
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextvars import copy_context
+
+from utils.query_stats import record, describe_builder, row_count
+
+FANOUT_WORKERS = int(os.getenv("HMH_SB_FANOUT_WORKERS", "8"))
+FANOUT_TIMEOUT = float(os.getenv("HMH_SB_FANOUT_TIMEOUT", "8"))
+
+
+def _sb_result(q):
     try:
         res = q.execute()
     except Exception as e:
@@ -11,3 +23,163 @@ def sb_exec(q):
     if isinstance(res, dict):
         return res.get("data"), res.get("error")
     return res, None
+
+
+def sb_exec(q):
+    """Execute a builder -> (data, err); every call is recorded in utils.query_stats."""
+    t0 = time.perf_counter()
+    data, err = _sb_result(q)
+    table, op = describe_builder(q)
+    record(table, op, (time.perf_counter() - t0) * 1000.0, row_count(data), err)
+    return data, err
+
+
+# Safe select helper
+def sb_safe_select(q):
+    rows, err = sb_exec(q)
+    if err:
+        print("Supabase select error:", err)
+        return []
+    return rows or []
+
+
+def sb_try_rows(name, fn, retries=2, delay=0.2):
+    """
+    Call sb_exec via fn() with small retries so brief failures
+    don't collapse sections of the dashboard to empty arrays/zeros.
+    Usage: rows = sb_try_rows("students", lambda: sb_exec(sb.table("students").select("id")))
+    """
+    last_err = None
+    for attempt in range(retries + 1):
+        try:
+            rows, err = fn()
+            if err:
+                last_err = err
+                print(f"[WARN] {name} attempt {attempt+1} failed:", err)
+            else:
+                return rows or []
+        except Exception as ex:
+            last_err = ex
+            print(f"[EXCEPTION] {name} attempt {attempt+1}:", ex)
+        if attempt < retries:
+            time.sleep(delay)
+    print(f"[ERROR] {name} giving up after {retries+1} attempts:", last_err)
+    return []
+
+
+# ---------------------------------------------------------------------
+# Parallel fan-out
+# ---------------------------------------------------------------------
+_fanout_pool = None
+_fanout_lock = threading.Lock()
+
+
+def _pool():
+    global _fanout_pool
+    if _fanout_pool is None:
+        with _fanout_lock:
+            if _fanout_pool is None:
+                _fanout_pool = ThreadPoolExecutor(
+                    max_workers=FANOUT_WORKERS, thread_name_prefix="sb-fanout"
+                )
+    return _fanout_pool
+
+
+def sb_gather(calls: dict, timeout: float = FANOUT_TIMEOUT, retries: int = 0) -> dict:
+    """
+    Run independent fn() -> (rows, err) calls concurrently on a shared,
+    bounded thread pool. Returns {name: rows}; a call that fails (after
+    `retries`) or misses the shared deadline yields [] like sb_try_rows.
+
+        res = sb_gather({
+            "students": lambda: sb_exec(sb.table("students").select("students_id")),
+            "sessions": lambda: sb_exec(sb.table("sessions").select("id")),
+        })
+
+    The callables run outside the request thread: read `request` values
+    before building them. Do not call sb_gather from inside a gathered call.
+    """
+    pool = _pool()
+    futures = {
+        name: pool.submit(copy_context().run, sb_try_rows, name, fn, retries)
+        for name, fn in calls.items()
+    }
+    deadline = time.monotonic() + timeout
+    out = {}
+    for name, fut in futures.items():
+        try:
+            out[name] = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            fut.cancel()
+            print(f"[WARN] {name} timed out after {timeout}s")
+            out[name] = []
+        except Exception as ex:
+            print(f"[EXCEPTION] {name}:", ex)
+            out[name] = []
+    return out
+
+
+# ---------------------------------------------------------------------
+# Keyset-paginated streaming reads
+# ---------------------------------------------------------------------
+SB_PAGE_SIZE = int(os.getenv("HMH_SB_PAGE_SIZE", "1000"))
+
+
+def _keyset_page(make_query, key, cursor, page_size, name):
+    q = make_query()
+    if isinstance(key, tuple):  # (ordered column, unique tiebreak), e.g. ("created_at", "id")
+        col, tie = key
+        if cursor is not None:
+            v, t = cursor
+            q = q.or_(f'{col}.gt."{v}",and({col}.eq."{v}",{tie}.gt.{t})')
+        q = q.order(col).order(tie)
+    else:
+        if cursor is not None:
+            q = q.gt(key, cursor)
+        q = q.order(key)
+    q = q.limit(page_size)
+
+    for attempt in range(2):
+        rows, err = sb_exec(q)
+        if not err:
+            return rows or []
+        print(f"[WARN] {name} page attempt {attempt+1} failed:", err)
+    raise RuntimeError(f"{name}: page read failed: {err}")
+
+
+def sb_stream(make_query, key="id", page_size: int = SB_PAGE_SIZE, name: str = None):
+    """
+    Yield every row of a query in key order, page_size rows per request, so
+    PostgREST's max-rows cap can't truncate results and memory stays flat.
+
+        for r in sb_stream(lambda: sb.table("emotion_metrics").select("id, detected_emotion")):
+            ...
+
+    make_query() must return a fresh builder (filters ok, no order/limit)
+    whose select includes the key column(s). key is a unique column, or a
+    (column, unique_tiebreak) tuple for cursors such as created_at. The next
+    page is prefetched on the fan-out pool while the current one is consumed.
+    Raises RuntimeError if a page still fails after one retry, rather than
+    silently returning partial data.
+    """
+    name = name or "sb_stream"
+    pool = _pool()
+
+    def cursor_of(row):
+        if isinstance(key, tuple):
+            return row[key[0]], row[key[1]]
+        return row[key]
+
+    def submit(cursor):
+        return pool.submit(copy_context().run, _keyset_page, make_query, key, cursor, page_size, name)
+
+    fut = submit(None)
+    try:
+        while fut is not None:
+            rows = fut.result()
+            # stop on an empty page, not a short one: the server may cap below page_size
+            fut = submit(cursor_of(rows[-1])) if rows else None
+            yield from rows
+    finally:
+        if fut is not None:
+            fut.cancel()
@@ -0,0 +1,80 @@
+# backend/utils/stamps.py
+# Tiny cross-worker change stamps.
+# Gunicorn workers don't share memory, so an in-process cache in one worker
+# can't see another worker's write. A stamp is a small file under
+# HMH_STAMP_DIR whose content changes on every bump(); readers compare the
+# value they cached against read() (one stat + read, no database). Works for
+# workers on the same host; caches still keep a TTL for multi-host setups.
+# bump_if() is the compare-and-set form, for state that must not be updated
+# from a stale copy.
+
+import os
+import tempfile
+import time
+
+try:
+    import fcntl
+except ImportError:   # not on POSIX: bump_if() falls back to an unlocked compare
+    fcntl = None
+
+STAMP_DIR = os.getenv("HMH_STAMP_DIR") or os.path.join(tempfile.gettempdir(), "hmh-stamps")
+
+
+def _path(name: str) -> str:
+    safe = "".join(c if (c.isalnum() or c in "-_.") else "_" for c in str(name))
+    return os.path.join(STAMP_DIR, safe)
+
+
+def _write(name: str) -> str:
+    """Write a new value (raises OSError); returns it."""
+    value = f"{time.time_ns()}-{os.getpid()}"
+    path = _path(name)
+    os.makedirs(STAMP_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(value)
+    os.replace(tmp, path)  # atomic: readers never see a partial value
+    return value
+
+
+def bump(name: str) -> str:
+    """Change the stamp; returns the new value."""
+    try:
+        return _write(name)
+    except OSError as e:
+        print(f"[STAMP] bump {name} failed:", e)
+        return f"{time.time_ns()}-{os.getpid()}"
+
+
+def bump_if(name: str, expected: str):
+    """
+    Bump only if the stamp still reads `expected` (same host, all workers).
+    Returns the new value, or None when someone else bumped first or the
+    stamp couldn't be locked or written (the caller must not proceed as if
+    it had claimed it).
+    """
+    path = _path(name)
+    try:
+        os.makedirs(STAMP_DIR, exist_ok=True)
+        with open(f"{path}.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if read(name) != expected:
+                    return None
+                return _write(name)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+    except OSError as e:
+        print(f"[STAMP] bump_if {name} failed:", e)
+        return None
+
+
+def read(name: str) -> str:
+    """Current stamp value ('' if never bumped)."""
+    try:
+        with open(_path(name)) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
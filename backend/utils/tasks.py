@@ -0,0 +1,334 @@
+# backend/utils/tasks.py
+# In-process background tasks with a durable spool.
+# Work that the client doesn't need to wait for (metrics rows, achievement
+# evaluation after an attempt) is enqueued and run by a worker thread:
+#   - enqueue() appends the task to HMH_TASK_DIR/tasks-<pid>-<uuid>.jsonl
+#     before returning, so a crash or restart doesn't lose it
+#   - failures retry with exponential back-off (HMH_TASK_RETRIES), then the
+#     task is appended to dead.jsonl for inspection
+#   - tasks enqueued with the same order_key run in enqueue order, retries
+#     included: while one waits to retry, later tasks with its key are held
+#     behind it (other keys keep running)
+#   - the owning process holds an flock on its spool for its whole life; on
+#     start, any spool whose lock can be taken is an orphan (its process is
+#     gone, whatever its pid) and is claimed and replayed
+# HMH_TASK_DIR must be a persistent volume shared by the workers of a host
+# (e.g. a mounted directory in the container). The default, a directory in
+# the system temp dir, does not survive a container restart, so queued
+# tasks would be lost with it.
+# Handlers must be idempotent-ish: a task can run twice if the process dies
+# between running it and recording it as done.
+#
+#   @task("metrics.insert")
+#   def _insert(table, row): ...
+#
+#   enqueue("metrics.insert", table="speech_metrics", row={...})
+#   enqueue("achievements", order_key=f"student:{sid}", sid=sid, ...)
+
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:   # not on POSIX: orphans are detected by pid instead
+    fcntl = None
+
+TASK_DIR = os.getenv("HMH_TASK_DIR") or os.path.join(tempfile.gettempdir(), "hmh-tasks")
+TASK_RETRIES = int(os.getenv("HMH_TASK_RETRIES", "5"))
+TASK_BACKOFF = float(os.getenv("HMH_TASK_BACKOFF", "2"))   # seconds, doubled per retry
+COMPACT_EVERY = 200   # rewrite the spool after this many finished tasks
+
+_handlers = {}
+
+
+def task(name: str):
+    """Register a handler; it is called with the payload as keyword arguments."""
+    def deco(fn):
+        _handlers[name] = fn
+        return fn
+    return deco
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _try_lock(f) -> bool:
+    """Non-blocking exclusive flock on an open file; True if we hold it."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _spool_pid(name: str):
+    """pid from tasks-<pid>-<uuid>.jsonl (or the older tasks-<pid>.jsonl), else None."""
+    try:
+        return int(name[len("tasks-"):-len(".jsonl")].split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+class TaskRunner:
+    def __init__(self, root: str = TASK_DIR):
+        self.root = root
+        self._q = queue.Queue()
+        self._pending = {}        # id -> record, not yet finished
+        self._held = {}           # order_key -> (id of the task retrying, deque of tasks behind it)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._finished = 0
+        self._spool = None        # path of this process's spool
+        self._spool_fd = None     # open handle holding the spool's flock
+        self.app = None
+
+    # ---- spool ----
+    @property
+    def spool_path(self):
+        return self._spool
+
+    def _open_spool(self):
+        """Create this process's spool and take its lock (held until exit)."""
+        if self._spool_fd is not None:
+            self._spool_fd.close()   # inherited across fork; the parent keeps its own lock
+        self._spool = os.path.join(self.root, f"tasks-{os.getpid()}-{uuid.uuid4().hex[:12]}.jsonl")
+        self._spool_fd = None
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            f = open(self._spool, "a", encoding="utf-8")
+        except OSError as e:
+            print("[TASKS] spool open failed:", e)
+            return
+        if not _try_lock(f):   # fresh uuid name: nobody else can hold it
+            print("[TASKS] could not lock", self._spool)
+        self._spool_fd = f
+
+    def _append(self, path, rec):
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(rec, default=str) + "\n")
+        except OSError as e:
+            print("[TASKS] spool write failed:", e)
+
+    def _compact(self):
+        with self._lock:
+            live = list(self._pending.values())
+            self._finished = 0
+            tmp = f"{self.spool_path}.tmp"
+            try:
+                f = open(tmp, "w", encoding="utf-8")
+            except OSError as e:
+                print("[TASKS] spool compact failed:", e)
+                return
+            try:
+                _try_lock(f)   # lock the new file before it takes the spool's name
+                for rec in live:
+                    f.write(json.dumps(rec, default=str) + "\n")
+                f.flush()
+                os.replace(tmp, self.spool_path)
+            except OSError as e:
+                f.close()
+                print("[TASKS] spool compact failed:", e)
+                return
+            old, self._spool_fd = self._spool_fd, f
+            if old is not None:
+                old.close()
+
+    def _claim_orphans(self):
+        """
+        Replay spools nobody holds the lock on (their process crashed or the
+        container restarted). A reused pid doesn't matter: a live owner
+        always holds its lock.
+        """
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        for name in names:
+            if not (name.startswith("tasks-") and name.endswith(".jsonl")):
+                continue
+            src = os.path.join(self.root, name)
+            if src == self._spool:
+                continue
+            # spools from before the lock (tasks-<pid>.jsonl) and non-POSIX
+            # hosts still go by pid
+            legacy = "-" not in name[len("tasks-"):-len(".jsonl")]
+            if fcntl is None or legacy:
+                pid = _spool_pid(name)
+                if pid is None or pid == os.getpid() or _pid_alive(pid):
+                    continue
+            try:
+                f = open(src, encoding="utf-8")
+            except OSError:
+                continue
+            with f:
+                if not _try_lock(f):
+                    continue   # owner alive, or another process is claiming it
+                try:
+                    if os.fstat(f.fileno()).st_ino != os.stat(src).st_ino:
+                        continue   # replaced or already claimed and removed meanwhile
+                except OSError:
+                    continue
+                records, done = {}, set()
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue
+                    if rec.get("done"):
+                        done.add(rec["done"])
+                    elif rec.get("id"):
+                        records[rec["id"]] = rec
+                replay = [r for tid, r in records.items() if tid not in done]
+                for rec in replay:
+                    rec["tries"] = 0
+                    self._submit(rec)
+                try:
+                    os.remove(src)   # still under our lock
+                except OSError as e:
+                    print("[TASKS] could not remove claimed spool:", e)
+            if replay:
+                print(f"[TASKS] replayed {len(replay)} task(s) from {name}")
+
+    # ---- lifecycle ----
+    def start(self, app=None):
+        if app is not None:
+            self.app = app
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        # fresh state after fork (gunicorn preload)
+        self._q = queue.Queue()
+        self._pending = {}
+        self._held = {}
+        self._pid = os.getpid()
+        if not os.getenv("HMH_TASK_DIR"):
+            print(f"[TASKS] HMH_TASK_DIR not set; spooling to {self.root}, which may not survive a restart")
+        self._open_spool()
+        self._thread = threading.Thread(target=self._run, name="hmh-tasks", daemon=True)
+        self._thread.start()
+        self._claim_orphans()
+
+    def _submit(self, rec):
+        with self._lock:
+            self._pending[rec["id"]] = rec
+        self._append(self.spool_path, rec)
+        self._q.put(rec)
+
+    def enqueue(self, name: str, order_key=None, **payload) -> str:
+        if name not in _handlers:
+            raise KeyError(f"unknown task {name!r}")
+        self.start()
+        rec = {"id": uuid.uuid4().hex, "name": name, "payload": payload,
+               "tries": 0, "at": time.time()}
+        if order_key is not None:
+            rec["key"] = str(order_key)
+        self._submit(rec)
+        return rec["id"]
+
+    def _finish(self, rec):
+        with self._lock:
+            self._pending.pop(rec["id"], None)
+            self._finished += 1
+            compact = self._finished >= COMPACT_EVERY
+        self._append(self.spool_path, {"done": rec["id"]})
+        if compact:
+            self._compact()
+
+    def _retry_later(self, rec, delay):
+        t = threading.Timer(delay, self._q.put, args=(rec,))
+        t.daemon = True
+        t.start()
+
+    def _run(self):
+        while True:
+            self._dispatch(self._q.get())
+
+    def _dispatch(self, rec):
+        key = rec.get("key")
+        if key is not None:
+            with self._lock:
+                held = self._held.get(key)
+                if held is not None and held[0] != rec["id"]:
+                    held[1].append(rec)   # runs after the retrying task, in order
+                    return
+        self._execute(rec)
+
+    def _execute(self, rec):
+        fn = _handlers.get(rec["name"])
+        try:
+            if fn is None:
+                raise KeyError(f"no handler for {rec['name']!r}")
+            if self.app is not None:
+                with self.app.app_context():
+                    fn(**rec["payload"])
+            else:
+                fn(**rec["payload"])
+            self._finish(rec)
+        except Exception as e:
+            rec["tries"] = rec.get("tries", 0) + 1
+            rec["error"] = f"{type(e).__name__}: {e}"
+            if rec["tries"] > TASK_RETRIES:
+                print(f"[TASKS] {rec['name']} gave up after {rec['tries']} tries:", rec["error"])
+                self._append(os.path.join(self.root, "dead.jsonl"), rec)
+                self._finish(rec)
+            else:
+                delay = TASK_BACKOFF * (2 ** (rec["tries"] - 1))
+                print(f"[TASKS] {rec['name']} failed (try {rec['tries']}), retry in {delay:.0f}s:", rec["error"])
+                if rec.get("key") is not None:
+                    with self._lock:
+                        held = self._held.get(rec["key"])
+                        self._held[rec["key"]] = (rec["id"], held[1] if held else deque())
+                self._retry_later(rec, delay)
+                return
+        self._release(rec)
+
+    def _release(self, rec):
+        """Run the tasks held behind `rec` (same key), in order."""
+        key = rec.get("key")
+        if key is None:
+            return
+        with self._lock:
+            held = self._held.get(key)
+            if held is None or held[0] != rec["id"]:
+                return
+            del self._held[key]
+        waiting = held[1]
+        while waiting:
+            self._dispatch(waiting.popleft())
+            with self._lock:
+                blocked = self._held.get(key)
+                if blocked is not None:
+                    blocked[1].extend(waiting)   # one of them is retrying now: the rest stay behind it
+                    return
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+
+runner = TaskRunner()
+
+
+def enqueue(name: str, order_key=None, **payload) -> str:
+    return runner.enqueue(name, order_key=order_key, **payload)
+
+
+def init_app(app):
+    runner.start(app)
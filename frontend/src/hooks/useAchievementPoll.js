@@ -0,0 +1,57 @@
+// src/hooks/useAchievementPoll.js
+import { useEffect, useRef, useState } from "react";
+import { apiFetch } from "../lib/api";
+import { auth } from "../lib/auth";
+
+const DELAYS_MS = [800, 2000, 4500];
+const SHOW_MS = 3500;
+
+/**
+ * Achievements are evaluated in the background after an attempt is saved.
+ * Call watch(res.achievements_since) with an attempt response; the hook polls
+ * /student/achievements/recent a few times and exposes newly earned inline
+ * badges (each one reported once, shown for a few seconds).
+ */
+export default function useAchievementPoll() {
+  const [earned, setEarned] = useState([]);
+  const seenRef = useRef(new Set());
+  const timersRef = useRef([]);
+  const hideRef = useRef(null);
+
+  useEffect(
+    () => () => {
+      timersRef.current.forEach(clearTimeout);
+      clearTimeout(hideRef.current);
+    },
+    []
+  );
+
+  function watch(since) {
+    if (!since) return;
+    // keep earlier attempts' polls: their badges may still be pending
+    const timers = DELAYS_MS.map((ms) =>
+      setTimeout(async () => {
+        try {
+          const res = await apiFetch("/student/achievements/recent", {
+            token: auth.token(),
+            params: { since },
+          });
+          const fresh = (res?.inline || []).filter(
+            (a) => !seenRef.current.has(a.code)
+          );
+          if (fresh.length) {
+            fresh.forEach((a) => seenRef.current.add(a.code));
+            setEarned(fresh);
+            clearTimeout(hideRef.current);
+            hideRef.current = setTimeout(() => setEarned([]), SHOW_MS);
+          }
+        } catch {
+          // best-effort; badges still show on the profile page
+        }
+      }, ms)
+    );
+    timersRef.current = [...timersRef.current, ...timers].slice(-12);
+  }
+
+  return { earned, watch, clear: () => setEarned([]) };
+}
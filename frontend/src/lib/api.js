@@ -5,8 +5,25 @@ const API_BASE =
     ? "http://localhost:5000/api"   // development → Flask backend
     : "/api";                       // production → use reverse proxy
 
+const RETRY_STATUS = new Set([502, 503, 504]);
+const sleep = (ms) => new Promise((r) => setTimeout(r, ms));
+
+// Key for the Idempotency-Key header: the server replays its first response
+// for a repeated key instead of saving the submission twice.
+export function newIdempotencyKey() {
+  if (typeof crypto !== "undefined" && crypto.randomUUID) return crypto.randomUUID();
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+/**
+ * opts.idempotencyKey (or opts.idempotent: true for a fresh key) sends an
+ * Idempotency-Key header and retries network errors / 502-504 with the same
+ * key (opts.retries, default 2), so flaky Wi-Fi can't create duplicates.
+ */
 export async function apiFetch(path, opts = {}) {
   const { method = "GET", token, params, body, headers: extraHeaders } = opts;
+  const idemKey = opts.idempotencyKey || (opts.idempotent ? newIdempotencyKey() : null);
+  const retries = idemKey ? (opts.retries ?? 2) : 0;
 
   const clean = String(path || "").replace(/^\/+/, "");
   const normalizedPath = clean.startsWith("api/") ? clean.slice(4) : clean;
@@ -25,15 +42,25 @@ export async function apiFetch(path, opts = {}) {
   const headers = {
     ...(isForm ? {} : { "Content-Type": "application/json" }),
     ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    ...(idemKey ? { "Idempotency-Key": idemKey } : {}),
     ...(extraHeaders || {}),
   };
 
-  const res = await fetch(url, {
-    method,
-    headers,
-    body: isForm ? body : body ? JSON.stringify(body) : undefined,
-    credentials: "include",
-  });
+  let res;
+  for (let attempt = 0; ; attempt++) {
+    try {
+      res = await fetch(url, {
+        method,
+        headers,
+        body: isForm ? body : body ? JSON.stringify(body) : undefined,
+        credentials: "include",
+      });
+      if (!RETRY_STATUS.has(res.status) || attempt >= retries) break;
+    } catch (e) {
+      if (attempt >= retries) throw e; // still offline: no status on the error
+    }
+    await sleep(500 * 2 ** attempt);
+  }
 
   if (!res.ok) {
     let message = "";
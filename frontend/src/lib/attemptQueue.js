@@ -0,0 +1,81 @@
+// src/lib/attemptQueue.js
+// Offline queue for activity attempts.
+// When POST /student/attempt fails because the network is down (no HTTP
+// status), the attempt is kept in localStorage and synced later in one
+// request to POST /student/attempts/batch, in the order it happened.
+import { apiFetch } from "./api";
+import { auth } from "./auth";
+
+const KEY = "hmh_attempt_queue";
+const BATCH_MAX = 100; // matches HMH_ATTEMPT_BATCH_MAX on the backend
+
+function read() {
+  try {
+    const q = JSON.parse(localStorage.getItem(KEY) || "[]");
+    return Array.isArray(q) ? q : [];
+  } catch {
+    return [];
+  }
+}
+
+function write(q) {
+  try {
+    if (q.length) localStorage.setItem(KEY, JSON.stringify(q));
+    else localStorage.removeItem(KEY);
+  } catch {}
+}
+
+export function pendingAttempts() {
+  return read().length;
+}
+
+/** Queue an attempt; returns its queue id (the key of its result in `synced`). */
+export function queueAttempt(item) {
+  const queueId = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`;
+  write([...read(), { ...item, queue_id: queueId, queued_at: Date.now() }]);
+  return queueId;
+}
+
+let flushing = null;
+
+/**
+ * Send queued attempts in batches. Resolves to the last batch response
+ * plus `synced`: { queue_id: server result } for every item the
+ * server saved (or null when nothing was sent). Items stay queued while the
+ * network or the server is down; a batch the server rejects (4xx) is dropped.
+ */
+export function flushAttempts() {
+  if (flushing) return flushing;
+  flushing = (async () => {
+    let last = null;
+    const synced = {};
+    try {
+      while (read().length) {
+        const batch = read().slice(0, BATCH_MAX);
+        let res;
+        try {
+          res = await apiFetch("/student/attempts/batch", {
+            method: "POST",
+            token: auth.token(),
+            body: { attempts: batch },
+            idempotent: true,
+          });
+        } catch (err) {
+          if (!err.status || err.status >= 500) break; // offline / server trouble: retry later
+          // 4xx: the batch itself was rejected; retrying won't help
+          console.error("Queued attempts rejected:", err);
+        }
+        for (const r of res?.results || []) {
+          const key = r?.ok && batch[r.index]?.queue_id;
+          if (key) synced[key] = r;
+        }
+        write(read().slice(batch.length));
+        last = res;
+      }
+    } finally {
+      flushing = null;
+    }
+    return last ? { ...last, synced } : null;
+  })();
+  return flushing;
+}
@@ -1,9 +1,10 @@
 // frontend/src/views/activities/ActivityRunner.jsx
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { motion, AnimatePresence } from "framer-motion";
 import confetti from "canvas-confetti";
-import { apiFetch } from "../../lib/api";
+import { apiFetch, newIdempotencyKey } from "../../lib/api";
 import { auth } from "../../lib/auth";
+import { queueAttempt, flushAttempts, pendingAttempts } from "../../lib/attemptQueue";
 import MascotCelebration from "../../components/MascotCelebration";
 import LoadingScreen from "../../components/LoadingScreen";
 
@@ -22,6 +23,7 @@ import exitIcon from "../../assets/exit.png";
 import starIcon from "../../assets/star.png";
 
 import useSessionTicker from "../../hooks/useSessionTicker";
+import useAchievementPoll from "../../hooks/useAchievementPoll";
 
 export default function ActivityRunner({ lessonId }) {
   const [activities, setActivities] = useState([]);
@@ -31,6 +33,12 @@ export default function ActivityRunner({ lessonId }) {
   const [starsEarned, setStarsEarned] = useState(0);
   const [scores, setScores] = useState([]);
   const [loading, setLoading] = useState(true);
+  const achievements = useAchievementPoll();
+
+  // Attempts queued offline have no score until the server scores them:
+  // their slot in `scores` stays null until the queue syncs.
+  const queuedSlots = useRef({}); // queue id -> index in scores
+  const syncedScores = useRef({}); // index in scores -> server score
 
   const lang = (localStorage.getItem("hmh_lang") || "en").toLowerCase();
   const [chapterId, setChapterId] = useState(1);
@@ -150,6 +158,41 @@ export default function ActivityRunner({ lessonId }) {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, [index, activities.length, phase]);
 
+  // Fill the score slots of queued attempts the server has now saved
+  function applySynced(res) {
+    const synced = res?.synced || {};
+    let filled = false;
+    for (const [key, slot] of Object.entries(queuedSlots.current)) {
+      const r = synced[key];
+      if (!r) continue;
+      delete queuedSlots.current[key];
+      if (typeof r.score !== "number") continue;
+      syncedScores.current[slot] = r.score;
+      filled = true;
+    }
+    if (filled) setScores((prev) => withSyncedScores(prev));
+    return res;
+  }
+
+  function withSyncedScores(list) {
+    return list.map((s, i) =>
+      s == null && syncedScores.current[i] != null ? syncedScores.current[i] : s
+    );
+  }
+
+  function syncQueued() {
+    return flushAttempts().then(applySynced);
+  }
+
+  // Sync attempts queued while offline as soon as the network is back
+  useEffect(() => {
+    const onOnline = () => syncQueued();
+    window.addEventListener("online", onOnline);
+    if (pendingAttempts()) syncQueued();
+    return () => window.removeEventListener("online", onOnline);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, []);
+
   useEffect(() => {
     const onBeforeUnload = () => saveProgress();
     const onVisibility = () => {
@@ -193,12 +236,21 @@ export default function ActivityRunner({ lessonId }) {
   // Helper: finish lesson (called after forward+review)
   async function finishLesson(finalScores) {
     try {
+      // Completion is computed from saved attempts: sync the offline queue first
+      if (pendingAttempts()) {
+        const synced = await syncQueued();
+        achievements.watch(synced?.achievements_since);
+      }
       const completeRes = await apiFetch(
         `/student/lesson/${lessonId}/complete`,
         { method: "POST", token: auth.token() }
       );
-      const avg = finalScores.length
-        ? finalScores.reduce((a, b) => a + b, 0) / finalScores.length
+      // Attempts still queued (not scored by the server yet) don't count
+      const scored = withSyncedScores(finalScores).filter(
+        (s) => typeof s === "number"
+      );
+      const avg = scored.length
+        ? scored.reduce((a, b) => a + b, 0) / scored.length
         : 100;
       let stars = 0;
       if (avg >= 90) stars = 3;
@@ -288,25 +340,52 @@ export default function ActivityRunner({ lessonId }) {
     }
 
     try {
-      const res = await apiFetch("/student/attempt", {
-        method: "POST",
-        token: auth.token(),
-        body: {
-          activity_id: current.id,
-          lesson_id: lessonId,
-          lang,
-          submission: payloadSubmission,
-        },
-      });
-
-      const score = res?.score ?? 0;
+      const body = {
+        activity_id: current.id,
+        lesson_id: lessonId,
+        lang,
+        submission: payloadSubmission,
+      };
+      const idempotencyKey = newIdempotencyKey();
+      let res;
+      try {
+        res = await apiFetch("/student/attempt", {
+          method: "POST",
+          token: auth.token(),
+          body,
+          idempotencyKey,
+        });
+        if (pendingAttempts()) syncQueued();
+      } catch (err) {
+        if (err.status) throw err;
+        // Offline: keep the answer and sync it later via /attempts/batch.
+        // Only the server scores it, so no score or pass/fail until then.
+        const queueId = queueAttempt({ ...body, idempotency_key: idempotencyKey });
+        queuedSlots.current[queueId] = scores.length;
+        res = { queued: true };
+      }
+
+      achievements.watch(res?.achievements_since);
+
+      const score = res?.queued ? null : res?.score ?? 0;
       const newScores = [...scores, score];
       setScores(newScores);
 
       const isPassed =
-        payloadSubmission.action === "answer_correct" ||
-        payloadSubmission.passed ||
-        res?.passed;
+        !res?.queued &&
+        (payloadSubmission.action === "answer_correct" ||
+          payloadSubmission.passed ||
+          res?.passed);
+
+      if (res?.queued && !isSkipped) {
+        setFeedback({
+          type: "queued",
+          message:
+            lang === "tl"
+              ? "Na-save! Ipapadala kapag may internet na."
+              : "Saved! It will sync when you're back online.",
+        });
+      }
 
       // Only show celebration when actually passed (not on skip)
       if (isPassed && !isSkipped) {
@@ -509,6 +588,8 @@ export default function ActivityRunner({ lessonId }) {
               className={`px-8 py-4 rounded-2xl shadow-2xl border-2 text-center backdrop-blur-md ${
                 feedback.type === "success"
                   ? "bg-[#FFFCE8]/95 border-[#FFEAA7] text-[#270c9f]"
+                  : feedback.type === "queued"
+                  ? "bg-[#F2F4FF]/95 border-[#D5DBFF] text-[#270c9f]"
                   : "bg-[#FFECEC]/95 border-[#FFC8C8] text-[#270c9f]"
               }`}
             >
@@ -520,6 +601,13 @@ export default function ActivityRunner({ lessonId }) {
         )}
       </AnimatePresence>
 
+      {/* NEW BADGE (evaluated in the background, polled) */}
+      <MascotCelebration
+        visible={achievements.earned.length > 0}
+        chapterId={chapterId}
+        message={achievements.earned[0]?.name || "New badge!"}
+      />
+
       {/* STAR MODAL */}
       <StarModal
         visible={showStarModal}
@@ -167,6 +167,7 @@ export default function AsrActivity({ activity, onComplete }) {
       method: "POST",
       token: auth.token && auth.token(),
       body: formData,
+      idempotent: true,
     });
 
     const backendText = res?.text || "";
@@ -130,6 +130,7 @@ export default function EmotionActivity({ activity, onComplete }) {
           lang,
           auto: true,
         },
+        idempotent: true,
       });
 
       if (!res || res.error) throw new Error(res?.error || "Analysis failed");
@@ -171,6 +172,9 @@ export default function EmotionActivity({ activity, onComplete }) {
               lang,
             });
         }, 1300);
+      } else if (res.rejected) {
+        // frame failed the backend quality gate (too dark, too far, ...)
+        setFeedback(res.hint || "?");
       } else {
         setFeedback(res.label || "?");
       }
@@ -215,6 +219,7 @@ export default function EmotionActivity({ activity, onComplete }) {
         method: "POST",
         token: auth.token(),
         body: { activities_id: activity.id, lesson_id: activity.lesson_id },
+        idempotent: true,
       });
 
       const nextId = res.next_activity?.id || res.next_activity;